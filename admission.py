@@ -0,0 +1,269 @@
+import threading
+import time
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# What the rate limiter does with records of a source that is over its limit
+LIMIT_POLICIES = ("reject", "sample")
+
+
+class TokenBucket:
+    """Token bucket of one source: refills at `rate` tokens per second up to `burst`."""
+
+    __slots__ = ("tokens", "updated", "over")
+
+    def __init__(self, burst: float, now: float) -> None:
+        self.tokens = burst
+        self.updated = now
+        # Records seen over the limit, for 1-in-N sampling
+        self.over = 0
+
+    def refill(self, rate: float, burst: float, now: float) -> None:
+        self.tokens = min(burst, self.tokens + (now - self.updated) * rate)
+        self.updated = now
+
+
+class RateLimiter:
+    """
+    Per-source admission control with token buckets.
+
+    Every source may send `rate` records per second on average, with bursts of up
+    to `burst` records. With the "reject" policy a request holding records of a
+    source that is out of tokens is refused as a whole, so the client can resend it
+    unchanged after `retry_after` seconds. A bucket may go into debt for a batch
+    larger than what it holds, which keeps the long-run rate exact for any batch
+    size. With the "sample" policy the request is accepted and only one in
+    `sample_every` records over the limit is kept.
+    """
+
+    def __init__(self, rate: float, burst: Optional[float] = None, policy: str = "reject",
+                 sample_every: int = 100, max_sources: int = 100000) -> None:
+        """
+        Args:
+            rate (float): Records per second allowed per source.
+            burst (float): Bucket capacity (default: one second worth of records).
+            policy (str): "reject" or "sample".
+            sample_every (int): With "sample", keep one over-limit record out of this many.
+            max_sources (int): Buckets kept before idle (full) buckets are forgotten.
+        """
+        if policy not in LIMIT_POLICIES:
+            raise ValueError(f"policy must be one of {LIMIT_POLICIES}")
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self.burst = burst if burst else rate
+        self.policy = policy
+        self.sample_every = max(1, sample_every)
+        self.max_sources = max_sources
+        self._lock = threading.Lock()
+        self._buckets: Dict[str, TokenBucket] = {}
+        self.admitted = 0
+        self.rejected = 0
+        self.throttled_requests = 0
+        self.sampled_out = 0
+        # Records refused or sampled out, per source
+        self.limited: Counter = Counter()
+
+    def _bucket(self, source: str, now: float) -> TokenBucket:
+        bucket = self._buckets.get(source)
+        if bucket is None:
+            if len(self._buckets) >= self.max_sources:
+                self._forget_idle(now)
+            bucket = self._buckets[source] = TokenBucket(self.burst, now)
+        else:
+            bucket.refill(self.rate, self.burst, now)
+        return bucket
+
+    def _forget_idle(self, now: float) -> None:
+        """Drop buckets that have refilled completely; they behave like new ones (lock held)."""
+        for source, bucket in list(self._buckets.items()):
+            if bucket.tokens + (now - bucket.updated) * self.rate >= self.burst:
+                del self._buckets[source]
+
+    def admit(self, logs: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], Optional[float]]:
+        """
+        Apply the limits to the records of one request.
+
+        Args:
+            logs (list): Log dicts of a LOG or LOG_BATCH request.
+
+        Returns:
+            tuple: (records to accept, None), or ([], retry_after seconds) when the
+            "reject" policy refuses the request.
+        """
+        now = time.monotonic()
+        with self._lock:
+            if self.policy == "reject":
+                counts = Counter(log.get("source") for log in logs)
+                buckets = {source: self._bucket(source, now) for source in counts}
+                empty = [source for source, bucket in buckets.items() if bucket.tokens <= 0]
+                if empty:
+                    self.rejected += len(logs)
+                    self.throttled_requests += 1
+                    for source in empty:
+                        self.limited[source] += counts[source]
+                    return [], max(-buckets[source].tokens / self.rate for source in empty) + 1 / self.rate
+                for source, count in counts.items():
+                    buckets[source].tokens -= count
+                self.admitted += len(logs)
+                return logs, None
+
+            kept = []
+            for log in logs:
+                bucket = self._bucket(log.get("source"), now)
+                if bucket.tokens >= 1:
+                    bucket.tokens -= 1
+                    kept.append(log)
+                    continue
+                bucket.over += 1
+                if (bucket.over - 1) % self.sample_every == 0:
+                    kept.append(log)
+                else:
+                    self.sampled_out += 1
+                    self.limited[log.get("source")] += 1
+            self.admitted += len(kept)
+            return kept, None
+
+    def stats(self, top: int = 10) -> Dict[str, Any]:
+        """Return the limiter settings, counters and the most limited sources."""
+        with self._lock:
+            return {
+                "policy": self.policy,
+                "rate": self.rate,
+                "burst": self.burst,
+                "sources": len(self._buckets),
+                "admitted": self.admitted,
+                "rejected": self.rejected,
+                "throttled_requests": self.throttled_requests,
+                "sampled_out": self.sampled_out,
+                "top_limited": self.limited.most_common(top),
+            }
+
+
+class Repeat:
+    """Repeats of one (source, level, message) seen inside the current window."""
+
+    __slots__ = ("until", "count", "first", "last")
+
+    def __init__(self, until: float) -> None:
+        self.until = until
+        self.count = 0
+        self.first = None
+        self.last = None
+
+
+class RepeatSuppressor:
+    """
+    Server-side suppression of identical repeated messages.
+
+    The first occurrence of a (source, level, message) is stored as usual and opens
+    a window of `window` seconds. Identical records arriving inside the window are
+    only counted; when the window closes they are stored as one summary record
+    with `repeat_count` (the number of records it stands for) and `first_timestamp`,
+    its own timestamp being the last one seen. The next occurrence opens a new window.
+    """
+
+    def __init__(self, window: float, emit: Callable[[List[Dict[str, Any]]], None],
+                 max_keys: int = 10000) -> None:
+        """
+        Args:
+            window (float): Seconds during which identical records are folded together.
+            emit (callable): Receives summary records to store and publish.
+            max_keys (int): Distinct messages tracked at once; others are never suppressed.
+        """
+        self.window = window
+        self.emit = emit
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        self._open: Dict[Tuple[str, str, str], Repeat] = {}
+        self.suppressed = 0
+        self.summaries = 0
+        self.untracked = 0
+        self._closed = threading.Event()
+        self._thread = threading.Thread(target=self._flush_loop, name="RepeatSuppressor", daemon=True)
+        self._thread.start()
+
+    def __len__(self) -> int:
+        return len(self._open)
+
+    def filter(self, logs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Drop repeats of messages seen inside their window.
+
+        Returns:
+            list: The records to store, including summaries of windows that closed
+            since the last flush for the same messages (ahead of the new occurrence).
+        """
+        now = time.monotonic()
+        kept = []
+        with self._lock:
+            for log in logs:
+                key = (log.get("source"), log.get("level"), log.get("message"))
+                repeat = self._open.get(key)
+                if repeat is not None and now < repeat.until:
+                    repeat.count += 1
+                    if repeat.first is None:
+                        repeat.first = log.get("timestamp")
+                    repeat.last = log.get("timestamp")
+                    self.suppressed += 1
+                    continue
+                if repeat is not None:
+                    del self._open[key]
+                    if repeat.count:
+                        kept.append(self._summary(key, repeat))
+                if len(self._open) < self.max_keys:
+                    self._open[key] = Repeat(now + self.window)
+                else:
+                    self.untracked += 1
+                kept.append(log)
+        return kept
+
+    def _summary(self, key: Tuple[str, str, str], repeat: Repeat) -> Dict[str, Any]:
+        """Build the record standing for a closed window's repeats (lock held)."""
+        source, level, message = key
+        self.summaries += 1
+        return {
+            "level": level,
+            "message": message,
+            "source": source,
+            "timestamp": repeat.last,
+            "first_timestamp": repeat.first,
+            "repeat_count": repeat.count,
+        }
+
+    def flush(self, everything: bool = False) -> None:
+        """Emit the summaries of closed windows (of every window if `everything`)."""
+        now = time.monotonic()
+        with self._lock:
+            due = [key for key, repeat in self._open.items() if everything or repeat.until <= now]
+            summaries = []
+            for key in due:
+                repeat = self._open.pop(key)
+                if repeat.count:
+                    summaries.append(self._summary(key, repeat))
+        if summaries:
+            self.emit(summaries)
+
+    def _flush_loop(self) -> None:
+        while not self._closed.wait(min(self.window, 1.0)):
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"[Suppression Error] Failed to flush repeat summaries: {e}")
+
+    def close(self) -> None:
+        """Stop the flush thread and emit every pending summary."""
+        self._closed.set()
+        self._thread.join()
+        self.flush(everything=True)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the window, tracked messages and suppression counters."""
+        with self._lock:
+            return {
+                "window": self.window,
+                "tracked": len(self._open),
+                "suppressed": self.suppressed,
+                "summaries": self.summaries,
+                "untracked": self.untracked,
+            }
@@ -1,9 +1,33 @@
+import argparse
 import threading
 import random
 import time
 import socket
+from typing import List, Optional, Tuple
 from logger import Logger
 
+# Realistic technical log messages per level
+MESSAGES = {
+    "INFO": ["Connection established", "Ping response: 15ms", "Resource usage: Normal"],
+    "WARNING": ["Response time exceeds threshold", "CPU fan speed high"],
+    "ERROR": ["Packet loss detected", "Authentication timeout"],
+    "CRITICAL": ["Service failure!", "Security breach: multiple failed logins"]
+}
+
+# INFO is listed twice so it is picked twice as often
+LEVEL_CHOICES = ["INFO", "INFO", "WARNING", "ERROR", "CRITICAL"]
+
+
+def random_log() -> Tuple[str, str]:
+    """Pick a random (level, message) pair the way a simulated device would."""
+    level = random.choice(LEVEL_CHOICES)
+    return level, random.choice(MESSAGES[level])
+
+
+def device_source(user_number: int) -> str:
+    """Source string of a simulated device: IPs start from 192.168.1.11, 192.168.1.12, etc."""
+    return f"(192.168.1.{10 + user_number})"
+
 
 class MultiUserSimulator:
     """
@@ -11,20 +35,19 @@ class MultiUserSimulator:
     using a unique IP address for each.
     """
 
-    def __init__(self, user_number: int) -> None:
+    def __init__(self, user_number: int, hosts: Optional[List[str]] = None) -> None:
         self.user_number = user_number
         # Get the actual machine hostname
         self.base_hostname = socket.gethostname()
 
         # Generate a unique IP for each user to simulate multiple devices
-        # IPs will start from 192.168.1.11, 192.168.1.12, etc.
         self.ip = f"192.168.1.{10 + user_number}"
 
         # The source string that will appear in the GUI table
-        self.device_source = f"({self.ip})"
+        self.device_source = device_source(user_number)
 
-        # Connect the Logger to the local server address
-        self.logger: Logger = Logger(host="127.0.0.1", port=5000)
+        # Connect the Logger to the local server, or to every node of a cluster
+        self.logger: Logger = Logger(host="127.0.0.1", port=5000, hosts=hosts)
         self.running: bool = True
 
     def start_simulating(self) -> None:
@@ -32,18 +55,8 @@ class MultiUserSimulator:
         print(f"[Service Online] {self.device_source} is now simulating logs...")
 
         while self.running:
-            # Randomly select a log level
-            level = random.choice(["INFO", "INFO", "WARNING", "ERROR", "CRITICAL"])
-
-            # Realistic technical log messages
-            messages = {
-                "INFO": ["Connection established", "Ping response: 15ms", "Resource usage: Normal"],
-                "WARNING": ["Response time exceeds threshold", "CPU fan speed high"],
-                "ERROR": ["Packet loss detected", "Authentication timeout"],
-                "CRITICAL": ["Service failure!", "Security breach: multiple failed logins"]
-            }
-
-            msg = random.choice(messages[level])
+            # Randomly select a log level and message
+            level, msg = random_log()
 
             # Send the log with the unique source (IP)
             self.logger.log(level, msg, self.device_source)
@@ -52,16 +65,20 @@ class MultiUserSimulator:
             time.sleep(random.uniform(2, 5))
 
 
-def run_multi_user_simulation(total_users: int = 5):
+def run_multi_user_simulation(total_users: int = 5, hosts: Optional[List[str]] = None):
     """
     Function to launch multiple users concurrently using Threads.
+
+    Args:
+        total_users (int): Number of simulated devices.
+        hosts (list): "host:port" of every cluster node (None for the local server).
     """
     print(f"Starting Multi-User Simulation ({total_users} Users)")
 
     threads = []
     for i in range(1, total_users + 1):
         # Create a simulator instance for each user
-        user_sim = MultiUserSimulator(i)
+        user_sim = MultiUserSimulator(i, hosts)
         # Start the simulator in a separate thread
         thread = threading.Thread(target=user_sim.start_simulating, daemon=True)
         threads.append(thread)
@@ -76,5 +93,10 @@ def run_multi_user_simulation(total_users: int = 5):
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simulate devices sending logs")
+    parser.add_argument("--users", type=int, default=20, help="number of simulated devices")
+    parser.add_argument("--hosts", help="comma-separated host:port of every cluster node")
+    args = parser.parse_args()
+
     # Simulate any num of users
-    run_multi_user_simulation(20)
\ No newline at end of file
+    run_multi_user_simulation(args.users, args.hosts.split(",") if args.hosts else None)
\ No newline at end of file
@@ -0,0 +1,294 @@
+import asyncio
+import json
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from server import LogServer
+from partitions import SCATTER_ACTIONS, page_size
+from subscriptions import Subscriber
+from protocol import MAGIC, HEADER, MAX_FRAME_SIZE, ProtocolError, encode, decode, is_binary, is_complete_json
+
+
+class AsyncLogServer(LogServer):
+    """
+    Single-threaded asyncio logging server.
+
+    Accepts and reads every connection on one event loop instead of spawning a
+    thread per socket. Blocking database work (FETCH_LOGS that miss the hot cache,
+    or LOG when the ingest queue is full) runs on a bounded thread pool so it
+    never stalls the loop.
+    Serves the same framed and legacy requests as LogServer.
+    """
+
+    def __init__(self, host="127.0.0.1", port=5000, db=None, executor_workers=8, **kwargs):
+        """
+        Initialize the server.
+
+        Args:
+            executor_workers (int): Size of the thread pool used for blocking DB work.
+            Other arguments are the same as for LogServer.
+        """
+        super().__init__(host, port, db=db, **kwargs)
+        self.executor = ThreadPoolExecutor(max_workers=executor_workers, thread_name_prefix="db")
+        # Bounds the number of requests queued for the pool, not just running on it
+        self.executor_slots = executor_workers * 4
+        self._loop = None
+        self._stopped = None
+        self._slots = None
+        # Requests handed to the pool and not finished yet (queued or running)
+        self.executor_inflight = 0
+        self.metrics.gauge("executor_inflight", lambda: self.executor_inflight,
+                           "Requests queued or running on the DB thread pool")
+
+    def start(self):
+        """Bind the socket and run the event loop until stop() is called."""
+        self.bind()
+        self.server_socket.setblocking(False)
+        self.start_observability()
+        print(f"Server running and protected on {self.host}:{self.port} (asyncio)...")
+        asyncio.run(self._serve())
+
+    async def _serve(self):
+        """Accept connections on the event loop until stopped."""
+        self._loop = asyncio.get_running_loop()
+        self._stopped = asyncio.Event()
+        self._slots = asyncio.Semaphore(self.executor_slots)
+        server = await asyncio.start_server(self.handle_connection, sock=self.server_socket)
+        peers = None
+        if self.peer_socket is not None:
+            self.peer_socket.setblocking(False)
+            peers = await asyncio.start_server(self.handle_connection, sock=self.peer_socket)
+        async with server:
+            await self._stopped.wait()
+        if peers is not None:
+            peers.close()
+
+    def stop(self):
+        """Stop the event loop and flush every queued log entry to the database."""
+        if self._loop is not None and not self._loop.is_closed():
+            try:
+                self._loop.call_soon_threadsafe(self._stopped.set)
+            except RuntimeError:
+                # The loop already finished
+                pass
+        self.executor.shutdown(wait=True)
+        self.stop_observability()
+        self.close_storage()
+
+    async def handle_connection(self, reader, writer):
+        """Handle incoming requests from a specific client."""
+        self.active_connections += 1
+        self.metrics.inc("connections_accepted_total")
+        try:
+            # Framed clients open with the protocol magic; legacy clients
+            # send a single JSON payload per connection.
+            head = await reader.readexactly(len(MAGIC))
+            if head == MAGIC:
+                await self.handle_framed_async(reader, writer)
+            else:
+                await self.handle_legacy_async(reader, writer, head)
+        except asyncio.IncompleteReadError:
+            # Client disconnected (possibly in the middle of a frame)
+            pass
+        except asyncio.CancelledError:
+            # The server is shutting down with this connection still open
+            pass
+        except Exception as e:
+            self.metrics.inc("errors_total", type=type(e).__name__)
+            print(f"Server Error during client handling: {e}")
+        finally:
+            self.active_connections -= 1
+            writer.close()
+
+    async def handle_framed_async(self, reader, writer):
+        """Serve pipelined length-prefixed requests until the client disconnects."""
+        sock = writer.get_extra_info("socket")
+        if sock is not None:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        # Per-connection string dictionary, once the client negotiated the binary encoding
+        decoder = None
+        metrics = self.metrics
+        while True:
+            try:
+                header = await reader.readexactly(HEADER.size)
+            except asyncio.IncompleteReadError as e:
+                if not e.partial:
+                    return
+                raise
+            (size,) = HEADER.unpack(header)
+            if size > MAX_FRAME_SIZE:
+                raise ProtocolError(f"Frame of {size} bytes exceeds the limit")
+            payload = await reader.readexactly(size)
+            metrics.inc("bytes_received_total", size + HEADER.size)
+            started = time.perf_counter()
+            try:
+                request = self.decode_binary(decoder, payload) if is_binary(payload) else decode(payload)
+                if not isinstance(request, dict):
+                    raise ValueError("a request must be a JSON object")
+            except (ValueError, ProtocolError) as e:
+                request = None
+                metrics.inc("errors_total", type="invalid_request")
+                response = {"status": "ERROR", "error": f"Invalid request: {e}"}
+            if request is not None:
+                parsed = time.perf_counter()
+                metrics.observe("parse_seconds", parsed - started,
+                                encoding="binary" if is_binary(payload) else "json")
+                if request.get("action") == "TAIL":
+                    # The connection now belongs to the push stream
+                    await self.serve_tail_async(writer, request)
+                    return
+                if request.get("action") == "EXPORT":
+                    # Answered with a stream of frames; the connection is reusable afterwards
+                    summary = await self.serve_export_async(writer, request)
+                    self.observe_request(request, summary, time.perf_counter() - parsed)
+                    continue
+                try:
+                    if request.get("action") == "HELLO":
+                        response, decoder = self.negotiate(request)
+                    else:
+                        response = await self.process_request_async(request)
+                except Exception as e:
+                    # Answer this frame and keep the connection for the requests pipelined behind it
+                    response = self.request_failed(e)
+                self.observe_request(request, response, time.perf_counter() - parsed)
+            # Every frame gets exactly one acknowledgement, in request order
+            body = encode(response)
+            writer.write(HEADER.pack(len(body)) + body)
+            metrics.inc("bytes_sent_total", len(body) + HEADER.size)
+            # Only yield for flow control once acknowledgements start piling up
+            if writer.transport.get_write_buffer_size() > 65536:
+                await writer.drain()
+
+    async def serve_tail_async(self, writer, request):
+        """Push newly accepted records matching the subscriber's filters (see LogServer.serve_tail)."""
+        loop = self._loop
+        ready = asyncio.Event()
+        filters = request.get("filters", {})
+        subscriber = self.hub.subscribe(Subscriber(
+            filters.get("level", "ALL"),
+            filters.get("source"),
+            max_queue=self.tail_queue_size,
+            # Publishers run on pool/writer threads as well as on the loop
+            on_data=lambda: loop.call_soon_threadsafe(ready.set)
+        ))
+        # Records ingested by the other partitions are relayed into the same queue
+        stopped = threading.Event()
+        if self.partitions is not None and not request.get("local"):
+            self.partitions.follow(request, subscriber, stopped)
+
+        async def send(message):
+            body = encode(message)
+            writer.write(HEADER.pack(len(body)) + body)
+            self.metrics.inc("bytes_sent_total", len(body) + HEADER.size)
+            await asyncio.wait_for(writer.drain(), self.TAIL_SEND_TIMEOUT)
+
+        try:
+            await send({"status": "OK", "type": "subscribed"})
+            while True:
+                try:
+                    await asyncio.wait_for(ready.wait(), self.TAIL_HEARTBEAT)
+                except asyncio.TimeoutError:
+                    await send({"status": "OK", "type": "heartbeat", "data": []})
+                    continue
+                ready.clear()
+                if subscriber.evicted:
+                    self.metrics.inc("errors_total", type="tail_evicted")
+                    await send({"status": "EVICTED", "error": "Subscriber too slow"})
+                    return
+                records = subscriber.drain(self.TAIL_BATCH)
+                while records:
+                    await send({"status": "OK", "type": "logs", "data": records})
+                    records = subscriber.drain(self.TAIL_BATCH)
+        except (OSError, asyncio.TimeoutError):
+            # The viewer went away or stopped reading
+            pass
+        finally:
+            stopped.set()
+            self.hub.unsubscribe(subscriber)
+
+    async def serve_export_async(self, writer, request):
+        """
+        Send the frames answering an EXPORT request (see LogServer.export_stream).
+
+        Each frame is produced on the thread pool, since it reads storage, and the
+        next one is only requested once the previous one drained to the socket.
+        """
+        frames = self.export_stream(request)
+        payload = b""
+        try:
+            while True:
+                frame = await self.run_blocking(next, frames, None)
+                if frame is None:
+                    break
+                payload = frame
+                writer.write(HEADER.pack(len(payload)) + payload)
+                self.metrics.inc("bytes_sent_total", len(payload) + HEADER.size)
+                await writer.drain()
+        finally:
+            frames.close()
+        return decode(payload)
+
+    async def handle_legacy_async(self, reader, writer, head):
+        """Serve a single unframed JSON request (one payload per connection)."""
+        data = bytearray(head)
+        while not is_complete_json(data):
+            chunk = await reader.read(4096)
+            if not chunk:
+                break
+            data += chunk
+        self.metrics.inc("bytes_received_total", len(data))
+
+        started = time.perf_counter()
+        request = json.loads(data.decode())
+        parsed = time.perf_counter()
+        self.metrics.observe("parse_seconds", parsed - started, encoding="legacy")
+        response = await self.process_request_async(request)
+        self.observe_request(request, response, time.perf_counter() - parsed)
+
+        # Legacy LOG clients close right after sending and expect no reply
+        if request.get("action") not in ("LOG", "LOG_BATCH"):
+            body = json.dumps(response).encode()
+            writer.write(body)
+            self.metrics.inc("bytes_sent_total", len(body))
+            await writer.drain()
+
+    async def process_request_async(self, request):
+        """Execute a request without blocking the event loop."""
+        action = request.get("action")
+        if self.partitions is not None and action in SCATTER_ACTIONS and not request.get("local"):
+            # Scattering to the other partitions blocks on their sockets
+            return await self.run_blocking(self.process_request, request)
+        if action in ("LOG", "LOG_BATCH"):
+            received = [request.get("data")] if action == "LOG" else request.get("data") or []
+            # Rate limits and repeat suppression are in-memory checks, done on the loop
+            logs, refused = self.admit(received)
+            if refused is not None:
+                return refused
+            # Fast path: enqueue directly while the ingest queue has room
+            queued = 0
+            while queued < len(logs) and self.writer.try_submit(logs[queued]):
+                queued += 1
+            self.hub.publish(logs[:queued])
+            if queued < len(logs):
+                # Queue is full: hand the remainder to the pool, where submit() may block
+                await self.run_blocking(self.enqueue, logs[queued:])
+            return {"status": "OK"} if action == "LOG" else {"status": "OK", "count": len(received)}
+        elif action == "FETCH_LOGS":
+            # Cache hits are pure memory lookups and are answered on the loop
+            filters = request.get("filters", {})
+            limit = page_size(request)
+            rows = self.fetch_cached(filters, limit)
+            if rows is None:
+                rows = await self.run_blocking(self.fetch_storage, filters, limit)
+            return self.fetch_response(filters, rows, limit)
+        return await self.run_blocking(self.process_request, request)
+
+    async def run_blocking(self, func, *args):
+        """Run blocking work on the thread pool, waiting for a slot first."""
+        self.executor_inflight += 1
+        try:
+            async with self._slots:
+                return await self._loop.run_in_executor(self.executor, func, *args)
+        finally:
+            self.executor_inflight -= 1
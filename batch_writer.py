@@ -0,0 +1,203 @@
+import queue
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional
+
+
+class BatchWriter:
+    """
+    Group-commit writer that drains a bounded in-memory queue into the database.
+
+    Producers call `submit()` and return immediately (blocking only when the queue
+    is full). Writer threads collect up to `batch_size` records, or whatever has
+    arrived within `linger` seconds of the first one, and write them with a single
+    `insert_logs` call so one commit covers the whole batch.
+    """
+
+    # Sentinel placed on the queue to tell a writer thread to exit
+    _STOP = object()
+
+    def __init__(self, db, batch_size: int = 500, linger: float = 0.05,
+                 max_queue: int = 10000, writers: int = 1,
+                 report_interval: Optional[float] = None, metrics=None) -> None:
+        """
+        Initialize the writer and start its threads.
+
+        Args:
+            db: Storage object exposing `insert_logs(list_of_dicts)`.
+            batch_size (int): Maximum number of records per commit.
+            linger (float): Maximum seconds to wait for a batch to fill up.
+            max_queue (int): Capacity of the in-memory queue.
+            writers (int): Number of writer threads draining the queue.
+            report_interval (float): If set, print stats every N seconds.
+            metrics (Metrics): If set, commit latencies and failures are recorded there.
+        """
+        self.db = db
+        self.batch_size = batch_size
+        self.linger = linger
+        self.metrics = metrics
+        self.queue: "queue.Queue[Any]" = queue.Queue(maxsize=max_queue)
+        self.closed = False
+        # Called as listener(batch, ids) after every successful commit
+        self.listeners: List[Callable[[List[Dict[str, Any]], Optional[List[int]]], None]] = []
+
+        # Tuning statistics, guarded by the stats lock
+        self._stats_lock = threading.Lock()
+        self._batches = 0
+        self._records = 0
+        # Batches whose insert raised; their records are not counted as written
+        self._failed_batches = 0
+        self._failed_records = 0
+        self._max_batch = 0
+        self._commit_total = 0.0
+        self._commit_max = 0.0
+        self._recent = deque(maxlen=1000)
+
+        self._threads = [
+            threading.Thread(target=self._run, name=f"BatchWriter-{i}", daemon=True)
+            for i in range(writers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+        if report_interval:
+            threading.Thread(target=self._report_loop, args=(report_interval,), daemon=True).start()
+
+    def submit(self, log: Dict[str, Any]) -> None:
+        """
+        Queue a log entry for writing. Blocks while the queue is full.
+
+        Args:
+            log (dict): Log data with keys 'level', 'message', 'source', 'timestamp'.
+        """
+        if self.closed:
+            raise RuntimeError("BatchWriter is closed")
+        self.queue.put(log)
+
+    def try_submit(self, log: Dict[str, Any]) -> bool:
+        """
+        Queue a log entry only if the queue has room right now.
+
+        Returns:
+            bool: False if the queue was full and the entry was not queued.
+        """
+        if self.closed:
+            raise RuntimeError("BatchWriter is closed")
+        try:
+            self.queue.put_nowait(log)
+        except queue.Full:
+            return False
+        return True
+
+    def close(self) -> None:
+        """Stop accepting records, flush everything still queued and join the writers."""
+        if self.closed:
+            return
+        self.closed = True
+        # Each writer exits after consuming one sentinel; the sentinels sit behind
+        # every record submitted before close(), so nothing queued is dropped.
+        for _ in self._threads:
+            self.queue.put(self._STOP)
+        for thread in self._threads:
+            thread.join()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Return batch size and commit latency statistics.
+
+        Returns:
+            dict: Counters and latencies (milliseconds) for tuning batch_size/linger.
+        """
+        with self._stats_lock:
+            recent = sorted(latency for _, latency in self._recent)
+            recent_sizes = [size for size, _ in self._recent]
+            batches = self._batches
+            return {
+                "batches": batches,
+                "records": self._records,
+                "failed_batches": self._failed_batches,
+                "failed_records": self._failed_records,
+                "queue_depth": self.queue.qsize(),
+                "avg_batch_size": (self._records + self._failed_records) / batches if batches else 0.0,
+                "recent_avg_batch_size": sum(recent_sizes) / len(recent_sizes) if recent_sizes else 0.0,
+                "max_batch_size": self._max_batch,
+                "avg_commit_ms": self._commit_total * 1000 / batches if batches else 0.0,
+                "p99_commit_ms": recent[min(len(recent) - 1, int(len(recent) * 0.99))] * 1000 if recent else 0.0,
+                "max_commit_ms": self._commit_max * 1000,
+            }
+
+    def _run(self) -> None:
+        """Writer thread: collect batches from the queue and commit them."""
+        while True:
+            item = self.queue.get()
+            if item is self._STOP:
+                return
+            batch: List[Dict[str, Any]] = [item]
+            stop = False
+            deadline = time.monotonic() + self.linger
+
+            # Keep filling the batch until it is full or the linger time is up
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    if remaining > 0:
+                        item = self.queue.get(timeout=remaining)
+                    else:
+                        item = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is self._STOP:
+                    stop = True
+                    break
+                batch.append(item)
+
+            self._write(batch)
+            if stop:
+                return
+
+    def _write(self, batch: List[Dict[str, Any]]) -> None:
+        """Commit one batch and record its size and latency."""
+        started = time.perf_counter()
+        committed = False
+        ids = None
+        try:
+            ids = self.db.insert_logs(batch)
+            committed = True
+        except Exception as e:
+            print(f"[Writer Error] Failed to write batch of {len(batch)}: {e}")
+            if self.metrics is not None:
+                self.metrics.inc("errors_total", type="db_insert")
+        elapsed = time.perf_counter() - started
+        if self.metrics is not None:
+            self.metrics.observe("db_insert_seconds", elapsed)
+
+        if committed:
+            for listener in self.listeners:
+                try:
+                    listener(batch, ids)
+                except Exception as e:
+                    print(f"[Writer Error] Commit listener failed: {e}")
+                    if self.metrics is not None:
+                        self.metrics.inc("errors_total", type="commit_listener")
+
+        with self._stats_lock:
+            self._batches += 1
+            if committed:
+                self._records += len(batch)
+            else:
+                self._failed_batches += 1
+                self._failed_records += len(batch)
+            self._max_batch = max(self._max_batch, len(batch))
+            self._commit_total += elapsed
+            self._commit_max = max(self._commit_max, elapsed)
+            self._recent.append((len(batch), elapsed))
+
+    def _report_loop(self, interval: float) -> None:
+        """Periodically print writer statistics."""
+        while not self.closed:
+            time.sleep(interval)
+            s = self.stats()
+            print(f"[Writer] batches={s['batches']} records={s['records']} "
+                  f"queue={s['queue_depth']} avg_batch={s['recent_avg_batch_size']:.1f} "
+                  f"avg_commit={s['avg_commit_ms']:.2f}ms p99_commit={s['p99_commit_ms']:.2f}ms")
@@ -0,0 +1,450 @@
+import argparse
+import json
+import math
+import os
+import random
+import shlex
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+from typing import Any, Callable, Dict, List, Optional
+from app_emulator import device_source, random_log
+from compare_engines import process_usage, wait_for_port
+from log_message import LogMessage
+from protocol import FramedConnection
+from storage import BACKENDS
+
+HOST = "127.0.0.1"
+
+# Probe records are ordinary emitter traffic tagged with this source, so the watcher
+# can find them with a source filter and read the send time from the message
+PROBE_SOURCE = "bench-probe"
+
+READ_LEVELS = ["ALL", "INFO", "WARNING", "ERROR", "CRITICAL"]
+
+
+def parse_size(spec: str) -> Callable[[], Optional[int]]:
+    """
+    Build a message length generator from a size spec.
+
+    Args:
+        spec (str): "emulator" (the emulator's own messages), "fixed:N",
+            "uniform:MIN-MAX" or "lognormal:MEDIAN[,SIGMA]" (lengths in characters).
+
+    Returns:
+        callable: Returns the next target length, or None to keep the message as is.
+    """
+    kind, _, value = spec.partition(":")
+    try:
+        if kind == "emulator":
+            return lambda: None
+        if kind == "fixed":
+            length = int(value)
+            return lambda: length
+        if kind == "uniform":
+            low, high = (int(v) for v in value.split("-"))
+            return lambda: random.randint(low, high)
+        if kind == "lognormal":
+            median, _, sigma = value.partition(",")
+            mu, sigma = math.log(float(median)), float(sigma or 1.0)
+            return lambda: max(1, int(random.lognormvariate(mu, sigma)))
+    except ValueError:
+        pass
+    raise argparse.ArgumentTypeError(f"Invalid size spec: {spec}")
+
+
+def percentiles(values: List[float]) -> Dict[str, Any]:
+    """Summarize latencies (milliseconds) as count, mean, p50, p99, p999 and max."""
+    if not values:
+        return {"count": 0, "mean": None, "p50": None, "p99": None, "p999": None, "max": None}
+    ordered = sorted(values)
+
+    def pick(q: float) -> float:
+        return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+    return {
+        "count": len(ordered),
+        "mean": sum(ordered) / len(ordered),
+        "p50": pick(0.50),
+        "p99": pick(0.99),
+        "p999": pick(0.999),
+        "max": ordered[-1],
+    }
+
+
+def process_tree(pid: int) -> List[int]:
+    """Return the pid and its child processes (the workers of a multi-process server)."""
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            return [pid] + [int(child) for child in f.read().split()]
+    except OSError:
+        return [pid]
+
+
+def tree_usage(pid: int) -> Dict[str, Optional[float]]:
+    """Sum CPU seconds, RSS and threads over a process and its children."""
+    total = {"cpu_seconds": 0.0, "rss_kb": 0, "threads": 0}
+    for member in process_tree(pid):
+        cpu = cpu_seconds(member)
+        usage = process_usage(member)
+        if cpu is None or usage["rss_kb"] is None:
+            continue
+        total["cpu_seconds"] += cpu
+        total["rss_kb"] += usage["rss_kb"]
+        total["threads"] += usage["threads"]
+    return total
+
+
+def cpu_seconds(pid: int) -> Optional[float]:
+    """Read the user+system CPU time of a process from /proc (Linux only)."""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            # The command name may contain spaces; fields after it are fixed
+            fields = f.read().rsplit(")", 1)[1].split()
+    except OSError:
+        return None
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+class Emitter(threading.Thread):
+    """
+    One simulated device sending the emulator's messages over its own framed connection.
+
+    In closed-loop mode it sends the next batch as soon as the previous one is
+    acknowledged; in open-loop mode it follows a fixed schedule of `rate` msgs/sec
+    and sends whatever is due, so a slow server shows up as backlog, not as a
+    lower offered rate.
+    """
+
+    def __init__(self, index: int, args, deadline: float, rate: Optional[float],
+                 size: Callable[[], Optional[int]]) -> None:
+        super().__init__(daemon=True)
+        self.args = args
+        self.deadline = deadline
+        self.rate = rate
+        self.size = size
+        self.source = device_source(index + 1)
+        self.acked = 0
+        self.errors = 0
+        self.max_backlog = 0
+        # Probes are spread evenly over the emitters
+        self.probe_interval = args.emitters / args.probe_rate if args.probe_rate > 0 else None
+        self.next_probe = time.monotonic()
+
+    def make_record(self, now: float) -> LogMessage:
+        """Build the next record, tagging it as a latency probe when one is due."""
+        level, message = random_log()
+        length = self.size()
+        if length is not None:
+            message = (message + " " + "x" * length)[:length]
+        record = LogMessage(level, message, self.source)
+        if self.probe_interval is not None and now >= self.next_probe:
+            self.next_probe = now + self.probe_interval
+            record.source = PROBE_SOURCE
+            record.message = f"probe {record.timestamp_us} {message}"
+        return record
+
+    def run(self) -> None:
+        conn = FramedConnection(HOST, self.args.port, timeout=10, binary=not self.args.json_encoding)
+        started = time.monotonic()
+        sent = 0
+        while True:
+            now = time.monotonic()
+            if now >= self.deadline:
+                break
+            count = self.args.batch
+            if self.rate is not None:
+                due = int((now - started) * self.rate) - sent
+                if due <= 0:
+                    time.sleep(min((sent + 1) / self.rate - (now - started), self.deadline - now))
+                    continue
+                self.max_backlog = max(self.max_backlog, due)
+                count = min(due, self.args.batch)
+            batch = [self.make_record(now) for _ in range(count)]
+            sent += count
+            try:
+                response = conn.send_records(batch)
+            except (OSError, ValueError) as e:
+                self.errors += count
+                print(f"[Bench Error] Emitter {self.source} send failed: {e}")
+                conn.close()
+                time.sleep(0.1)
+                continue
+            if response.get("status") == "OK":
+                self.acked += count
+            else:
+                self.errors += count
+        conn.close()
+
+
+class ProbeWatcher(threading.Thread):
+    """
+    Poll FETCH_LOGS for new probe records and time how long each took to become queryable.
+
+    The latency of a probe is the time from its creation on the emitter to the poll
+    that first returned it, so it includes the poll interval as resolution. A poll
+    returns at most one FETCH_LOGS page, so the probe rate must stay well below
+    100 probes per poll interval.
+    """
+
+    def __init__(self, args) -> None:
+        super().__init__(daemon=True)
+        self.args = args
+        self.latencies: List[float] = []
+        self.seen = 0
+        self.errors = 0
+        self.running = True
+
+    def poll(self, conn: FramedConnection, cursor: Optional[int]) -> Optional[int]:
+        """Fetch probes newer than the cursor and record their latencies."""
+        today = date.today()
+        response = conn.request({"action": "FETCH_LOGS", "filters": {
+            "level": "ALL",
+            "from": today.isoformat(),
+            "to": (today + timedelta(days=1)).isoformat(),
+            "source": PROBE_SOURCE,
+            "since_id": cursor,
+        }})
+        now_us = time.time_ns() // 1000
+        if response.get("status") != "OK":
+            self.errors += 1
+            return cursor
+        for row in response["data"]:
+            sent_us = int(row["message"].split()[1])
+            self.latencies.append((now_us - sent_us) / 1000)
+        self.seen += len(response["data"])
+        return response.get("cursor", cursor)
+
+    def run(self) -> None:
+        conn = FramedConnection(HOST, self.args.port, timeout=10)
+        cursor = None
+        while self.running:
+            try:
+                cursor = self.poll(conn, cursor)
+            except (OSError, ValueError) as e:
+                self.errors += 1
+                print(f"[Bench Error] Probe watcher failed: {e}")
+                conn.close()
+            time.sleep(self.args.poll_ms / 1000)
+        conn.close()
+
+
+class Reader(threading.Thread):
+    """A GUI-like client issuing FETCH_LOGS queries back to back."""
+
+    def __init__(self, args, deadline: float) -> None:
+        super().__init__(daemon=True)
+        self.args = args
+        self.deadline = deadline
+        self.latencies: List[float] = []
+        self.errors = 0
+
+    def run(self) -> None:
+        conn = FramedConnection(HOST, self.args.port, timeout=10)
+        today = date.today().isoformat()
+        while time.monotonic() < self.deadline:
+            filters = {"level": random.choice(READ_LEVELS), "from": today, "to": today}
+            started = time.perf_counter()
+            try:
+                response = conn.request({"action": "FETCH_LOGS", "filters": filters})
+            except (OSError, ValueError) as e:
+                self.errors += 1
+                print(f"[Bench Error] Reader failed: {e}")
+                conn.close()
+                time.sleep(0.1)
+                continue
+            if response.get("status") == "OK":
+                self.latencies.append((time.perf_counter() - started) * 1000)
+            else:
+                self.errors += 1
+        conn.close()
+
+
+class ResourceSampler(threading.Thread):
+    """Sample the resident memory of the server (and its workers) until stopped."""
+
+    def __init__(self, pid: int, interval: float = 0.25) -> None:
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.samples: List[int] = []
+        self.stop_event = threading.Event()
+
+    def run(self) -> None:
+        while not self.stop_event.is_set():
+            rss = tree_usage(self.pid)["rss_kb"]
+            if rss:
+                self.samples.append(rss)
+            self.stop_event.wait(self.interval)
+
+
+def server_stats(port: int) -> Dict[str, Any]:
+    """Fetch SERVER_STATS from the server under test."""
+    conn = FramedConnection(HOST, port, timeout=10)
+    try:
+        return conn.request({"action": "SERVER_STATS"})
+    finally:
+        conn.close()
+
+
+def wait_for_partitions(port: int, timeout: float = 30) -> None:
+    """With --processes, wait until every worker answers (they start one by one)."""
+    deadline = time.monotonic() + timeout
+    while "missing_partitions" in server_stats(port) and time.monotonic() < deadline:
+        time.sleep(0.2)
+
+
+def wait_for_drain(port: int, acked: int, timeout: float) -> Dict[str, Any]:
+    """Wait until the writer has committed every acknowledged record (or timeout)."""
+    deadline = time.monotonic() + timeout
+    stats = server_stats(port)
+    while time.monotonic() < deadline:
+        writer = stats["writer"]
+        if writer["queue_depth"] == 0 and writer["records"] >= acked:
+            break
+        time.sleep(0.1)
+        stats = server_stats(port)
+    return stats
+
+
+def run_benchmark(args) -> Dict[str, Any]:
+    """Start a local server, drive it with emitters and readers, and collect the results."""
+    workdir = tempfile.mkdtemp(prefix="logbench-")
+    target = os.path.join(workdir, "logs.db" if args.storage == "sqlite" else "segments")
+    command = [
+        sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "server.py"),
+        "--engine", args.engine,
+        "--port", str(args.port),
+        "--storage", args.storage,
+        "--db-path", target,
+    ] + shlex.split(args.server_args)
+    proc = subprocess.Popen(command, stdout=subprocess.DEVNULL)
+    try:
+        wait_for_port(HOST, args.port)
+        wait_for_partitions(args.port)
+        size = parse_size(args.size)
+        cpu_before = tree_usage(proc.pid)["cpu_seconds"]
+        sampler = ResourceSampler(proc.pid)
+        sampler.start()
+
+        started = time.monotonic()
+        deadline = started + args.duration
+        rate = args.rate / args.emitters if args.mode == "open" else None
+        emitters = [Emitter(i, args, deadline, rate, size) for i in range(args.emitters)]
+        readers = [Reader(args, deadline) for _ in range(args.readers)]
+        watcher = ProbeWatcher(args)
+        watcher.start()
+        for thread in emitters + readers:
+            thread.start()
+        for thread in emitters + readers:
+            thread.join()
+        elapsed = time.monotonic() - started
+
+        acked = sum(e.acked for e in emitters)
+        stats = wait_for_drain(args.port, acked, args.drain_timeout)
+        # Give the watcher a last poll so probes committed during the drain are counted
+        time.sleep(args.poll_ms * 2 / 1000)
+        watcher.running = False
+        watcher.join()
+        end_usage = tree_usage(proc.pid)
+        sampler.stop_event.set()
+        sampler.join()
+
+        stored = stats["writer"]["records"]
+        cpu = end_usage["cpu_seconds"] - cpu_before
+        reader_latencies = [lat for r in readers for lat in r.latencies]
+        return {
+            "config": {key: value for key, value in vars(args).items() if key != "json"},
+            "duration_s": elapsed,
+            "ingest": {
+                "offered_rate": args.rate if args.mode == "open" else None,
+                "acked": acked,
+                "msgs_per_sec": acked / elapsed,
+                "send_errors": sum(e.errors for e in emitters),
+                "stored": stored,
+                # Acknowledged by the server but never committed to storage
+                "dropped": max(0, acked - stored),
+                "max_backlog": max((e.max_backlog for e in emitters), default=0),
+            },
+            "queryable_latency_ms": dict(percentiles(watcher.latencies),
+                                         poll_ms=args.poll_ms, errors=watcher.errors),
+            "fetch": dict(percentiles(reader_latencies),
+                          per_sec=len(reader_latencies) / elapsed,
+                          errors=sum(r.errors for r in readers)),
+            "server": {
+                "cpu_seconds": cpu,
+                "cpu_percent": cpu * 100 / elapsed,
+                "rss_peak_kb": max(sampler.samples, default=None),
+                "rss_end_kb": end_usage["rss_kb"],
+                "threads": end_usage["threads"],
+                "writer": stats["writer"],
+                "cache": stats.get("cache"),
+            },
+        }
+    finally:
+        # SIGINT lets the server flush its ingest queue before exiting
+        proc.send_signal(signal.SIGINT)
+        try:
+            proc.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+def format_ms(value: Optional[float]) -> str:
+    return "-" if value is None else f"{value:.1f}ms"
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Load-test a local log server with simulated devices and readers")
+    parser.add_argument("--mode", choices=["open", "closed"], default="closed",
+                        help="open: fixed offered rate (--rate); closed: send as fast as acks return")
+    parser.add_argument("--rate", type=float, default=5000, help="total msgs/sec in open-loop mode")
+    parser.add_argument("--emitters", type=int, default=8, help="simulated devices, one connection each")
+    parser.add_argument("--batch", type=int, default=100, help="max records per frame")
+    parser.add_argument("--size", default="emulator", type=str,
+                        help='message sizes: "emulator", "fixed:N", "uniform:MIN-MAX" or "lognormal:MEDIAN[,SIGMA]"')
+    parser.add_argument("--readers", type=int, default=0, help="concurrent FETCH_LOGS clients")
+    parser.add_argument("--duration", type=float, default=10, help="seconds of load")
+    parser.add_argument("--probe-rate", type=float, default=50,
+                        help="latency probes per second across all emitters (0 disables)")
+    parser.add_argument("--poll-ms", type=float, default=5, help="probe watcher poll interval")
+    parser.add_argument("--drain-timeout", type=float, default=30,
+                        help="seconds to wait for the writer to commit after the load stops")
+    parser.add_argument("--engine", choices=["threaded", "asyncio"], default="threaded")
+    parser.add_argument("--storage", choices=[b for b in BACKENDS if b != "sqlserver"], default="sqlite",
+                        help="local storage backend of the server under test")
+    parser.add_argument("--server-args", default="", help='extra server flags, e.g. "--linger-ms 10"')
+    parser.add_argument("--json-encoding", action="store_true",
+                        help="send JSON batches instead of the negotiated binary encoding")
+    parser.add_argument("--port", type=int, default=5200)
+    parser.add_argument("--json", metavar="PATH", help="also write the results to a JSON file")
+    args = parser.parse_args(argv)
+    parse_size(args.size)
+
+    result = run_benchmark(args)
+
+    ingest, latency, fetch, server = (result["ingest"], result["queryable_latency_ms"],
+                                      result["fetch"], result["server"])
+    print(f"ingest     {ingest['msgs_per_sec']:.0f} msgs/sec ({ingest['acked']} acked, "
+          f"{ingest['send_errors']} errors, {ingest['dropped']} dropped)")
+    print(f"queryable  p50 {format_ms(latency['p50'])}  p99 {format_ms(latency['p99'])}  "
+          f"p999 {format_ms(latency['p999'])}  ({latency['count']} probes)")
+    if args.readers:
+        print(f"fetch      {fetch['per_sec']:.0f} req/sec  p50 {format_ms(fetch['p50'])}  "
+              f"p99 {format_ms(fetch['p99'])}  ({fetch['errors']} errors)")
+    cpu = server["cpu_percent"]
+    print(f"server     CPU {'-' if cpu is None else f'{cpu:.0f}%'}  "
+          f"peak RSS {(server['rss_peak_kb'] or 0) // 1024}MB")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+import bisect
+import hashlib
+from typing import Any, Dict, List, Sequence, Tuple, Union
+from partitions import parse_address
+from protocol import FramedConnection
+
+Address = Tuple[str, int]
+
+
+def parse_members(members: Union[str, Sequence[Union[str, Address]]]) -> List[Address]:
+    """
+    Normalize a cluster member list.
+
+    Args:
+        members: "host:port,host:port", or a list of "host:port" strings or (host, port) tuples.
+
+    Returns:
+        list: (host, port) tuples in the given order.
+    """
+    if isinstance(members, str):
+        members = [member for member in members.split(",") if member.strip()]
+    return [member if isinstance(member, tuple) else parse_address(member) for member in members]
+
+
+def ring_hash(key: str) -> int:
+    """Stable 64-bit hash (Python's hash() differs between processes)."""
+    return int.from_bytes(hashlib.md5(key.encode()).digest()[:8], "big")
+
+
+class HashRing:
+    """
+    Consistent hash ring that maps log sources to cluster nodes.
+
+    Every node is placed on the ring at `vnodes` pseudo-random points; a source
+    belongs to the first node point at or after its own hash. Adding a node only
+    moves the sources that fall just before its points, about 1/N of them, and
+    the rest stay where they were.
+    """
+
+    def __init__(self, nodes: Sequence[Address], vnodes: int = 128) -> None:
+        """
+        Args:
+            nodes (list): (host, port) of every node.
+            vnodes (int): Ring points per node; more points spread sources more evenly.
+        """
+        if not nodes:
+            raise ValueError("A hash ring needs at least one node")
+        points = sorted(
+            (ring_hash(f"{host}:{port}#{i}"), (host, port))
+            for host, port in nodes
+            for i in range(vnodes)
+        )
+        self.nodes = list(nodes)
+        self._hashes = [point for point, _ in points]
+        self._owners = [node for _, node in points]
+
+    def node_for(self, source: str) -> Address:
+        """Return the node that owns a source."""
+        index = bisect.bisect_left(self._hashes, ring_hash(source or ""))
+        return self._owners[index % len(self._owners)]
+
+
+class ClusterConnection:
+    """
+    Client connection to every node of a cluster, with the FramedConnection interface.
+
+    Log records are routed to the node that owns their source, so each node stores
+    whole sources. Other requests (FETCH_LOGS, SEARCH, ...) go to the first node,
+    which coordinates them across the cluster.
+    """
+
+    def __init__(self, members: Union[str, Sequence[Union[str, Address]]],
+                 timeout: float = 5, binary: bool = False) -> None:
+        self.members = parse_members(members)
+        self.ring = HashRing(self.members)
+        self.connections: Dict[Address, FramedConnection] = {
+            member: FramedConnection(member[0], member[1], timeout=timeout, binary=binary)
+            for member in self.members
+        }
+
+    def _route(self, items: List[Any], source_of) -> Dict[Address, List[Any]]:
+        groups: Dict[Address, List[Any]] = {}
+        for item in items:
+            groups.setdefault(self.ring.node_for(source_of(item)), []).append(item)
+        return groups
+
+    def send_records(self, records) -> Dict[str, Any]:
+        """
+        Send LogMessage records, each to the node owning its source.
+
+        A failure on any node raises, so the caller retries or spools the whole batch;
+        records already accepted by other nodes may then be delivered twice.
+        """
+        for node, group in self._route(records, lambda record: record.source).items():
+            response = self.connections[node].send_records(group)
+            if response.get("status") != "OK":
+                return response
+        return {"status": "OK", "count": len(records)}
+
+    def request(self, message: Dict[str, Any]) -> Dict[str, Any]:
+        """Send a request: LOG / LOG_BATCH by source, anything else to the coordinator."""
+        action = message.get("action")
+        if action == "LOG":
+            node = self.ring.node_for(message.get("data", {}).get("source"))
+            return self.connections[node].request(message)
+        if action == "LOG_BATCH":
+            logs = message.get("data") or []
+            for node, group in self._route(logs, lambda log: log.get("source")).items():
+                response = self.connections[node].request(dict(message, data=group))
+                if response.get("status") != "OK":
+                    return response
+            return {"status": "OK", "count": len(logs)}
+        return self.connections[self.members[0]].request(message)
+
+    def close(self) -> None:
+        for conn in self.connections.values():
+            conn.close()
@@ -0,0 +1,235 @@
+import json
+import lzma
+import mmap
+import os
+import struct
+import sys
+import zlib
+from array import array
+from itertools import accumulate
+from typing import Any, Dict, List, Optional, Tuple
+from storage import format_timestamp
+
+# First bytes of a cold segment file
+MAGIC = b"LGC1"
+# Trailer: byte length of the JSON header that precedes it
+TRAILER = struct.Struct("!I")
+
+# Block compressors, by the name stored in the header
+CODECS = {
+    "zlib": (lambda data: zlib.compress(data, 6), zlib.decompress),
+    "lzma": (lambda data: lzma.compress(data, preset=6), lzma.decompress),
+}
+
+# Column types of a block: filter columns, then the columns only read for matches
+FILTER_COLUMNS = (("ids", "Q"), ("timestamps", "d"), ("levels", "H"), ("sources", "I"))
+PAYLOAD_COLUMNS = (("repeat_counts", "I"), ("first_timestamps", "d"), ("lengths", "I"))
+
+
+def to_bytes(values: array) -> bytes:
+    """Serialize an array in big-endian order (the byte order used by every file of the store)."""
+    if sys.byteorder == "little":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def from_bytes(typecode: str, data, offset: int, count: int) -> Tuple[array, int]:
+    """Read `count` big-endian values of an array type; returns the array and the next offset."""
+    values = array(typecode)
+    end = offset + count * values.itemsize
+    values.frombytes(data[offset:end])
+    if sys.byteorder == "little":
+        values.byteswap()
+    return values, end
+
+
+class ColdSegment:
+    """
+    A sealed segment rewritten in a compressed columnar format.
+
+    Records are stored in blocks of up to `block_records`. Level and source are
+    dictionary-encoded against per-file dictionaries, and every block holds two
+    separately compressed parts: the filter columns (id, timestamp, level code,
+    source code) and the payload (repeat columns and messages). A fetch decodes a
+    block's filter columns first and only decompresses its messages when some
+    record matches, so a level or source that is absent from the dictionaries
+    skips the whole file.
+
+    The JSON header at the end of the file holds the dictionaries and a block index
+    [offset, min_ts, max_ts, first_id, count, filter_bytes, payload_bytes] that is
+    compatible with the sparse index of hot segments.
+    """
+
+    SUFFIX = ".cold"
+
+    def __init__(self, path: str) -> None:
+        """Open a cold segment and read its header."""
+        self.path = path
+        with open(path, "rb") as f:
+            f.seek(-TRAILER.size, os.SEEK_END)
+            end = f.tell()
+            (header_len,) = TRAILER.unpack(f.read(TRAILER.size))
+            f.seek(end - header_len)
+            header = json.loads(f.read(header_len))
+        self.first_id = header["first_id"]
+        self.last_id = header["last_id"]
+        self.count = header["count"]
+        self.min_ts = header["min_ts"]
+        self.max_ts = header["max_ts"]
+        self.codec = header["codec"]
+        self.levels: List[str] = header["levels"]
+        self.sources: List[str] = header["sources"]
+        self.level_codes = {level.encode("utf-8"): i for i, level in enumerate(self.levels)}
+        self.source_codes = {source.encode("utf-8"): i for i, source in enumerate(self.sources)}
+        self.blocks: List[List[Any]] = header["blocks"]
+        # Bytes of the hot segment this file replaced, for the compression ratio
+        self.hot_bytes = header.get("hot_bytes", 0)
+        # Records per template id; messages themselves are stored as full text
+        self.template_counts = {int(k): v for k, v in header.get("templates", {}).items()}
+        self.size = os.path.getsize(path)
+        self.sealed = True
+        self._map: Optional[mmap.mmap] = None
+        # Reads holding a snapshot, and whether the store has let go of the segment
+        self.readers = 0
+        self.retired = False
+
+    def overlaps(self, start_ts: float, end_ts: float) -> bool:
+        """Return True if the segment may hold records in [start_ts, end_ts)."""
+        return self.count > 0 and self.min_ts < end_ts and self.max_ts >= start_ts
+
+    def snapshot(self):
+        """Return what read_block() needs; a cold segment never changes."""
+        if self._map is None:
+            with open(self.path, "rb") as f:
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._map, self.size, self.blocks
+
+    def read_block(self, snapshot, j: int, start_ts: float, end_ts: float,
+                   want_level: Optional[bytes], want_source: Optional[bytes], min_id: int = 0) -> List[Any]:
+        """Decode the records of block `j` that match the filters, oldest first."""
+        level_code = source_code = None
+        if want_level is not None:
+            level_code = self.level_codes.get(want_level)
+            if level_code is None:
+                return []
+        if want_source is not None:
+            source_code = self.source_codes.get(want_source)
+            if source_code is None:
+                return []
+        data = snapshot[0]
+        offset, _, _, _, count, filter_bytes, payload_bytes = self.blocks[j]
+        decompress = CODECS[self.codec][1]
+
+        columns = decompress(data[offset:offset + filter_bytes])
+        position = 0
+        ids, position = from_bytes("Q", columns, position, count)
+        timestamps, position = from_bytes("d", columns, position, count)
+        levels, position = from_bytes("H", columns, position, count)
+        sources, position = from_bytes("I", columns, position, count)
+        hits = [
+            k for k in range(count)
+            if ids[k] > min_id and start_ts <= timestamps[k] < end_ts
+            and (level_code is None or levels[k] == level_code)
+            and (source_code is None or sources[k] == source_code)
+        ]
+        if not hits:
+            return []
+
+        payload = decompress(data[offset + filter_bytes:offset + filter_bytes + payload_bytes])
+        position = 0
+        repeat_counts, position = from_bytes("I", payload, position, count)
+        first_timestamps, position = from_bytes("d", payload, position, count)
+        lengths, position = from_bytes("I", payload, position, count)
+        ends = list(accumulate(lengths, initial=position))
+        return [
+            (
+                ids[k],
+                format_timestamp(timestamps[k]),
+                self.levels[levels[k]],
+                payload[ends[k]:ends[k + 1]].decode("utf-8"),
+                self.sources[sources[k]],
+                repeat_counts[k],
+                format_timestamp(first_timestamps[k]) if repeat_counts[k] != 1 else None,
+            )
+            for k in hits
+        ]
+
+    def close(self) -> None:
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+
+    @classmethod
+    def write(cls, path: str, records: List[Tuple], codec: str = "zlib",
+              block_records: int = 4096, hot_bytes: int = 0,
+              template_counts: Optional[Dict[int, int]] = None) -> "ColdSegment":
+        """
+        Write records to a new cold segment file.
+
+        The file is written under a temporary name, synced and renamed, so a crash
+        leaves either the complete file or none.
+
+        Args:
+            path (str): Path of the new file.
+            records (list): (id, ts, level, source, message, repeat_count, first_ts) tuples in
+                id order, with the strings as bytes and the timestamps as epoch seconds.
+            codec (str): "zlib" or "lzma".
+            block_records (int): Records per compressed block.
+            hot_bytes (int): Size of the hot segment being replaced (kept for statistics).
+            template_counts (dict): Records per message template of the hot segment, kept for TEMPLATES.
+
+        Returns:
+            ColdSegment: The new segment, opened.
+        """
+        compress = CODECS[codec][0]
+        level_codes: Dict[bytes, int] = {}
+        source_codes: Dict[bytes, int] = {}
+        blocks = []
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(MAGIC)
+            offset = len(MAGIC)
+            for start in range(0, len(records), block_records):
+                block = records[start:start + block_records]
+                filters = {name: array(typecode) for name, typecode in FILTER_COLUMNS}
+                payload = {name: array(typecode) for name, typecode in PAYLOAD_COLUMNS}
+                messages = []
+                for record_id, ts, level, source, message, repeat_count, first_ts in block:
+                    filters["ids"].append(record_id)
+                    filters["timestamps"].append(ts)
+                    filters["levels"].append(level_codes.setdefault(level, len(level_codes)))
+                    filters["sources"].append(source_codes.setdefault(source, len(source_codes)))
+                    payload["repeat_counts"].append(repeat_count)
+                    payload["first_timestamps"].append(first_ts)
+                    payload["lengths"].append(len(message))
+                    messages.append(message)
+                filter_part = compress(b"".join(to_bytes(filters[name]) for name, _ in FILTER_COLUMNS))
+                payload_part = compress(b"".join(to_bytes(payload[name]) for name, _ in PAYLOAD_COLUMNS)
+                                        + b"".join(messages))
+                f.write(filter_part)
+                f.write(payload_part)
+                timestamps = filters["timestamps"]
+                blocks.append([offset, min(timestamps), max(timestamps), block[0][0], len(block),
+                               len(filter_part), len(payload_part)])
+                offset += len(filter_part) + len(payload_part)
+
+            header = json.dumps({
+                "first_id": records[0][0],
+                "last_id": records[-1][0],
+                "count": len(records),
+                "min_ts": min(block[1] for block in blocks),
+                "max_ts": max(block[2] for block in blocks),
+                "codec": codec,
+                "levels": [level.decode("utf-8") for level in level_codes],
+                "sources": [source.decode("utf-8") for source in source_codes],
+                "blocks": blocks,
+                "templates": template_counts or {},
+                "hot_bytes": hot_bytes,
+            }).encode()
+            f.write(header)
+            f.write(TRAILER.pack(len(header)))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+        return cls(path)
@@ -0,0 +1,137 @@
+import argparse
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from protocol import FramedConnection
+
+
+def wait_for_port(host: str, port: int, timeout: float = 10) -> None:
+    """Block until something accepts connections on host:port."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection((host, port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise TimeoutError(f"Server did not start on {host}:{port}")
+
+
+def process_usage(pid: int) -> dict:
+    """Read thread count and resident memory of a process from /proc (Linux only)."""
+    usage = {"threads": None, "rss_kb": None}
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("Threads:"):
+                    usage["threads"] = int(line.split()[1])
+                elif line.startswith("VmRSS:"):
+                    usage["rss_kb"] = int(line.split()[1])
+    except OSError:
+        pass
+    return usage
+
+
+def run_engine(engine: str, args) -> dict:
+    """Start a server with the given engine, load it, and collect the numbers."""
+    workdir = tempfile.mkdtemp(prefix=f"logbench-{engine}-")
+    proc = subprocess.Popen([
+        sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "server.py"),
+        "--engine", engine,
+        "--port", str(args.port),
+        "--storage", "sqlite",
+        "--db-path", os.path.join(workdir, "logs.db"),
+    ], stdout=subprocess.DEVNULL)
+    try:
+        wait_for_port("127.0.0.1", args.port)
+
+        # Idle emitters: each holds a framed connection open without sending
+        held = []
+        for _ in range(args.connections):
+            conn = FramedConnection("127.0.0.1", args.port, timeout=10)
+            conn.connect()
+            held.append(conn)
+        time.sleep(1)
+        idle_usage = process_usage(proc.pid)
+
+        # Active emitters: pipeline LOG requests as fast as acknowledgements come back
+        sent = [0] * args.senders
+        deadline = time.monotonic() + args.duration
+        record = {
+            "level": "INFO",
+            "message": "Ping response: 15ms",
+            "source": "bench",
+            "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
+        }
+        batch = [{"action": "LOG", "data": record}] * args.pipeline
+
+        def sender(index: int) -> None:
+            conn = FramedConnection("127.0.0.1", args.port, timeout=10)
+            while time.monotonic() < deadline:
+                conn.pipeline(batch)
+                sent[index] += len(batch)
+            conn.close()
+
+        started = time.monotonic()
+        threads = [threading.Thread(target=sender, args=(i,)) for i in range(args.senders)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.monotonic() - started
+        loaded_usage = process_usage(proc.pid)
+
+        for conn in held:
+            conn.close()
+
+        return {
+            "engine": engine,
+            "connections_held": len(held),
+            "idle_threads": idle_usage["threads"],
+            "idle_rss_kb": idle_usage["rss_kb"],
+            "loaded_rss_kb": loaded_usage["rss_kb"],
+            "messages": sum(sent),
+            "msgs_per_sec": sum(sent) / elapsed,
+        }
+    finally:
+        # SIGINT lets the server flush its ingest queue before exiting
+        proc.send_signal(signal.SIGINT)
+        try:
+            proc.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Compare the threaded and asyncio server engines")
+    parser.add_argument("--engines", nargs="+", default=["threaded", "asyncio"])
+    parser.add_argument("--connections", type=int, default=500,
+                        help="idle connections held open during the run")
+    parser.add_argument("--senders", type=int, default=8, help="concurrent emitting connections")
+    parser.add_argument("--pipeline", type=int, default=50, help="LOG frames in flight per sender")
+    parser.add_argument("--duration", type=float, default=5, help="seconds of load per engine")
+    parser.add_argument("--port", type=int, default=5100)
+    parser.add_argument("--json", metavar="PATH", help="also write the results to a JSON file")
+    args = parser.parse_args(argv)
+
+    results = [run_engine(engine, args) for engine in args.engines]
+
+    print(f"{'engine':<10} {'held':>6} {'threads':>8} {'idle RSS':>10} {'loaded RSS':>11} {'msgs/sec':>10}")
+    for r in results:
+        print(f"{r['engine']:<10} {r['connections_held']:>6} {r['idle_threads'] or '-':>8} "
+              f"{(r['idle_rss_kb'] or 0) // 1024:>8}MB {(r['loaded_rss_kb'] or 0) // 1024:>9}MB "
+              f"{r['msgs_per_sec']:>10.0f}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,18 @@
 import pyodbc
-from typing import List, Any, Dict
+from typing import List, Any, Dict, Iterator, Optional
+from storage import StorageBackend, day_bounds
 
+# SQL Server connection string using ODBC Driver 17
+DEFAULT_CONN_STR = (
+    "DRIVER={ODBC Driver 17 for SQL Server};"
+    "SERVER=localhost;"
+    "DATABASE=LoggingDB;"
+    "Trusted_Connection=yes;"
+)
 
-class DBManager:
-    """Database manager for inserting and fetching log entries."""
+
+class DBManager(StorageBackend):
+    """SQL Server database manager for inserting and fetching log entries."""
 
     def __init__(self, conn_str: str) -> None:
         """
@@ -22,9 +31,10 @@ class DBManager:
             log (dict): Log data with keys 'level', 'message', 'source', 'timestamp'.
         """
         query = """
-        INSERT INTO Logs (LogLevel, message, source, timestamp)
-        VALUES (?, ?, ?, ?)
+        INSERT INTO Logs (LogLevel, message, source, timestamp, repeat_count, first_timestamp)
+        VALUES (?, ?, ?, ?, ?, ?)
         """
+        first = log.get("first_timestamp")
         try:
             with pyodbc.connect(self.conn_str) as conn:
                 cursor = conn.cursor()
@@ -33,35 +43,91 @@ class DBManager:
                     log["level"],
                     log["message"],
                     log["source"],
-                    log["timestamp"]
+                    log["timestamp"][:23],
+                    log.get("repeat_count", 1),
+                    first[:23] if first else None
                 )
                 conn.commit()
         except pyodbc.Error as e:
             print(f"[DB Error] Failed to insert log: {e}")
 
-    def fetch_logs(self, level: str, start: str, end: str) -> List[Any]:
+    def insert_logs(self, logs: List[Dict[str, Any]]) -> Optional[List[int]]:
         """
-        Fetch logs from the Logs table based on level and date range.
+        Insert a batch of log entries into the Logs table in one transaction.
+
+        Args:
+            logs (list): Log dicts with keys 'level', 'message', 'source', 'timestamp'.
+
+        Returns:
+            None: IDENTITY values of concurrent sessions interleave, so the ids of a
+            fast_executemany batch cannot be reported.
+
+        Raises:
+            pyodbc.Error: The insert failed and nothing was committed.
+        """
+        if not logs:
+            return None
+        query = """
+        INSERT INTO Logs (LogLevel, message, source, timestamp, repeat_count, first_timestamp)
+        VALUES (?, ?, ?, ?, ?, ?)
+        """
+        # DATETIME keeps milliseconds: cut the microseconds binary clients send
+        params = [
+            (log["level"], log["message"], log["source"], log["timestamp"][:23],
+             log.get("repeat_count", 1), log["first_timestamp"][:23] if log.get("first_timestamp") else None)
+            for log in logs
+        ]
+        # Errors propagate so the batch writer counts the batch as failed
+        with pyodbc.connect(self.conn_str) as conn:
+            cursor = conn.cursor()
+            # Send all parameter sets in a single round trip
+            cursor.fast_executemany = True
+            cursor.executemany(query, params)
+            conn.commit()
+        return None
+
+    def fetch_logs(self, level: str, start: str, end: str, source: Optional[str] = None,
+                   limit: int = 100, since_id: Optional[int] = None,
+                   before_id: Optional[int] = None) -> List[Any]:
+        """
+        Fetch logs from the Logs table based on level, date range and source.
 
         Args:
             level (str): Log level to filter (use "ALL" for no filtering).
             start (str): Start date (YYYY-MM-DD).
             end (str): End date (YYYY-MM-DD).
+            source (str): Only return logs from this source (None for all sources).
+            limit (int): Maximum number of rows.
+            since_id (int): Only return logs with a greater id.
+            before_id (int): Only return logs with a smaller id (the next page).
 
         Returns:
-            List[Any]: List of rows fetched from the database.
+            List[Any]: Rows of (id, timestamp, level, message, source, repeat_count, first_timestamp).
         """
+        # Half-open range on the raw column so IX_Logs_Timestamp_Level can be used
         query = """
-        SELECT TOP 100 id, timestamp, LogLevel, message, source
+        SELECT TOP (?) id, timestamp, LogLevel, message, source, repeat_count, first_timestamp
         FROM Logs
-        WHERE CAST(timestamp AS DATE) BETWEEN ? AND ?
+        WHERE timestamp >= ? AND timestamp < ?
         """
-        params = [start, end]
+        params = [limit, *day_bounds(start, end)]
 
         if level.upper() != "ALL":
             query += " AND LogLevel = ?"
             params.append(level)
 
+        if source:
+            query += " AND source = ?"
+            params.append(source)
+
+        if since_id is not None:
+            query += " AND id > ?"
+            params.append(since_id)
+
+        if before_id is not None:
+            query += " AND id < ?"
+            params.append(before_id)
+
         query += " ORDER BY id DESC"
 
         try:
@@ -71,4 +137,95 @@ class DBManager:
                 return cursor.fetchall()
         except pyodbc.Error as e:
             print(f"[DB Error] Failed to fetch logs: {e}")
-            return []
\ No newline at end of file
+            return []
+
+    def fetch_by_ids(self, ids: List[int]) -> List[Any]:
+        """
+        Fetch specific logs by id.
+
+        Args:
+            ids (list): Ids to look up; unknown ids are skipped.
+
+        Returns:
+            List[Any]: Matching rows.
+        """
+        rows = []
+        try:
+            with pyodbc.connect(self.conn_str) as conn:
+                cursor = conn.cursor()
+                # SQL Server accepts at most 2100 parameters per statement
+                for i in range(0, len(ids), 1000):
+                    chunk = ids[i:i + 1000]
+                    cursor.execute(f"""
+                    SELECT id, timestamp, LogLevel, message, source, repeat_count, first_timestamp
+                    FROM Logs
+                    WHERE id IN ({",".join("?" * len(chunk))})
+                    """, chunk)
+                    rows.extend(cursor.fetchall())
+        except pyodbc.Error as e:
+            print(f"[DB Error] Failed to fetch logs by id: {e}")
+        return rows
+
+    def scan_logs(self, after_id: int, limit: int) -> List[Any]:
+        """
+        Read logs in id order.
+
+        Args:
+            after_id (int): Only return logs with a greater id.
+            limit (int): Maximum number of rows.
+
+        Returns:
+            List[Any]: Rows oldest first.
+        """
+        query = """
+        SELECT TOP (?) id, timestamp, LogLevel, message, source, repeat_count, first_timestamp
+        FROM Logs
+        WHERE id > ?
+        ORDER BY id
+        """
+        try:
+            with pyodbc.connect(self.conn_str) as conn:
+                cursor = conn.cursor()
+                cursor.execute(query, limit, after_id)
+                return cursor.fetchall()
+        except pyodbc.Error as e:
+            print(f"[DB Error] Failed to scan logs: {e}")
+            return []
+
+    def export_logs(self, level: str, start: str, end: str, source: Optional[str] = None,
+                    chunk_size: int = 5000) -> Iterator[List[Any]]:
+        """
+        Stream matching logs in chunks read with fetchmany from one server-side cursor.
+
+        Yields:
+            List[Any]: Chunks of rows, oldest first.
+        """
+        query = """
+        SELECT id, timestamp, LogLevel, message, source, repeat_count, first_timestamp
+        FROM Logs
+        WHERE timestamp >= ? AND timestamp < ?
+        """
+        params = list(day_bounds(start, end))
+
+        if level.upper() != "ALL":
+            query += " AND LogLevel = ?"
+            params.append(level)
+
+        if source:
+            query += " AND source = ?"
+            params.append(source)
+
+        query += " ORDER BY id"
+
+        try:
+            with pyodbc.connect(self.conn_str) as conn:
+                cursor = conn.cursor()
+                cursor.execute(query, params)
+                while True:
+                    rows = cursor.fetchmany(chunk_size)
+                    if not rows:
+                        break
+                    yield rows
+        except pyodbc.Error as e:
+            print(f"[DB Error] Failed to export logs: {e}")
+            raise
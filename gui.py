@@ -1,32 +1,87 @@
+import argparse
 import tkinter as tk
-from tkinter import ttk
+from tkinter import filedialog, ttk
 from tkcalendar import DateEntry
-import socket
-import json
 import threading
-from datetime import datetime
+from collections import deque
+from datetime import datetime, timedelta
+from protocol import FramedConnection
+from partitions import parse_address
+from export import export_logs
 
 
 class LogViewerApp:
     """
     A GUI application for viewing and filtering system logs.
     Connects to a local server to fetch log data and displays it in a structured table.
+    After the initial load, new logs are pushed by the server over a TAIL subscription.
+    Servers without TAIL are polled instead, asking only for rows newer than the last one seen.
+    Entering a search replaces the live view with the newest matching logs.
+
+    The table is a window of consecutive pages. Scrolling near its end fetches the
+    next page in the background (keyset pagination with before_id) and evicts the
+    page farthest away, so any number of logs can be browsed with a bounded table.
     """
 
-    def __init__(self, root):
-        """Initialize the application, styles, and UI components."""
+    # Rows held by the table; pages farther from the view are evicted beyond this count
+    MAX_ROWS = 1000
+    # Rows fetched per page while scrolling
+    PAGE_SIZE = 200
+    # Fraction of the table from either end at which the next page is fetched
+    PREFETCH_MARGIN = 0.1
+    # Delay before resubscribing after the live stream dropped
+    RETRY_MS = 3000
+    # The server sends a heartbeat every few seconds; silence beyond this means it is gone
+    TAIL_TIMEOUT = 15
+    # Sparklines show per-minute counts over this many minutes, redrawn every SPARK_MS
+    SPARK_MINUTES = 60
+    SPARK_MS = 10000
+    SPARK_LEVELS = (("INFO", "#5cb85c"), ("WARNING", "#f0ad4e"), ("ERROR", "#d9534f"), ("CRITICAL", "#a94442"))
+
+    def __init__(self, root, host="127.0.0.1", port=5000):
+        """
+        Initialize the application, styles, and UI components.
+
+        Args:
+            root: The Tk root window.
+            host (str): Server to read from (any cluster node can coordinate queries).
+            port (int): Its port.
+        """
         self.root = root
+        self.host = host
+        self.port = port
         self.root.title("LOG SYSTEM")
         self.root.geometry("1150x700")
         self.root.configure(bg="white")
 
         self.filter_level = tk.StringVar(value="ALL")
+        self.search_text = tk.StringVar()
+
+        # Incremental refresh state: highest id shown and the filters it belongs to
+        self.cursor = None
+        self.cursor_filters = None
+        self.fetching = False
+
+        # Live view state: bumped on every (re)subscribe so stale threads stop applying rows
+        self.generation = 0
+        self.tail_conn = None
+
+        # Paged window, newest page first. A page holds the before_id it was fetched with
+        # (None for the newest), the before_id of the page below it and its table items
+        self.pages = deque([{"before": None, "next": None, "items": []}])
+        # before_id of every page evicted from the top, to fetch them again when scrolling up
+        self.pages_above = []
+        self.paging = False
+        self.page_conn = FramedConnection(host, port, timeout=10)
+        # Pushed logs not shown because the window is scrolled away from the newest page
+        self.missed_live = 0
 
         self.setup_styles()
         self.create_ui()
 
-        # Start the automatic data refresh cycle
-        self.refresh_loop()
+        # Load the table and subscribe to new logs
+        self.start_live_view()
+        self.refresh_sparklines()
 
     def setup_styles(self):
         """Configure the look and feel of the Tkinter widgets."""
@@ -82,19 +137,36 @@ class LogViewerApp:
                                   values=["ALL", "INFO", "WARNING", "ERROR", "CRITICAL"],
                                   width=12, state="readonly")
         level_menu.pack(side="left", padx=5)
+        level_menu.bind("<<ComboboxSelected>>", lambda _: self.reload_view())
 
         # Date Range Filter
         tk.Label(top_bar, text="From:", fg="#6c757d", bg="white", font=("Segoe UI", 10)).pack(side="left", padx=(20, 5))
         self.start_date = DateEntry(top_bar, width=12, background='#007acc', foreground="white", borderwidth=2)
         self.start_date.pack(side="left", padx=5)
+        self.start_date.bind("<<DateEntrySelected>>", lambda _: self.reload_view())
 
         tk.Label(top_bar, text="To:", fg="#6c757d", bg="white", font=("Segoe UI", 10)).pack(side="left", padx=(20, 5))
         self.end_date = DateEntry(top_bar, width=12, background="#007acc", foreground="white", borderwidth=2)
         self.end_date.pack(side="left", padx=5)
+        self.end_date.bind("<<DateEntrySelected>>", lambda _: self.reload_view())
+
+        # Full-text search over message and source (Enter to search, empty to go back to live logs)
+        tk.Label(top_bar, text="Search:", fg="#6c757d", bg="white", font=("Segoe UI", 10)).pack(side="left", padx=(20, 5))
+        search_entry = ttk.Entry(top_bar, textvariable=self.search_text, width=28)
+        search_entry.pack(side="left", padx=5)
+        search_entry.bind("<Return>", lambda _: self.reload_view())
 
-        # Manual Refresh Button
+        # Manual Refresh Button (full reload and resubscribe, or rerun the search)
         ttk.Button(top_bar, text="REFRESH DATA", style="Action.TButton",
-                   command=self.manual_refresh).pack(side="right")
+                   command=self.reload_view).pack(side="right")
+
+        # Save every log matching the level and date filters to a file
+        ttk.Button(top_bar, text="EXPORT", style="Action.TButton",
+                   command=self.export_view).pack(side="right", padx=(0, 10))
+
+        # Per-level activity over the last hour (from the server's rollups)
+        self.spark_canvas = tk.Canvas(self.root, height=56, bg="white", highlightthickness=0)
+        self.spark_canvas.pack(fill="x", padx=25, pady=(10, 0))
 
         # Table Container
         table_frame = tk.Frame(self.root, bg="#f8f9fa", padx=25, pady=25)
@@ -119,12 +191,18 @@ class LogViewerApp:
         self.tree.column("message", width=400)
         self.tree.column("source", width=150)
 
-        # Scrollbar integration
-        scrolly = ttk.Scrollbar(inner_frame, orient="vertical", command=self.tree.yview)
-        self.tree.configure(yscrollcommand=scrolly.set)
+        # Scrollbar integration; scrolling near either end loads the next page
+        self.scrolly = ttk.Scrollbar(inner_frame, orient="vertical", command=self.tree.yview)
+        self.tree.configure(yscrollcommand=self._on_scroll)
 
         self.tree.pack(side="left", fill="both", expand=True)
-        scrolly.pack(side="right", fill="y")
+        self.scrolly.pack(side="right", fill="y")
+
+        # text colors for better readability
+        self.tree.tag_configure("error", foreground="#d9534f")  # Soft red
+        self.tree.tag_configure("critical", foreground="white", background="#d9534f")
+        self.tree.tag_configure("warning", foreground="#f0ad4e")  # Soft orange/amber
+        self.tree.tag_configure("info", foreground="#5cb85c")  # Soft green
 
         # Bottom Status Bar
         self.status_var = tk.StringVar(value="Ready")
@@ -134,65 +212,424 @@ class LogViewerApp:
         tk.Label(status_bar, textvariable=self.status_var, bg="#ffffff", fg="#6c757d",
                  font=("Segoe UI", 9), padx=15).pack(side="left")
 
-    def manual_refresh(self):
-        """Triggered by button click to fetch data immediately."""
-        self.status_var.set("Updating log entries...")
-        threading.Thread(target=self.fetch_data_task, daemon=True).start()
+    def refresh_sparklines(self):
+        """Fetch per-minute counts per level in the background and reschedule."""
+        threading.Thread(target=self.sparkline_task, daemon=True).start()
+        self.root.after(self.SPARK_MS, self.refresh_sparklines)
 
-    def refresh_loop(self):
-        """Automatically fetch data every 2 seconds."""
-        self.manual_refresh()
-        self.root.after(2000, self.refresh_loop)
-
-    def fetch_data_task(self):
-        """Background task to request log data from the server via sockets."""
+    def sparkline_task(self):
+        """Background task: ask for an AGGREGATE histogram of the last SPARK_MINUTES minutes."""
+        now = datetime.now()
+        conn = FramedConnection(self.host, self.port, timeout=5)
         try:
-            request = {
-                "action": "FETCH_LOGS",
+            response = conn.request({
+                "action": "AGGREGATE",
                 "filters": {
-                    "level": self.filter_level.get(),
-                    "from": self.start_date.get_date().strftime("%Y-%m-%d"),
-                    "to": self.end_date.get_date().strftime("%Y-%m-%d")
-                }
-            }
-            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-                s.settimeout(3)
-                s.connect(("127.0.0.1", 5000))
-                s.sendall(json.dumps(request).encode())
-
-                data = b""
-                while True:
-                    chunk = s.recv(8192)
-                    if not chunk:
-                        break
-                    data += chunk
-
-                if data:
-                    response = json.loads(data.decode())
-                    # Update UI on the main thread
-                    self.root.after(0, self._update_table, response["data"])
+                    "from": (now - timedelta(minutes=self.SPARK_MINUTES - 1)).strftime("%Y-%m-%d %H:%M"),
+                    "to": (now + timedelta(minutes=1)).strftime("%Y-%m-%d %H:%M"),
+                },
+                "interval": "1m",
+                "group_by": ["level"]
+            })
+            if response.get("status") == "OK":
+                self.root.after(0, self._draw_sparklines, response)
+        except Exception:
+            # The status bar already reports connection problems
+            pass
+        finally:
+            conn.close()
+
+    def _draw_sparklines(self, result):
+        """Draw one small line chart per level (main thread)."""
+        canvas = self.spark_canvas
+        canvas.delete("all")
+        series = {group["level"]: group["counts"] for group in result["groups"]}
+        buckets = len(result["buckets"])
+        panel = canvas.winfo_width() / len(self.SPARK_LEVELS)
+        for i, (level, color) in enumerate(self.SPARK_LEVELS):
+            counts = series.get(level, [0] * buckets)
+            left = i * panel + 10
+            canvas.create_text(left, 8, anchor="nw", fill="#495057", font=("Segoe UI", 9, "bold"),
+                               text=f"{level}  {sum(counts)}/{self.SPARK_MINUTES}m")
+            peak = max(counts, default=0) or 1
+            width = panel - 30
+            points = []
+            for j, count in enumerate(counts):
+                points.append(left + width * j / max(buckets - 1, 1))
+                points.append(52 - 26 * count / peak)
+            if len(points) >= 4:
+                canvas.create_line(*points, fill=color, width=2)
+
+    def current_filters(self):
+        """Return the filters currently selected in the top bar."""
+        return {
+            "level": self.filter_level.get(),
+            "from": self.start_date.get_date().strftime("%Y-%m-%d"),
+            "to": self.end_date.get_date().strftime("%Y-%m-%d")
+        }
+
+    def reload_view(self):
+        """Show search results if a search is entered, the live view otherwise."""
+        query = self.search_text.get().strip()
+        if query:
+            self.run_search(query)
+        else:
+            self.start_live_view()
+
+    def run_search(self, query):
+        """Stop the live view and show the newest logs matching a search query."""
+        self.generation += 1
+        if self.tail_conn is not None:
+            self.tail_conn.close()
+            self.tail_conn = None
+        self.status_var.set(f"Searching for '{query}'...")
+        threading.Thread(target=self.search_task, args=(query, self.current_filters(), self.generation),
+                         daemon=True).start()
+
+    def search_task(self, query, filters, generation):
+        """Background task: run a SEARCH request with the current level and date filters."""
+        conn = FramedConnection(self.host, self.port, timeout=10)
+        try:
+            response = conn.request({
+                "action": "SEARCH",
+                "query": query,
+                "filters": filters,
+                "limit": self.MAX_ROWS
+            })
+            if response.get("status") != "OK":
+                raise RuntimeError(response.get("error", "search failed"))
+            self.root.after(0, self._show_search_results, response["data"], query, filters, generation)
         except Exception as e:
-            # Handle connection errors gracefully
-            self.root.after(0, lambda: self.status_var.set(f"Connection Status: Offline ({str(e)})"))
-
-    def _update_table(self, logs):
-        """Clear the table and populate it with new log entries."""
-        self.tree.delete(*self.tree.get_children())
+            if generation == self.generation:
+                self.root.after(0, self.status_var.set, f"Search failed: {str(e)}")
+        finally:
+            conn.close()
+
+    def _show_search_results(self, logs, query, filters, generation):
+        """Replace the table with search results (main thread)."""
+        if generation != self.generation:
+            return
+        self._update_table(logs, None, filters, True)
+        # The table no longer matches a live cursor; the next live view reloads it
+        self.cursor_filters = None
+        self.status_var.set(f"Search | {len(logs)} matches for '{query}' | "
+                            f"{datetime.now().strftime('%H:%M:%S')}")
+
+    def start_live_view(self):
+        """Reload the table and (re)subscribe to live logs for the current filters."""
+        self.generation += 1
+        if self.tail_conn is not None:
+            # Unblocks the old tail thread, which then exits
+            self.tail_conn.close()
+            self.tail_conn = None
+        self.status_var.set("Connecting to live log stream...")
+        threading.Thread(target=self.tail_task, args=(self.current_filters(), self.generation),
+                         daemon=True).start()
+
+    def tail_task(self, filters, generation):
+        """
+        Background task: subscribe with TAIL, load the current rows, then apply pushed logs.
+        Subscribing before the initial fetch means no log falls between the two.
+        """
+        conn = FramedConnection(self.host, self.port, timeout=self.TAIL_TIMEOUT)
+        try:
+            conn.connect()
+            self.tail_conn = conn
+            ack = conn.request({"action": "TAIL", "filters": {"level": filters["level"]}})
+            if ack.get("status") != "OK":
+                # Server without TAIL support: fall back to polling
+                conn.close()
+                self.root.after(0, self.refresh_loop, generation)
+                return
+
+            self.fetch_data_task(filters, None)
+
+            while generation == self.generation:
+                message = conn.recv()
+                if message.get("status") == "EVICTED":
+                    raise ConnectionError("live stream fell behind")
+                if message.get("type") == "logs" and message["data"]:
+                    self.root.after(0, self._append_live, message["data"], filters, generation)
+        except Exception as e:
+            if generation == self.generation:
+                self.root.after(0, self.status_var.set, f"Connection Status: Offline ({str(e)})")
+                self.root.after(self.RETRY_MS, self._retry_live_view, generation)
+        finally:
+            conn.close()
+
+    def _retry_live_view(self, generation):
+        """Resubscribe unless the user already triggered a new live view."""
+        if generation == self.generation:
+            self.start_live_view()
+
+    def _append_live(self, logs, filters, generation):
+        """Insert pushed logs at the top of the table (main thread)."""
+        if generation != self.generation:
+            return
+        # The subscription filters by level; the date range is checked here
+        logs = [r for r in logs if filters["from"] <= r["timestamp"][:10] <= filters["to"]]
+        if not logs:
+            return
+        if self.pages_above:
+            # The newest page is not in the table; it is reloaded when scrolling back up
+            self.missed_live += len(logs)
+            self.status_var.set(f"Live | {self.missed_live} new entries above | "
+                                f"Last Event: {datetime.now().strftime('%H:%M:%S')}")
+            return
         for r in logs:
             lvl = r["level"].upper()
-            self.tree.insert("", "end", values=(r["id"], r["timestamp"], lvl, r["message"], r["source"]),
-                             tags=(lvl.lower(),))
+            # Pushed logs are not committed yet, so they have no id
+            item = self.tree.insert("", 0, values=("", r["timestamp"], lvl, self.display_message(r), r["source"]),
+                                    tags=(lvl.lower(),))
+            self.pages[0]["items"].insert(0, item)
+        self._trim_window()
 
-        # text colors for better readability
-        self.tree.tag_configure("error", foreground="#d9534f")  # Soft red
-        self.tree.tag_configure("critical", foreground="white", background="#d9534f")
-        self.tree.tag_configure("warning", foreground="#f0ad4e")  # Soft orange/amber
-        self.tree.tag_configure("info", foreground="#5cb85c")  # Soft green
+        self.status_var.set(f"Live | Last Event: {datetime.now().strftime('%H:%M:%S')} | "
+                            f"Entries: {len(self.tree.get_children())}")
 
-        self.status_var.set(f"Active | Last Sync: {datetime.now().strftime('%H:%M:%S')} | Entries: {len(logs)}")
+    def manual_refresh(self):
+        """Fetch rows newer than the cursor (used when the server cannot push)."""
+        # Skip if the previous request is still running, so rows are never applied twice
+        if self.fetching:
+            return
+        self.fetching = True
+        self.status_var.set("Updating log entries...")
+        filters = self.current_filters()
+        # Changed filters invalidate the cursor and reload the table from scratch
+        since_id = self.cursor if filters == self.cursor_filters else None
+        threading.Thread(target=self.fetch_data_task, args=(filters, since_id), daemon=True).start()
+
+    def refresh_loop(self, generation):
+        """Fallback for servers without TAIL: fetch new data every 2 seconds."""
+        if generation != self.generation:
+            return
+        self.manual_refresh()
+        self.root.after(2000, self.refresh_loop, generation)
+
+    def fetch_data_task(self, filters, since_id):
+        """Background task to request log data from the server."""
+        # Framed responses are read into a preallocated buffer of the announced size
+        conn = FramedConnection(self.host, self.port, timeout=3)
+        try:
+            response = conn.request({
+                "action": "FETCH_LOGS",
+                "filters": dict(filters, since_id=since_id),
+                "page_size": self.PAGE_SIZE
+            })
+            if response.get("status") != "OK":
+                raise RuntimeError(response.get("error", "fetch failed"))
+            # Update UI on the main thread
+            self.root.after(0, self._update_table, response["data"], response.get("cursor"),
+                            filters, since_id is None, response.get("next"))
+        except Exception as e:
+            # Handle connection errors gracefully
+            self.root.after(0, self._fetch_done, f"Connection Status: Offline ({str(e)})")
+        finally:
+            conn.close()
+
+    def export_view(self):
+        """Ask for a file and export every log matching the current filters to it."""
+        path = filedialog.asksaveasfilename(
+            title="Export logs",
+            defaultextension=".ndjson.gz",
+            filetypes=[("Compressed NDJSON", "*.ndjson.gz"), ("NDJSON", "*.ndjson")]
+        )
+        if not path:
+            return
+        self.status_var.set(f"Exporting to {path}...")
+        threading.Thread(target=self.export_task, args=(self.current_filters(), path), daemon=True).start()
+
+    def export_task(self, filters, path):
+        """Background task: stream an EXPORT to a file, gzip-compressed if the name ends in .gz."""
+        try:
+            result = export_logs(self.host, self.port, path, filters["from"], filters["to"],
+                                 level=filters["level"], compress=path.endswith(".gz"))
+            if result.get("status") != "OK":
+                raise RuntimeError(result.get("error", "export failed"))
+            status = f"Exported {result['count']} logs to {path}"
+        except Exception as e:
+            status = f"Export failed: {str(e)}"
+        self.root.after(0, self.status_var.set, status)
+
+    def _fetch_done(self, status=None):
+        """Allow the next refresh and optionally show a status message."""
+        self.fetching = False
+        if status is not None:
+            self.status_var.set(status)
+
+    @staticmethod
+    def display_message(record):
+        """Message text for the table; a summary of suppressed repeats shows its count and first time."""
+        if record.get("repeat_count"):
+            return f"{record['message']}  [repeated {record['repeat_count']}x since {record['first_timestamp']}]"
+        return record["message"]
+
+    def _update_table(self, logs, cursor, filters, reset, next_cursor=None):
+        """
+        Apply a fetch result to the table.
+
+        A full reload (reset) replaces every row with a single page, whose next
+        page is fetched from `next_cursor` when scrolling down. An incremental
+        result only inserts the new rows at the top of the newest page.
+        """
+        self.fetching = False
+        if reset:
+            self.tree.delete(*self.tree.get_children())
+            self.pages = deque([{"before": None, "next": next_cursor, "items": []}])
+            self.pages_above = []
+            self.missed_live = 0
+
+        # Rows arrive newest first; inserting them oldest first at index 0 keeps that order
+        if self.pages_above:
+            # Scrolled away from the newest page: it is reloaded when scrolling back up
+            self.missed_live += len(logs)
+        else:
+            for r in reversed(logs):
+                self.pages[0]["items"].insert(0, self._insert_row(r, 0))
+            self._trim_window()
+
+        self.cursor = cursor
+        self.cursor_filters = filters
+
+        self.status_var.set(f"Active | Last Sync: {datetime.now().strftime('%H:%M:%S')} | "
+                            f"Entries: {len(self.tree.get_children())} | New: {len(logs)}")
+
+    def _insert_row(self, record, index):
+        """Insert one log record into the table at `index` and return its item id."""
+        lvl = record["level"].upper()
+        return self.tree.insert("", index, values=(record["id"], record["timestamp"], lvl,
+                                                   self.display_message(record), record["source"]),
+                                tags=(lvl.lower(),))
+
+    def _trim_window(self):
+        """
+        Keep the table within MAX_ROWS after rows were added at the top.
+
+        Whole pages are evicted from the bottom; they are fetched again from the
+        cursor of the page above them. If the newest page alone is too large, its
+        oldest rows are dropped and its cursor moves up to the oldest row kept.
+        """
+        total = sum(len(page["items"]) for page in self.pages)
+        while total > self.MAX_ROWS and len(self.pages) > 1:
+            total -= self._evict_page(self.pages.pop())
+        if total <= self.MAX_ROWS:
+            return
+        items = self.pages[0]["items"]
+        self.tree.delete(*items[self.MAX_ROWS:])
+        del items[self.MAX_ROWS:]
+        ids = [self.tree.set(item, "id") for item in items]
+        kept = [int(record_id) for record_id in ids if record_id != ""]
+        if kept:
+            self.pages[0]["next"] = min(kept)
+        elif self.pages[0]["next"] is not None:
+            # Only pushed rows are left, whose ids are unknown: reload to get a cursor again
+            self.pages[0]["next"] = None
+            self.start_live_view()
+
+    def _evict_page(self, page):
+        """Remove a page's rows from the table; returns how many rows were removed."""
+        self.tree.delete(*page["items"])
+        return len(page["items"])
+
+    def _on_scroll(self, first, last):
+        """Scrollbar hook: load the page below or above when the view nears an end of the window."""
+        self.scrolly.set(first, last)
+        # Search results are not paged, and only one page is fetched at a time
+        if self.paging or self.cursor_filters is None or not self.pages:
+            return
+        if float(last) >= 1 - self.PREFETCH_MARGIN and self.pages[-1]["next"] is not None:
+            self._fetch_page(self.pages[-1]["next"], "below")
+        elif float(first) <= self.PREFETCH_MARGIN and self.pages_above:
+            if self.pages_above[-1] is None:
+                # Back at the newest page: reload it with everything that arrived meanwhile
+                self.pages_above = []
+                self.start_live_view()
+            else:
+                self._fetch_page(self.pages_above[-1], "above")
+
+    def _fetch_page(self, before_id, position):
+        """Start fetching the page below `before_id` for the bottom ("below") or top ("above") of the window."""
+        self.paging = True
+        threading.Thread(target=self.page_task,
+                         args=(self.cursor_filters, before_id, position, self.generation),
+                         daemon=True).start()
+
+    def page_task(self, filters, before_id, position, generation):
+        """Background task: request one page with a before_id cursor."""
+        try:
+            response = self.page_conn.request({
+                "action": "FETCH_LOGS",
+                "filters": dict(filters, before_id=before_id),
+                "page_size": self.PAGE_SIZE
+            })
+            if response.get("status") != "OK":
+                raise RuntimeError(response.get("error", "fetch failed"))
+            self.root.after(0, self._apply_page, response["data"], before_id, response.get("next"),
+                            position, filters, generation)
+        except Exception as e:
+            # Reconnects on the next page request
+            self.page_conn.close()
+            self.root.after(0, self._page_done, f"Connection Status: Offline ({str(e)})")
+
+    def _page_done(self, status=None):
+        """Allow the next page fetch and optionally show a status message."""
+        self.paging = False
+        if status is not None:
+            self.status_var.set(status)
+
+    def _apply_page(self, logs, before_id, next_cursor, position, filters, generation):
+        """
+        Add a fetched page to the window and evict pages at the other end (main thread).
+
+        The view is moved by the number of rows added or removed above it, so the
+        rows on screen stay in place while the window slides.
+        """
+        try:
+            if generation != self.generation or filters != self.cursor_filters or not self.pages:
+                return
+            first_row = round(self.tree.yview()[0] * len(self.tree.get_children()))
+            total = sum(len(page["items"]) for page in self.pages)
+
+            if position == "below":
+                if before_id != self.pages[-1]["next"]:
+                    return
+                if not logs:
+                    self.pages[-1]["next"] = None
+                    return
+                self.pages.append({"before": before_id, "next": next_cursor,
+                                   "items": [self._insert_row(r, "end") for r in logs]})
+                total += len(logs)
+                while total > self.MAX_ROWS and len(self.pages) > 1:
+                    evicted = self.pages.popleft()
+                    self.pages_above.append(evicted["before"])
+                    removed = self._evict_page(evicted)
+                    total -= removed
+                    first_row -= removed
+            else:
+                if not self.pages_above or before_id != self.pages_above[-1]:
+                    return
+                self.pages_above.pop()
+                self.pages.appendleft({"before": before_id, "next": next_cursor,
+                                       "items": [self._insert_row(r, i) for i, r in enumerate(logs)]})
+                total += len(logs)
+                first_row += len(logs)
+                while total > self.MAX_ROWS and len(self.pages) > 1:
+                    total -= self._evict_page(self.pages.pop())
+
+            self.tree.yview_moveto(max(first_row, 0) / total if total else 0)
+            self.status_var.set(f"Browsing | Pages {len(self.pages_above) + 1}-"
+                                f"{len(self.pages_above) + len(self.pages)} | Entries: {total}")
+        finally:
+            self.paging = False
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Log viewer")
+    parser.add_argument("--server", default="127.0.0.1:5000",
+                        help="host:port of the log server (or of any cluster node)")
+    args = parser.parse_args()
+    host, port = parse_address(args.server)
+
     root = tk.Tk()
-    app = LogViewerApp(root)
+    app = LogViewerApp(root, host, port)
     root.mainloop()
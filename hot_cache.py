@@ -0,0 +1,181 @@
+import bisect
+import itertools
+import threading
+from collections import deque
+from typing import Any, Dict, List, Optional
+from storage import day_bounds
+
+
+class HotCache:
+    """
+    In-memory window of the most recently committed log records.
+
+    Rows (id, timestamp, level, message, source, ...) are kept in id order in a ring of
+    `capacity` records, with secondary per-level and per-source rings holding the
+    same row tuples. A FETCH_LOGS query is answered from memory when the window
+    provably contains every row the storage backend would return; otherwise
+    `query()` reports a miss and the caller falls through to storage.
+    """
+
+    def __init__(self, capacity: int = 10000) -> None:
+        """
+        Args:
+            capacity (int): Maximum number of records kept in memory.
+        """
+        self.capacity = capacity
+        self._lock = threading.Lock()
+        self._rows = deque()
+        self._by_level: Dict[str, deque] = {}
+        self._by_source: Dict[str, deque] = {}
+        # Every committed id >= complete_from is in the window (None until the first commit)
+        self.complete_from: Optional[int] = None
+        self.hits = 0
+        self.misses = 0
+
+    def add(self, logs: List[Dict[str, Any]], ids: Optional[List[int]]) -> None:
+        """
+        Add a committed batch; registered as a BatchWriter commit listener.
+
+        Args:
+            logs (list): The committed log dicts.
+            ids (list): The ids storage assigned to them, or None if unknown.
+        """
+        if ids is None or len(ids) != len(logs):
+            # Rows without ids cannot be merged with storage results: stop serving hits
+            with self._lock:
+                self._clear()
+            return
+        if not logs:
+            return
+        rows = [
+            (record_id, str(log["timestamp"]), log["level"], log["message"], log["source"],
+             log.get("repeat_count", 1), log.get("first_timestamp"))
+            for record_id, log in zip(ids, logs)
+        ]
+        with self._lock:
+            newest = self._rows[-1][0] if self._rows else None
+            if newest is None or ids[0] != newest + 1:
+                if newest is not None and ids[0] < newest:
+                    # A concurrent writer committed out of order: ids above this batch
+                    # are cached, but nothing proves the ones below it are
+                    for row in rows:
+                        self._insert_sorted(row)
+                    if self.complete_from is not None and ids[-1] == self.complete_from - 1:
+                        # It filled the gap right below the complete range: extend the range
+                        # down over the contiguous ids the window already holds
+                        i = bisect.bisect_left(self._rows, (ids[0],))
+                        while i > 0 and self._rows[i - 1][0] == self._rows[i][0] - 1:
+                            i -= 1
+                        self.complete_from = self._rows[i][0]
+                    self._evict()
+                    return
+                # Gap before this batch (or first batch): completeness restarts here
+                self.complete_from = ids[0]
+            for row in rows:
+                self._rows.append(row)
+                self._by_level.setdefault(row[2], deque()).append(row)
+                self._by_source.setdefault(row[4], deque()).append(row)
+            self._evict()
+
+    def _insert_sorted(self, row) -> None:
+        """Insert a row into every ring at its id position."""
+        bisect.insort(self._rows, row)
+        bisect.insort(self._by_level.setdefault(row[2], deque()), row)
+        bisect.insort(self._by_source.setdefault(row[4], deque()), row)
+
+    def _evict(self) -> None:
+        """Drop the oldest rows beyond capacity from every ring."""
+        while len(self._rows) > self.capacity:
+            row = self._rows.popleft()
+            # The oldest row overall is also the oldest of its level and source
+            for index, key in ((self._by_level, row[2]), (self._by_source, row[4])):
+                ring = index[key]
+                ring.popleft()
+                if not ring:
+                    del index[key]
+            if self.complete_from is not None:
+                self.complete_from = max(self.complete_from, row[0] + 1)
+
+    def _clear(self) -> None:
+        self._rows.clear()
+        self._by_level.clear()
+        self._by_source.clear()
+        self.complete_from = None
+
+    def query(self, level: str, start: str, end: str, source: Optional[str] = None,
+              limit: int = 100, since_id: Optional[int] = None,
+              before_id: Optional[int] = None) -> Optional[List[Any]]:
+        """
+        Answer a FETCH_LOGS query from memory if the window covers it.
+
+        Takes the same arguments as StorageBackend.fetch_logs.
+
+        Returns:
+            list: Rows of (id, timestamp, level, message, source), newest first,
+            or None if the query needs rows older than the window (a miss).
+        """
+        start_key, end_key = day_bounds(start, end)
+        want_level = None if level.upper() == "ALL" else level
+        min_id = since_id if since_id is not None else 0
+
+        with self._lock:
+            complete_from = self.complete_from
+            if complete_from is None:
+                self.misses += 1
+                return None
+            # Scan the narrowest ring that already satisfies one of the filters
+            if source:
+                ring = self._by_source.get(source, ())
+            elif want_level is not None:
+                ring = self._by_level.get(want_level, ())
+            else:
+                ring = self._rows
+
+            newest = reversed(ring)
+            if before_id is not None:
+                # Skip the rows at or above the page cursor (the ring is in id order)
+                newest = itertools.islice(newest, len(ring) - bisect.bisect_left(ring, (before_id,)), None)
+
+            rows = []
+            for row in newest:
+                record_id = row[0]
+                if record_id <= min_id or record_id < complete_from:
+                    break
+                if not start_key <= row[1] < end_key:
+                    continue
+                if want_level is not None and row[2] != want_level:
+                    continue
+                rows.append(row)
+                if len(rows) >= limit:
+                    break
+
+            # The window is complete above since_id if it reaches down to the cursor. Otherwise
+            # a full page proves there is nothing newer elsewhere, but not for a since_id poll:
+            # with several writers, batches below the window may still be on their way to the
+            # cache, and a page from above them would move the client's cursor past them
+            if min_id >= complete_from - 1 or (since_id is None and len(rows) >= limit):
+                self.hits += 1
+                return rows
+            self.misses += 1
+            return None
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Return cache occupancy and hit/miss counters.
+
+        Returns:
+            dict: size, capacity, complete_from, hits, misses and hit_ratio.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._rows),
+                "capacity": self.capacity,
+                "complete_from": self.complete_from,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
+
+    def __len__(self) -> int:
+        return len(self._rows)
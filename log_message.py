@@ -1,11 +1,19 @@
+import time
 from datetime import datetime
-from typing import Dict
+from typing import Dict, Optional
 
 
 class LogMessage:
-    """Represents a log message with level, source, and timestamp."""
+    """
+    Represents a log message with level, source, and timestamp.
 
-    def __init__(self, level: str, message: str, source: str) -> None:
+    Uses __slots__ (no per-instance __dict__) and keeps the timestamp as integer
+    epoch microseconds; it is only formatted as text when converted with to_dict().
+    """
+
+    __slots__ = ("level", "message", "source", "timestamp_us")
+
+    def __init__(self, level: str, message: str, source: str, timestamp_us: Optional[int] = None) -> None:
         """
         Initialize a log message.
 
@@ -13,11 +21,18 @@ class LogMessage:
             level (str): Log level (e.g., INFO, ERROR).
             message (str): Log message content.
             source (str): Source of the log message.
+            timestamp_us (int): Epoch microseconds (defaults to now).
         """
         self.level: str = level.upper()
         self.message: str = message
         self.source: str = source
-        self.timestamp: datetime = datetime.now()
+        self.timestamp_us: int = time.time_ns() // 1000 if timestamp_us is None else timestamp_us
+
+    @property
+    def timestamp(self) -> datetime:
+        """The creation time as a local datetime."""
+        seconds, micros = divmod(self.timestamp_us, 1000000)
+        return datetime.fromtimestamp(seconds).replace(microsecond=micros)
 
     def to_dict(self) -> Dict[str, str]:
         """
@@ -30,5 +45,6 @@ class LogMessage:
             "level": self.level,
             "message": self.message,
             "source": self.source,
-            "timestamp": self.timestamp.strftime("%Y-%m-%d %H:%M:%S")
+            # Same text as BinaryDecoder produces, so every path stores the microseconds
+            "timestamp": self.timestamp.strftime("%Y-%m-%d %H:%M:%S.%f")
         }
\ No newline at end of file
@@ -1,17 +1,63 @@
+import atexit
+import random
 import socket
-import json
+import threading
+import time
+from collections import deque
 from log_message import LogMessage
+from protocol import FramedConnection
+from cluster import ClusterConnection
+from spool import DiskSpool
+
+# What log() does when the async buffer is full
+OVERFLOW_POLICIES = ("block", "drop_oldest", "drop_newest")
+
+
+class ThrottledError(Exception):
+    """The server refused a request because a source is over its rate limit."""
+
+    def __init__(self, retry_after: float) -> None:
+        super().__init__(f"Throttled by the server, retry in {retry_after}s")
+        self.retry_after = retry_after
+
+
+def check_throttled(response: dict) -> dict:
+    """Raise ThrottledError for a THROTTLED response, otherwise return it."""
+    if response.get("status") == "THROTTLED":
+        raise ThrottledError(response.get("retry_after", 1.0))
+    return response
 
 
 class Logger:
     """
     Singleton Logger class to handle sending log messages to a central server.
     Captures hostname and IP address automatically.
+    Keeps one long-lived framed connection to the server and reuses it for every message.
+
+    In async mode, log() only appends the message to a bounded in-memory buffer and a
+    background thread sends buffered messages to the server in batches.
+
+    With a spool directory, messages that cannot be sent (or that overflow the buffer)
+    are written to an on-disk spool and replayed in bulk, in order, once the server is back.
+
+    Messages are sent in the compact binary encoding when the server supports it
+    (negotiated per connection), and as JSON otherwise.
+
+    Given a list of cluster `hosts`, each message goes to the node that owns its
+    source on a consistent hash ring instead of to a single server.
+
+    When the server throttles a source, the async sender waits the advised
+    `retry_after` and resends the batch, so the buffer's overflow policy applies.
     """
     _instance = None
 
-    def __new__(cls, host="127.0.0.1", port=5000):
+    def __new__(cls, host="127.0.0.1", port=5000, async_mode=False, buffer_size=10000,
+                overflow="block", batch_size=500, flush_interval=0.1,
+                spool_dir=None, spool_max_bytes=256 * 1024 * 1024, spool_fsync="interval",
+                retry_interval=2.0, binary=True, hosts=None):
         if cls._instance is None:
+            if overflow not in OVERFLOW_POLICIES:
+                raise ValueError(f"overflow must be one of {OVERFLOW_POLICIES}")
             cls._instance = super().__new__(cls)
             cls._instance.host = host
             cls._instance.port = port
@@ -19,30 +65,317 @@ class Logger:
             # Fetch hostname and IP address once during initialization
             cls._instance.hostname = socket.gethostname()
             cls._instance.ip_address = socket.gethostbyname(cls._instance.hostname)
+
+            # Persistent connection shared by all threads using the singleton
+            if hosts:
+                # Cluster mode: one connection per node, records routed by source
+                cls._instance._conn = ClusterConnection(hosts, timeout=5, binary=binary)
+                cls._instance.host, cls._instance.port = cls._instance._conn.members[0]
+            else:
+                cls._instance._conn = FramedConnection(host, port, timeout=5, binary=binary)
+            cls._instance._lock = threading.Lock()
+
+            # Optional on-disk spool for messages that could not be delivered
+            cls._instance.spool = None
+            if spool_dir is not None:
+                cls._instance.spool = DiskSpool(spool_dir, max_bytes=spool_max_bytes, fsync=spool_fsync)
+            cls._instance.retry_interval = retry_interval
+            cls._instance._next_replay = 0.0
+            cls._instance._replay_lock = threading.Lock()
+            cls._instance.spooled_count = 0
+            cls._instance.replayed_count = 0
+
+            cls._instance.async_mode = async_mode
+            if async_mode:
+                cls._instance._start_async(buffer_size, overflow, batch_size, flush_interval)
         return cls._instance
 
+    def _start_async(self, buffer_size: int, overflow: str, batch_size: int, flush_interval: float) -> None:
+        """Set up the ring buffer and start the background sender thread."""
+        self.buffer_size = buffer_size
+        self.overflow = overflow
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        self._buffer = deque()
+        self._cond = threading.Condition()
+        # Messages taken from the buffer but not yet acknowledged by the server
+        self._in_flight = 0
+        self._closed = False
+
+        # Counters exposed through stats()
+        self.sent_count = 0
+        self.dropped_oldest = 0
+        self.dropped_newest = 0
+        self.failed_count = 0
+        self.throttled_count = 0
+
+        self._sender = threading.Thread(target=self._send_loop, name="LoggerSender", daemon=True)
+        self._sender.start()
+        # Deliver whatever is still buffered when the process exits normally
+        atexit.register(self.close)
+
     def log(self, level: str, message: str, source: str = None) -> None:
         """
         Sends a log message to the server.
         If no source is provided, it defaults to the machine's hostname and IP.
+        In async mode the message is only buffered; see flush().
         """
         # Default source to Hostname (IP) if not manually specified
         if source is None:
             source = f"{self.hostname} ({self.ip_address})"
 
         log_msg = LogMessage(level, message, source)
-        payload = {
-            "action": "LOG",
-            "data": log_msg.to_dict()
-        }
+
+        if self.async_mode:
+            self._enqueue(log_msg)
+            return
+
+        if self.spool is not None and not self.spool.is_empty():
+            # Older messages are still spooled: queue behind them to keep the order
+            self._spool_records([log_msg.to_dict()])
+            self._replay_spool()
+            return
 
         try:
-            # Create a TCP socket and connect to the server
-            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
-                sock.connect((self.host, self.port))
-                # Encode and send the JSON payload
-                sock.sendall(json.dumps(payload).encode("utf-8"))
+            self._send_records([log_msg])
         except ConnectionRefusedError:
-            print(f"[Logger Error] Connection refused: Is the server running at {self.host}:{self.port}?")
+            if self.spool is not None:
+                self._spool_records([log_msg.to_dict()])
+            else:
+                print(f"[Logger Error] Connection refused: Is the server running at {self.host}:{self.port}?")
         except Exception as e:
-            print(f"[Logger Error] {e}")
\ No newline at end of file
+            if self.spool is not None:
+                self._spool_records([log_msg.to_dict()])
+            else:
+                print(f"[Logger Error] {e}")
+
+    def _enqueue(self, log_msg: LogMessage) -> None:
+        """Append a message to the ring buffer, applying the overflow policy when it is full."""
+        with self._cond:
+            if self._closed:
+                self.dropped_newest += 1
+                return
+            if len(self._buffer) >= self.buffer_size:
+                if self.spool is not None:
+                    # Move the whole backlog to disk so the spool keeps message order
+                    backlog = [m.to_dict() for m in self._buffer]
+                    backlog.append(log_msg.to_dict())
+                    self._buffer.clear()
+                    self._spool_records(backlog)
+                    self._cond.notify_all()
+                    return
+                if self.overflow == "drop_newest":
+                    self.dropped_newest += 1
+                    return
+                if self.overflow == "drop_oldest":
+                    self._buffer.popleft()
+                    self.dropped_oldest += 1
+                else:
+                    # block: wait for the sender to make room
+                    while len(self._buffer) >= self.buffer_size and not self._closed:
+                        self._cond.wait()
+                    if self._closed:
+                        # Woken by close(): the sender may already have drained and exited
+                        self.dropped_newest += 1
+                        return
+            self._buffer.append(log_msg)
+            # Wake the sender early once a full batch is waiting
+            if len(self._buffer) >= self.batch_size:
+                self._cond.notify_all()
+
+    def _send_loop(self) -> None:
+        """Background thread: send buffered messages to the server in batches."""
+        while True:
+            with self._cond:
+                if not self._buffer and not self._closed:
+                    self._cond.wait(self.flush_interval)
+                if not self._buffer:
+                    if self._closed:
+                        return
+                    idle = True
+                else:
+                    idle = False
+            if idle:
+                # Nothing new to send: use the quiet time to drain the spool
+                if self.spool is not None and not self.spool.is_empty():
+                    self._replay_spool()
+                continue
+
+            with self._cond:
+                count = min(len(self._buffer), self.batch_size)
+                batch = [self._buffer.popleft() for _ in range(count)]
+                self._in_flight = count
+                # Room was made for producers blocked by the "block" policy
+                self._cond.notify_all()
+
+            # Serialize outside the lock so producers are never held up by it
+            sent = False
+            if self.spool is not None and not self.spool.is_empty():
+                # Older messages are still spooled: queue behind them to keep the order
+                self._spool_records([m.to_dict() for m in batch])
+                self._replay_spool()
+            else:
+                try:
+                    self._send_throttled(batch)
+                    sent = True
+                except Exception as e:
+                    if self.spool is not None:
+                        self._spool_records([m.to_dict() for m in batch])
+                        self._next_replay = time.monotonic() + getattr(e, "retry_after", self.retry_interval)
+                    else:
+                        print(f"[Logger Error] Failed to send {count} buffered logs: {e}")
+                        # Avoid spinning against a server that is down
+                        time.sleep(self.flush_interval)
+
+            with self._cond:
+                if sent:
+                    self.sent_count += count
+                elif self.spool is None:
+                    self.failed_count += count
+                self._in_flight = 0
+                self._cond.notify_all()
+
+    def _send_throttled(self, batch: list) -> None:
+        """
+        Send a batch, waiting and resending while the server throttles it.
+
+        Without a spool the batch is held until the server takes it, so producers
+        feel the backpressure through the buffer. With a spool it is spooled instead.
+        """
+        while True:
+            try:
+                self._send_records(batch)
+                return
+            except ThrottledError as e:
+                with self._cond:
+                    self.throttled_count += 1
+                if self.spool is not None or self._closed:
+                    raise
+                time.sleep(e.retry_after)
+
+    def _spool_records(self, records: list) -> None:
+        """Write undeliverable records to the disk spool."""
+        try:
+            self.spool.append(records)
+            self.spooled_count += len(records)
+        except OSError as e:
+            print(f"[Logger Error] Failed to spool {len(records)} logs: {e}")
+
+    def _replay_spool(self, batch_size: int = 1000) -> None:
+        """
+        Send spooled records to the server in bulk, oldest first.
+        After a failure, retries wait for retry_interval (with jitter) so that many
+        emitters do not reconnect at the same moment when the server comes back.
+        """
+        if time.monotonic() < self._next_replay:
+            return
+        if not self._replay_lock.acquire(blocking=False):
+            # Another thread is already replaying
+            return
+        try:
+            while True:
+                records, token = self.spool.read_batch(batch_size)
+                if not records:
+                    return
+                try:
+                    self._send({"action": "LOG_BATCH", "data": records})
+                except ThrottledError as e:
+                    self._next_replay = time.monotonic() + e.retry_after
+                    return
+                except Exception:
+                    self._next_replay = time.monotonic() + self.retry_interval * random.uniform(0.5, 1.5)
+                    return
+                self.spool.ack(token)
+                self.replayed_count += len(records)
+        finally:
+            self._replay_lock.release()
+
+    def flush(self, timeout: float = None) -> bool:
+        """
+        Wait until every buffered message has been handed to the server.
+
+        Args:
+            timeout (float): Maximum seconds to wait (None waits indefinitely).
+
+        Returns:
+            bool: True if the buffer was drained within the timeout.
+        """
+        if not self.async_mode:
+            return True
+        with self._cond:
+            self._cond.notify_all()
+            return self._cond.wait_for(lambda: not self._buffer and not self._in_flight, timeout)
+
+    def stats(self) -> dict:
+        """
+        Return delivery and drop counters of the async buffer and the spool.
+
+        Returns:
+            dict: Buffered, sent, dropped, failed, throttled, spooled and replayed message counts.
+        """
+        stats = {}
+        if self.async_mode:
+            with self._cond:
+                stats.update({
+                    "buffered": len(self._buffer),
+                    "sent": self.sent_count,
+                    "dropped_oldest": self.dropped_oldest,
+                    "dropped_newest": self.dropped_newest,
+                    "failed": self.failed_count,
+                    "throttled": self.throttled_count,
+                })
+        if self.spool is not None:
+            stats.update({
+                "spooled": self.spooled_count,
+                "replayed": self.replayed_count,
+                "spool_pending_bytes": self.spool.pending_bytes,
+                "spool_dropped": self.spool.dropped_records,
+            })
+        return stats
+
+    def _send(self, payload: dict) -> dict:
+        """
+        Send one request over the persistent connection and wait for its acknowledgement.
+        A broken connection (e.g. after a server restart) is reopened and the request retried once.
+        """
+        with self._lock:
+            try:
+                return check_throttled(self._conn.request(payload))
+            except (ConnectionError, OSError):
+                self._conn.close()
+            try:
+                return check_throttled(self._conn.request(payload))
+            except ThrottledError:
+                raise
+            except Exception:
+                self._conn.close()
+                raise
+
+    def _send_records(self, records: list) -> dict:
+        """Send LogMessage records as one batch, reconnecting and retrying once like _send()."""
+        with self._lock:
+            try:
+                return check_throttled(self._conn.send_records(records))
+            except (ConnectionError, OSError):
+                self._conn.close()
+            try:
+                return check_throttled(self._conn.send_records(records))
+            except ThrottledError:
+                raise
+            except Exception:
+                self._conn.close()
+                raise
+
+    def close(self) -> None:
+        """Flush buffered messages (async mode), stop the sender and close the connection."""
+        if self.async_mode and not self._closed:
+            self.flush(timeout=10)
+            with self._cond:
+                self._closed = True
+                self._cond.notify_all()
+            self._sender.join(timeout=10)
+        if self.spool is not None:
+            self.spool.close()
+        with self._lock:
+            self._conn.close()
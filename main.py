@@ -1,22 +1,52 @@
+import argparse
 import threading
 import tkinter as tk
-from server import LogServer
+from server import create_server, ENGINES
+from storage import create_backend, BACKENDS
+from search_index import default_search_dir
+from rollups import default_rollup_path
+from partitions import parse_address
 from gui import LogViewerApp
 
 
-def start_server():
+def start_server(engine="threaded", storage="sqlserver", db_path=None, port=5000):
     """
     Start the log server in a separate thread.
+
+    Args:
+        engine (str): Server engine, "threaded" or "asyncio".
+        storage (str): Storage backend name (see storage.BACKENDS).
+        db_path (str): Connection string, file or directory for the backend.
+        port (int): Port the server listens on.
     """
-    server = LogServer()
+    server = create_server(engine, port=port, db=create_backend(storage, db_path),
+                           search_dir=default_search_dir(storage, db_path),
+                           rollup_path=default_rollup_path(storage, db_path))
     server.start()
 
 
 if __name__ == "__main__":
-    # Start the server in a daemon thread so it closes automatically with the GUI
-    threading.Thread(target=start_server, daemon=True).start()
+    parser = argparse.ArgumentParser(description="Start the log server and the log viewer")
+    parser.add_argument("--engine", choices=ENGINES, default="threaded",
+                        help="connection handling model of the embedded server")
+    parser.add_argument("--storage", choices=BACKENDS, default="sqlserver",
+                        help="storage backend of the embedded server")
+    parser.add_argument("--db-path", metavar="TARGET",
+                        help="ODBC connection string, SQLite file or segment directory")
+    parser.add_argument("--port", type=int, default=5000, help="port of the embedded server")
+    parser.add_argument("--connect", metavar="HOST:PORT",
+                        help="view an existing server or cluster node instead of starting one")
+    args = parser.parse_args()
+
+    if args.connect:
+        host, port = parse_address(args.connect)
+    else:
+        host, port = "127.0.0.1", args.port
+        # Start the server in a daemon thread so it closes automatically with the GUI
+        threading.Thread(target=start_server, args=(args.engine, args.storage, args.db_path, args.port),
+                         daemon=True).start()
 
     # Initialize the GUI application
     root = tk.Tk()
-    app = LogViewerApp(root)
-    root.mainloop()
+    app = LogViewerApp(root, host, port)
+    root.mainloop()
\ No newline at end of file
@@ -0,0 +1,284 @@
+import bisect
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+# Upper bounds (seconds) of the latency histogram buckets, 100µs to 10s
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+                   0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Prefix of every metric name in the Prometheus output
+PREFIX = "logserver_"
+
+
+class Histogram:
+    """Fixed-bucket latency histogram (cumulative buckets, as Prometheus expects)."""
+
+    def __init__(self, bounds: Tuple[float, ...] = LATENCY_BUCKETS) -> None:
+        self.bounds = bounds
+        self._counts = [0] * (len(bounds) + 1)
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float) -> None:
+        index = bisect.bisect_left(self.bounds, seconds)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += seconds
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Return the histogram as counts plus estimated percentiles.
+
+        Returns:
+            dict: count, sum (seconds), p50_ms/p99_ms/p999_ms (bucket upper bounds,
+            None past the last bucket) and cumulative [bound, count] buckets.
+        """
+        with self._lock:
+            counts = list(self._counts)
+            total = self._sum
+        count = sum(counts)
+        cumulative = []
+        running = 0
+        for bound, n in zip(self.bounds + (float("inf"),), counts):
+            running += n
+            cumulative.append((bound, running))
+
+        def quantile(q: float) -> Optional[float]:
+            if not count:
+                return None
+            rank = q * count
+            for bound, seen in cumulative:
+                if seen >= rank:
+                    return None if bound == float("inf") else bound * 1000
+            return None
+
+        return {
+            "count": count,
+            "sum": total,
+            "p50_ms": quantile(0.50),
+            "p99_ms": quantile(0.99),
+            "p999_ms": quantile(0.999),
+            "buckets": [[bound, seen] for bound, seen in cumulative[:-1]],
+        }
+
+
+class RateMeter:
+    """Events per second over a sliding window of whole seconds."""
+
+    def __init__(self, window: int = 10) -> None:
+        self.window = window
+        self._seconds = deque()
+        self._lock = threading.Lock()
+
+    def mark(self, n: int = 1) -> None:
+        second = int(time.monotonic())
+        with self._lock:
+            if self._seconds and self._seconds[-1][0] == second:
+                self._seconds[-1][1] += n
+            else:
+                self._seconds.append([second, n])
+                while self._seconds[0][0] <= second - self.window - 1:
+                    self._seconds.popleft()
+
+    def rate(self) -> float:
+        """Average over the last `window` completed seconds."""
+        now = int(time.monotonic())
+        with self._lock:
+            total = sum(n for second, n in self._seconds if now - self.window <= second < now)
+        return total / self.window
+
+
+def label_key(labels: Dict[str, Any]) -> Tuple[Tuple[str, str], ...]:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def format_labels(key: Tuple[Tuple[str, str], ...], extra: str = "") -> str:
+    parts = [f'{name}="{value}"' for name, value in key]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Metrics:
+    """
+    Registry of the server's counters, gauges, latency histograms and rate meters.
+
+    Counters and histograms are created on first use and may carry labels
+    (e.g. `inc("errors_total", type="invalid_request")`). Gauges are callables
+    read at snapshot time, so queue depths and connection counts cost nothing
+    until someone asks.
+    """
+
+    def __init__(self) -> None:
+        self.started = time.time()
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[Tuple, float]] = {}
+        self._histograms: Dict[str, Dict[Tuple, Histogram]] = {}
+        self._gauges: Dict[str, Callable[[], float]] = {}
+        self._meters: Dict[str, RateMeter] = {}
+        self._help: Dict[str, str] = {}
+
+    def describe(self, name: str, help_text: str) -> None:
+        """Set the HELP line of a metric."""
+        self._help[name] = help_text
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        key = label_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name: str, seconds: float, **labels) -> None:
+        key = label_key(labels)
+        series = self._histograms.get(name)
+        histogram = series.get(key) if series is not None else None
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(name, {}).setdefault(key, Histogram())
+        histogram.observe(seconds)
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        """Observe the duration of the enclosed block into a histogram."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def gauge(self, name: str, read: Callable[[], float], help_text: str = "") -> None:
+        """Register a gauge whose value is read when metrics are collected."""
+        self._gauges[name] = read
+        if help_text:
+            self._help[name] = help_text
+
+    def meter(self, name: str, window: int = 10) -> RateMeter:
+        """Return the rate meter of that name (exported as a per-second gauge)."""
+        with self._lock:
+            return self._meters.setdefault(name, RateMeter(window))
+
+    def _read_gauges(self) -> Dict[str, Optional[float]]:
+        values = {}
+        for name, read in list(self._gauges.items()):
+            try:
+                values[name] = read()
+            except Exception:
+                values[name] = None
+        for name, meter in list(self._meters.items()):
+            values[name] = meter.rate()
+        return values
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Return every metric as plain data (the METRICS action response).
+
+        Label sets are rendered as "name=value,..." keys ("" for no labels).
+        """
+        def render(key):
+            return ",".join(f"{name}={value}" for name, value in key)
+
+        with self._lock:
+            counters = {name: {render(k): v for k, v in series.items()}
+                        for name, series in self._counters.items()}
+            histograms = {name: dict(series) for name, series in self._histograms.items()}
+        return {
+            "uptime_s": time.time() - self.started,
+            "counters": counters,
+            "gauges": self._read_gauges(),
+            "histograms": {name: {render(k): h.snapshot() for k, h in series.items()}
+                           for name, series in histograms.items()},
+        }
+
+    def render_prometheus(self) -> str:
+        """Return every metric in the Prometheus text exposition format."""
+        lines = []
+
+        def header(name, kind):
+            if name in self._help:
+                lines.append(f"# HELP {PREFIX}{name} {self._help[name]}")
+            lines.append(f"# TYPE {PREFIX}{name} {kind}")
+
+        with self._lock:
+            counters = {name: dict(series) for name, series in self._counters.items()}
+            histograms = {name: dict(series) for name, series in self._histograms.items()}
+
+        for name, series in sorted(counters.items()):
+            header(name, "counter")
+            for key, value in sorted(series.items()):
+                lines.append(f"{PREFIX}{name}{format_labels(key)} {value}")
+
+        for name, value in sorted(self._read_gauges().items()):
+            if value is None:
+                continue
+            header(name, "gauge")
+            lines.append(f"{PREFIX}{name} {value}")
+
+        for name, series in sorted(histograms.items()):
+            header(name, "histogram")
+            for key, histogram in sorted(series.items()):
+                snap = histogram.snapshot()
+                for bound, seen in snap["buckets"] + [["+Inf", snap["count"]]]:
+                    le = 'le="%s"' % bound
+                    lines.append(f"{PREFIX}{name}_bucket{format_labels(key, le)} {seen}")
+                lines.append(f"{PREFIX}{name}_sum{format_labels(key)} {snap['sum']}")
+                lines.append(f"{PREFIX}{name}_count{format_labels(key)} {snap['count']}")
+
+        lines.append(f"{PREFIX}uptime_seconds {time.time() - self.started}")
+        return "\n".join(lines) + "\n"
+
+
+class MetricsEndpoint:
+    """
+    Plain HTTP endpoint serving `/metrics` in the Prometheus text format.
+
+    When a profiler callback is given, `/debug/stacks?seconds=N` returns the
+    hottest sampled stacks as text as well.
+    """
+
+    def __init__(self, metrics: Metrics, host: str = "127.0.0.1", port: int = 9100,
+                 profile: Optional[Callable[[float], str]] = None) -> None:
+        endpoint = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlparse(self.path)
+                if url.path == "/metrics":
+                    body = endpoint.metrics.render_prometheus()
+                elif url.path == "/debug/stacks" and endpoint.profile is not None:
+                    try:
+                        seconds = float(parse_qs(url.query).get("seconds", ["2"])[0])
+                    except ValueError:
+                        self.send_error(400, "seconds must be a number")
+                        return
+                    body = endpoint.profile(seconds)
+                else:
+                    self.send_error(404)
+                    return
+                data = body.encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                # Scrapes every few seconds would flood the server console
+                pass
+
+        self.metrics = metrics
+        self.profile = profile
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="metrics", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def close(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
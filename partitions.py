@@ -0,0 +1,429 @@
+import heapq
+import itertools
+import threading
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+from protocol import FramedConnection, ProtocolError
+
+# Read actions that every partition answers for its own logs; the results are merged
+SCATTER_ACTIONS = frozenset({"FETCH_LOGS", "SEARCH", "AGGREGATE", "SERVER_STATS", "METRICS", "TEMPLATES"})
+
+# Default number of rows per FETCH_LOGS / SEARCH page
+PAGE_SIZE = 100
+# Largest FETCH_LOGS page or SEARCH result a client may ask for
+MAX_PAGE_SIZE = 1000
+
+
+def page_size(request: Dict[str, Any]) -> int:
+    """Return the FETCH_LOGS page size of a request, within [1, MAX_PAGE_SIZE]."""
+    try:
+        size = int(request.get("page_size") or PAGE_SIZE)
+    except (TypeError, ValueError):
+        size = PAGE_SIZE
+    return min(max(size, 1), MAX_PAGE_SIZE)
+
+
+def search_limit(request: Dict[str, Any]) -> int:
+    """
+    Return the SEARCH result limit of a request, capped at MAX_PAGE_SIZE.
+
+    Raises:
+        ValueError: If the limit is not a positive integer.
+    """
+    limit = request.get("limit", PAGE_SIZE)
+    if isinstance(limit, bool) or not isinstance(limit, int) or limit < 1:
+        raise ValueError(f"Invalid search limit: {limit!r}")
+    return min(limit, MAX_PAGE_SIZE)
+
+
+def templates_limit(request: Dict[str, Any]) -> Optional[int]:
+    """
+    Return the TEMPLATES limit of a request (None for every template).
+
+    Raises:
+        ValueError: If the limit is neither null nor a positive integer.
+    """
+    limit = request.get("limit", 100)
+    if limit is not None and (isinstance(limit, bool) or not isinstance(limit, int) or limit < 1):
+        raise ValueError(f"Invalid templates limit: {limit!r}")
+    return limit
+
+
+def parse_address(text: str, default_port: int = 5000) -> Tuple[str, int]:
+    """Parse "host:port" (or just "host") into a (host, port) tuple."""
+    host, _, port = text.strip().rpartition(":")
+    if not host:
+        return port, default_port
+    return host, int(port)
+
+
+class PartitionSet:
+    """
+    The partitions of one logical log store, each owned by its own server process.
+
+    A partition is a worker of a multi-process server or a node of a cluster. Every
+    process ingests into its own partition (its own storage, hot cache, search index
+    and rollups). The process that receives a read request coordinates it: the request
+    is scattered to all partitions with "local": true, answered by each from its own
+    data, and merged into one response.
+    """
+
+    def __init__(self, addresses: List[Tuple[str, int]], index: int, timeout: float = 10.0) -> None:
+        """
+        Args:
+            addresses (list): (host, port) of every partition, in partition order.
+            index (int): Position of this process's own partition in `addresses`.
+            timeout (float): Socket timeout for requests to the other partitions.
+        """
+        self.addresses = addresses
+        self.index = index
+        self.timeout = timeout
+        # One connection per partition per handler thread; FramedConnection is not thread-safe
+        self._local = threading.local()
+
+    def __len__(self) -> int:
+        return len(self.addresses)
+
+    def _connection(self, partition: int) -> FramedConnection:
+        conns = getattr(self._local, "conns", None)
+        if conns is None:
+            conns = self._local.conns = {}
+        conn = conns.get(partition)
+        if conn is None:
+            host, port = self.addresses[partition]
+            conn = conns[partition] = FramedConnection(host, port, timeout=self.timeout)
+        return conn
+
+    def _drop(self, partition: int) -> None:
+        conn = self._local.conns.pop(partition, None)
+        if conn is not None:
+            conn.close()
+
+    def scatter(self, request: Dict[str, Any],
+                local: Callable[[Dict[str, Any]], Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Run a read request on every partition and merge the answers.
+
+        Requests to the other partitions are sent first, so they run while the
+        local partition answers.
+
+        Args:
+            request (dict): The client's request.
+            local (callable): Answers a request from this process's own partition.
+
+        Returns:
+            dict: The merged response. Partitions that could not answer are listed
+            in "missing_partitions".
+        """
+        requests = [partition_request(request, i) for i in range(len(self.addresses))]
+        responses: List[Optional[Dict[str, Any]]] = [None] * len(self.addresses)
+        sent = []
+        for i, sub_request in enumerate(requests):
+            if i == self.index:
+                continue
+            try:
+                self._connection(i).send(sub_request)
+                sent.append(i)
+            except OSError as e:
+                self._drop(i)
+                print(f"[Partition Error] Partition {i} at {self.addresses[i]} is unreachable: {e}")
+        responses[self.index] = local(requests[self.index])
+        for i in sent:
+            try:
+                responses[i] = self._connection(i).recv()
+            except (OSError, ValueError) as e:
+                self._drop(i)
+                print(f"[Partition Error] Partition {i} at {self.addresses[i]} failed: {e}")
+        return merge_responses(request, responses)
+
+    def export(self, request: Dict[str, Any], local: Callable[[Dict[str, Any]], Iterator[bytes]]):
+        """
+        Generate the EXPORT data frames of every partition, one partition after another.
+
+        Each partition exports its rows with global ids (local_id * partitions +
+        partition), so the output matches what FETCH_LOGS shows. Frames of the other
+        partitions are relayed as received, without being decoded or recompressed.
+
+        Args:
+            request (dict): The client's EXPORT request.
+            local (callable): Generates this process's own data frames and returns
+                its summary frame.
+
+        Returns:
+            dict: The combined summary frame; partitions that failed are listed
+            in "missing_partitions".
+        """
+        count = len(self.addresses)
+        total = 0
+        missing = []
+        for i in range(count):
+            sub_request = dict(request, local=True, id_space=[count, i])
+            if i == self.index:
+                summary = yield from local(sub_request)
+            else:
+                summary = yield from self._relay_export(i, sub_request)
+            total += summary.get("count", 0)
+            if summary.get("status") != "OK":
+                missing.append(i)
+        summary = {"status": "OK", "type": "end", "count": total}
+        if missing:
+            summary["missing_partitions"] = missing
+        return summary
+
+    def _relay_export(self, partition: int, request: Dict[str, Any]):
+        host, port = self.addresses[partition]
+        # A connection of its own: the generator may be resumed on different threads
+        conn = FramedConnection(host, port, timeout=self.timeout)
+        try:
+            header = conn.request(request)
+            if header.get("status") != "OK":
+                return header
+            while True:
+                chunk = conn.recv_view()
+                if not chunk:
+                    return conn.recv()
+                yield bytes(chunk)
+        except (OSError, ValueError, ProtocolError) as e:
+            print(f"[Partition Error] EXPORT from partition {partition} failed: {e}")
+            return {"status": "ERROR", "error": str(e)}
+        finally:
+            conn.close()
+
+    def follow(self, request: Dict[str, Any], subscriber, stopped: threading.Event) -> None:
+        """
+        Relay every other partition's TAIL stream into a local subscriber.
+
+        One daemon thread per partition forwards pushed records until `stopped` is
+        set. A lost or evicted upstream stream evicts the subscriber, so the viewer
+        knows it missed records and reloads.
+        """
+        for i in range(len(self.addresses)):
+            if i != self.index:
+                threading.Thread(
+                    target=self._relay_tail,
+                    args=(i, dict(request, local=True), subscriber, stopped),
+                    daemon=True
+                ).start()
+
+    def _relay_tail(self, partition: int, request: Dict[str, Any], subscriber, stopped: threading.Event) -> None:
+        host, port = self.addresses[partition]
+        # Heartbeats arrive every few seconds, so a quiet stream still notices `stopped`
+        conn = FramedConnection(host, port, timeout=self.timeout)
+        try:
+            conn.send(request)
+            while not stopped.is_set():
+                frame = conn.recv()
+                if frame.get("status") != "OK":
+                    break
+                if frame.get("data") and not subscriber.push(frame["data"]):
+                    return
+        except (OSError, ValueError) as e:
+            print(f"[Partition Error] TAIL relay from partition {partition} failed: {e}")
+        finally:
+            conn.close()
+        if not stopped.is_set():
+            subscriber.evict()
+
+    def close(self) -> None:
+        """Close this thread's connections to the other partitions."""
+        for partition in list(getattr(self._local, "conns", {})):
+            self._drop(partition)
+
+
+def partition_request(request: Dict[str, Any], partition: int) -> Dict[str, Any]:
+    """
+    Build the request one partition answers on its own.
+
+    A composite FETCH_LOGS cursor (a list of per-partition ids, for since_id or
+    before_id) is narrowed to the partition's own entry; a plain integer cursor
+    applies to every partition. TEMPLATES asks every partition for all of its
+    templates, since the most frequent ones overall need not lead each partition.
+    """
+    sub_request = dict(request, local=True)
+    if request.get("action") == "TEMPLATES":
+        sub_request["limit"] = None
+    filters = request.get("filters")
+    if filters:
+        for key in ("since_id", "before_id"):
+            if isinstance(filters.get(key), list):
+                cursors = filters[key]
+                filters = dict(filters, **{key: cursors[partition] if partition < len(cursors) else None})
+        sub_request["filters"] = filters
+    return sub_request
+
+
+def merge_responses(request: Dict[str, Any], responses: List[Optional[Dict[str, Any]]]) -> Dict[str, Any]:
+    """Combine the per-partition responses to a scattered request."""
+    answered = [i for i, r in enumerate(responses) if r is not None and r.get("status") == "OK"]
+    if not answered:
+        errors = [r for r in responses if r is not None]
+        return errors[0] if errors else {"status": "ERROR", "error": "No partition answered"}
+
+    action = request.get("action")
+    if action == "FETCH_LOGS":
+        merged = merge_pages(request, responses)
+    elif action == "SEARCH":
+        merged = merge_rows(request, responses)
+    elif action == "AGGREGATE":
+        merged = merge_aggregates(request, [responses[i] for i in answered])
+    elif action == "SERVER_STATS":
+        merged = merge_stats(responses)
+    elif action == "TEMPLATES":
+        merged = merge_templates(request, responses)
+    else:
+        merged = {"status": "OK", "partitions": responses}
+
+    missing = [i for i in range(len(responses)) if i not in answered]
+    if missing:
+        merged["missing_partitions"] = missing
+    return merged
+
+
+def merge_rows(request: Dict[str, Any], responses: List[Optional[Dict[str, Any]]]) -> Dict[str, Any]:
+    """
+    k-way merge of per-partition SEARCH results into one page, newest first.
+
+    Every partition returns its own newest rows, so the global newest `limit` rows
+    are among them. Row ids are made unique as local_id * partitions + partition,
+    and the cursor becomes a list holding one id per partition.
+    """
+    count = len(responses)
+    # Partitions only answer OK to a valid limit
+    limit = search_limit(request)
+    since = request.get("filters", {}).get("since_id")
+    streams = []
+    cursor = []
+    for i, response in enumerate(responses):
+        previous = since[i] if isinstance(since, list) and i < len(since) else since
+        if response is None or response.get("status") != "OK":
+            # Nothing was read from this partition: keep its cursor where it was
+            cursor.append(previous)
+            continue
+        rows = response["data"]
+        cursor.append(max((row["id"] for row in rows), default=previous))
+        for row in rows:
+            row["id"] = row["id"] * count + i
+        streams.append(sorted(rows, key=lambda row: (row["timestamp"], row["id"]), reverse=True))
+
+    merged = heapq.merge(*streams, key=lambda row: (row["timestamp"], row["id"]), reverse=True)
+    return {"status": "OK", "data": list(itertools.islice(merged, limit)), "cursor": cursor}
+
+
+def merge_pages(request: Dict[str, Any], responses: List[Optional[Dict[str, Any]]]) -> Dict[str, Any]:
+    """
+    k-way merge of per-partition FETCH_LOGS pages into one page.
+
+    Each partition's rows are merged in the order the partition returned them
+    (newest id first), so the rows taken from a partition are always a prefix of
+    its page. Its entry of the composite "next" cursor is then the smallest local
+    id taken, and the following page resumes every partition exactly where this
+    one stopped. A partition with nothing left gets 0; "next" is None once no
+    partition has more rows.
+    """
+    count = len(responses)
+    limit = page_size(request)
+    filters = request.get("filters", {})
+    since = filters.get("since_id")
+    before = filters.get("before_id")
+    streams = []
+    cursor = []
+    pages = []
+    for i, response in enumerate(responses):
+        previous = since[i] if isinstance(since, list) and i < len(since) else since
+        if response is None or response.get("status") != "OK":
+            # Nothing was read from this partition: keep its cursors where they were
+            cursor.append(previous)
+            pages.append(None)
+            continue
+        rows = response["data"]
+        cursor.append(max((row["id"] for row in rows), default=previous))
+        pages.append(rows)
+        streams.append([(row, i) for row in rows])
+
+    merged = heapq.merge(*streams, key=lambda item: (item[0]["timestamp"], item[0]["id"]), reverse=True)
+    taken: Dict[int, List[int]] = {}
+    data = []
+    for row, i in itertools.islice(merged, limit):
+        taken.setdefault(i, []).append(row["id"])
+        row["id"] = row["id"] * count + i
+        data.append(row)
+
+    next_cursor = []
+    more = False
+    for i, rows in enumerate(pages):
+        previous = before[i] if isinstance(before, list) and i < len(before) else before
+        if rows is None:
+            # An unanswered partition may still hold rows below its cursor
+            next_cursor.append(previous)
+            more = True
+        elif len(taken.get(i, ())) < len(rows) or responses[i].get("next") is not None:
+            next_cursor.append(min(taken[i]) if i in taken else previous)
+            more = True
+        else:
+            next_cursor.append(0)
+    return {"status": "OK", "data": data, "cursor": cursor, "next": next_cursor if more else None}
+
+
+def merge_aggregates(request: Dict[str, Any], responses: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Add up per-partition AGGREGATE counts bucket by bucket and group by group."""
+    group_by = tuple(request.get("group_by", ["level"]))
+    buckets = sorted(set().union(*(response["buckets"] for response in responses)))
+    position = {bucket: i for i, bucket in enumerate(buckets)}
+    series: Dict[Tuple[str, ...], List[int]] = {}
+    for response in responses:
+        for group in response["groups"]:
+            key = tuple(group[field] for field in group_by)
+            counts = series.setdefault(key, [0] * len(buckets))
+            for bucket, value in zip(response["buckets"], group["counts"]):
+                counts[position[bucket]] += value
+    groups = [
+        dict(zip(group_by, key), counts=counts, total=sum(counts))
+        for key, counts in sorted(series.items())
+    ]
+    return {
+        "status": "OK",
+        # Partitions share retention settings, so they pick the same interval
+        "interval": responses[0]["interval"],
+        "buckets": buckets,
+        "groups": groups,
+        "total": sum(group["total"] for group in groups),
+    }
+
+
+def merge_templates(request: Dict[str, Any], responses: List[Optional[Dict[str, Any]]]) -> Dict[str, Any]:
+    """
+    Add up per-partition TEMPLATES counts by template text.
+
+    Every partition mines its own templates, so ids are local: a merged entry has
+    "ids" with the id in each partition (None where it has no such template).
+    """
+    count = len(responses)
+    merged: Dict[str, Dict[str, Any]] = {}
+    for i, response in enumerate(responses):
+        if response is None or response.get("status") != "OK":
+            continue
+        for entry in response["templates"]:
+            total = merged.get(entry["template"])
+            if total is None:
+                total = merged[entry["template"]] = {"ids": [None] * count, "template": entry["template"], "count": 0}
+            total["ids"][i] = entry["id"]
+            total["count"] += entry["count"]
+    templates = sorted(merged.values(), key=lambda entry: entry["count"], reverse=True)
+    # The limit was checked before the request was scattered
+    limit = templates_limit(request)
+    return {"status": "OK", "templates": templates[:limit] if limit is not None else templates}
+
+
+def merge_stats(responses: List[Optional[Dict[str, Any]]]) -> Dict[str, Any]:
+    """Sum the headline SERVER_STATS counters and keep every partition's full stats."""
+    answered = [r for r in responses if r is not None and r.get("status") == "OK"]
+    writer_totals = {
+        key: sum(r["writer"][key] for r in answered)
+        for key in ("batches", "records", "failed_records", "queue_depth")
+    }
+    return {
+        "status": "OK",
+        "writer": writer_totals,
+        "subscribers": sum(r["subscribers"] for r in answered),
+        "connections": sum(r["connections"] for r in answered),
+        "partitions": responses,
+    }
@@ -0,0 +1,78 @@
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, List
+
+# Leaf functions of threads parked waiting for work (accept, recv, queue.get, ...);
+# their samples are idle time, not load, and are left out unless asked for
+IDLE_FUNCTIONS = frozenset({
+    "wait", "accept", "recv_exact", "recv_frame", "select", "poll", "sleep",
+    "serve_forever", "_worker", "run_forever", "_run_once", "get",
+})
+
+
+def frame_name(frame) -> str:
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+
+def collapse(frame) -> List[str]:
+    """Return the stack of a frame as names, outermost call first."""
+    stack = []
+    while frame is not None:
+        stack.append(frame_name(frame))
+        frame = frame.f_back
+    stack.reverse()
+    return stack
+
+
+def sample_stacks(seconds: float = 2.0, interval: float = 0.005, top: int = 20,
+                  include_idle: bool = False) -> Dict[str, Any]:
+    """
+    Sample every thread's Python stack for a while and count the hottest ones.
+
+    A statistical profiler: it only reads sys._current_frames() every `interval`
+    seconds, so the server keeps running at close to full speed while sampled.
+
+    Args:
+        seconds (float): How long to sample.
+        interval (float): Seconds between samples.
+        top (int): Number of stacks and functions to return.
+        include_idle (bool): Also count threads parked in IDLE_FUNCTIONS.
+
+    Returns:
+        dict: samples taken, "stacks" as [collapsed "a;b;c" stack, count] and
+        "functions" as [leaf function, count], both hottest first.
+    """
+    me = threading.get_ident()
+    stacks = Counter()
+    leaves = Counter()
+    samples = 0
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        for ident, frame in sys._current_frames().items():
+            if ident == me:
+                continue
+            if not include_idle and frame.f_code.co_name in IDLE_FUNCTIONS:
+                continue
+            stack = collapse(frame)
+            stacks[";".join(stack)] += 1
+            leaves[stack[-1]] += 1
+        samples += 1
+        time.sleep(interval)
+    return {
+        "seconds": seconds,
+        "samples": samples,
+        "stacks": [[stack, count] for stack, count in stacks.most_common(top)],
+        "functions": [[name, count] for name, count in leaves.most_common(top)],
+    }
+
+
+def format_profile(profile: Dict[str, Any]) -> str:
+    """Render a sample_stacks() result as text (collapsed stacks, flamegraph-compatible)."""
+    lines = [f"# {profile['samples']} samples over {profile['seconds']}s", "# hottest functions"]
+    lines += [f"# {count:6d} {name}" for name, count in profile["functions"]]
+    lines += [f"{stack} {count}" for stack, count in profile["stacks"]]
+    return "\n".join(lines) + "\n"
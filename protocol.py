@@ -0,0 +1,392 @@
+import json
+import socket
+import struct
+import sys
+from array import array
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+# Sent once by framed clients right after connecting. Legacy clients start
+# with a JSON object instead, so the server can tell the two apart.
+MAGIC = b"LGF1"
+
+# Every frame is a 4-byte big-endian length followed by that many payload bytes
+HEADER = struct.Struct("!I")
+
+# Reject absurd lengths instead of trying to allocate them
+MAX_FRAME_SIZE = 64 * 1024 * 1024
+
+# Initial size of a client connection's receive buffer; it grows to the largest frame seen
+RECV_BUFFER_SIZE = 64 * 1024
+
+# Compact record encoding, offered by clients in a HELLO request. JSON frames always
+# start with "{"; binary frames start with a type byte below 0x20 instead.
+BINARY_ENCODING = "bin1"
+BINARY_BATCH = 0x01
+# Batch header: type, number of new dictionary strings, number of records
+BATCH_HEADER = struct.Struct("!BHI")
+# Dictionary entry: string id, byte length (followed by the UTF-8 bytes)
+STRING_HEADER = struct.Struct("!HH")
+# Columns are sent in network byte order; array() packs in the native one
+NATIVE_LITTLE_ENDIAN = sys.byteorder == "little"
+# Every connection's string dictionary starts with the standard levels as ids 0-4
+LEVELS = ("DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL")
+MAX_STRINGS = 65536
+
+
+class ProtocolError(Exception):
+    """Raised when a peer sends data that does not follow the framing rules."""
+
+
+def recv_exact(sock: socket.socket, size: int) -> Optional[bytes]:
+    """
+    Read exactly `size` bytes from the socket.
+
+    Returns:
+        bytes: The data, or None if the peer closed the connection before any byte arrived.
+    """
+    buf = bytearray(size)
+    view = memoryview(buf)
+    received = 0
+    while received < size:
+        n = sock.recv_into(view[received:], size - received)
+        if n == 0:
+            if received == 0:
+                return None
+            raise ProtocolError("Connection closed in the middle of a frame")
+        received += n
+    return bytes(buf)
+
+
+def send_frame(sock: socket.socket, payload: bytes) -> None:
+    """Send one length-prefixed frame."""
+    sock.sendall(HEADER.pack(len(payload)) + payload)
+
+
+def recv_frame(sock: socket.socket) -> Optional[bytes]:
+    """
+    Receive one length-prefixed frame.
+
+    Returns:
+        bytes: The frame payload, or None if the peer closed the connection cleanly.
+    """
+    header = recv_exact(sock, HEADER.size)
+    if header is None:
+        return None
+    (size,) = HEADER.unpack(header)
+    if size > MAX_FRAME_SIZE:
+        raise ProtocolError(f"Frame of {size} bytes exceeds the limit")
+    if size == 0:
+        return b""
+    payload = recv_exact(sock, size)
+    if payload is None:
+        raise ProtocolError("Connection closed in the middle of a frame")
+    return payload
+
+
+def encode(message: Dict[str, Any]) -> bytes:
+    """Serialize a request or response for a frame."""
+    return json.dumps(message).encode("utf-8")
+
+
+def decode(payload: bytes) -> Dict[str, Any]:
+    """Deserialize a frame payload (bytes, bytearray or memoryview)."""
+    return json.loads(str(payload, "utf-8"))
+
+
+def is_binary(payload: bytes) -> bool:
+    """Return True if a frame payload uses the binary encoding rather than JSON."""
+    return bool(payload) and payload[0] < 0x20
+
+
+class BinaryEncoder:
+    """
+    Client side of the binary encoding for one connection.
+
+    Levels and sources are sent as ids into a string dictionary that both ends build
+    up per connection: a string is sent in full once, in the batch that first uses it.
+    A batch is laid out by column (level ids, source ids, timestamps, message lengths,
+    then the messages) so each column is packed and unpacked as one array.
+    """
+
+    def __init__(self) -> None:
+        self.ids: Dict[str, int] = {level: i for i, level in enumerate(LEVELS)}
+
+    def encode_batch(self, records) -> Optional[bytes]:
+        """
+        Encode LogMessage-like records (level, message, source, timestamp_us).
+
+        Returns:
+            bytes: The frame payload, or None if the dictionary is full (send JSON instead).
+        """
+        ids = self.ids
+        new = []
+        levels, sources, timestamps, lengths = array("H"), array("H"), array("q"), array("I")
+        messages = []
+        for record in records:
+            level_id = ids.get(record.level)
+            if level_id is None:
+                level_id = self._define(record.level, new)
+            source_id = ids.get(record.source)
+            if source_id is None:
+                source_id = self._define(record.source, new)
+            if level_id is None or source_id is None:
+                # Forget the strings of this batch; the server never saw them
+                for string, _ in new:
+                    del ids[string]
+                return None
+            message = record.message.encode("utf-8")
+            levels.append(level_id)
+            sources.append(source_id)
+            timestamps.append(record.timestamp_us)
+            lengths.append(len(message))
+            messages.append(message)
+
+        parts = [BATCH_HEADER.pack(BINARY_BATCH, len(new), len(records))]
+        for string, string_id in new:
+            raw = string.encode("utf-8")
+            parts.append(STRING_HEADER.pack(string_id, len(raw)) + raw)
+        for column in (levels, sources, timestamps, lengths):
+            if NATIVE_LITTLE_ENDIAN:
+                column.byteswap()
+            parts.append(column.tobytes())
+        parts.extend(messages)
+        return b"".join(parts)
+
+    def _define(self, string: str, new: list) -> Optional[int]:
+        if len(self.ids) >= MAX_STRINGS:
+            return None
+        string_id = len(self.ids)
+        self.ids[string] = string_id
+        new.append((string, string_id))
+        return string_id
+
+
+class BinaryDecoder:
+    """Server side of the binary encoding for one connection (see BinaryEncoder)."""
+
+    def __init__(self) -> None:
+        self.strings: List[str] = list(LEVELS)
+        # Formatting the date part once per second keeps decoding cheap
+        self._second = None
+        self._second_text = ""
+
+    def decode_batch(self, payload: bytes) -> List[Dict[str, Any]]:
+        """
+        Decode a binary batch into log dicts.
+
+        Timestamps keep their microseconds: 'YYYY-MM-DD HH:MM:SS.ffffff'.
+
+        Raises:
+            ProtocolError: If the payload is malformed or refers to unknown strings.
+        """
+        try:
+            kind, string_count, count = BATCH_HEADER.unpack_from(payload, 0)
+            if kind != BINARY_BATCH:
+                raise ProtocolError(f"Unknown binary frame type {kind}")
+            offset = BATCH_HEADER.size
+            strings = self.strings
+            defined = []
+            for _ in range(string_count):
+                string_id, size = STRING_HEADER.unpack_from(payload, offset)
+                offset += STRING_HEADER.size
+                if string_id != len(strings) + len(defined):
+                    raise ProtocolError(f"Out of order dictionary id {string_id}")
+                defined.append(payload[offset:offset + size].decode("utf-8"))
+                offset += size
+            strings = strings + defined if defined else strings
+
+            columns = []
+            for code in ("H", "H", "q", "I"):
+                column = array(code)
+                end = offset + column.itemsize * count
+                if end > len(payload):
+                    raise ProtocolError("Truncated binary batch")
+                column.frombytes(payload[offset:end])
+                if NATIVE_LITTLE_ENDIAN:
+                    column.byteswap()
+                columns.append(column)
+                offset = end
+            levels, sources, timestamps, lengths = columns
+
+            blob = payload[offset:]
+            if sum(lengths) != len(blob):
+                raise ProtocolError("Message lengths do not match the batch size")
+            text = blob.decode("utf-8")
+            # ASCII messages can be sliced out of one decoded string
+            ascii_only = len(text) == len(blob)
+
+            logs = []
+            append = logs.append
+            position = 0
+            for level_id, source_id, timestamp_us, size in zip(levels, sources, timestamps, lengths):
+                end = position + size
+                message = text[position:end] if ascii_only else blob[position:end].decode("utf-8")
+                position = end
+                second, micros = divmod(timestamp_us, 1000000)
+                if second != self._second:
+                    self._second = second
+                    self._second_text = datetime.fromtimestamp(second).strftime("%Y-%m-%d %H:%M:%S")
+                append({
+                    "level": strings[level_id],
+                    "message": message,
+                    "source": strings[source_id],
+                    "timestamp": f"{self._second_text}.{micros:06d}",
+                })
+        except (struct.error, IndexError, UnicodeDecodeError) as e:
+            raise ProtocolError(f"Malformed binary batch: {e}") from None
+        # The dictionary only grows once the whole batch decoded
+        self.strings = strings
+        return logs
+
+
+def is_complete_json(data: bytes) -> bool:
+    """Return True if the bytes received from a legacy client form a complete JSON document."""
+    if not data.rstrip().endswith(b"}"):
+        return False
+    try:
+        json.loads(data.decode("utf-8"))
+    except ValueError:
+        return False
+    return True
+
+
+class FramedConnection:
+    """
+    Long-lived client connection speaking the length-prefixed protocol.
+
+    Requests may be pipelined: several frames are written back to back and the
+    server answers each one with an acknowledgement frame, in order.
+
+    Responses are read with recv_into() into one preallocated buffer per
+    connection, so receiving a frame neither grows a byte string chunk by chunk
+    nor allocates a new buffer for every frame.
+    """
+
+    def __init__(self, host: str, port: int, timeout: Optional[float] = None,
+                 binary: bool = False) -> None:
+        """
+        Args:
+            host (str): Server host.
+            port (int): Server port.
+            timeout (float): Socket timeout in seconds.
+            binary (bool): Offer the binary record encoding when connecting.
+        """
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.binary = binary
+        self.sock: Optional[socket.socket] = None
+        # Set while the current connection uses the binary encoding
+        self.encoder: Optional[BinaryEncoder] = None
+        self._buffer = bytearray(RECV_BUFFER_SIZE)
+
+    def connect(self) -> None:
+        """Open the TCP connection, announce the framed protocol and negotiate the encoding."""
+        sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        sock.sendall(MAGIC)
+        self.sock = sock
+        self.encoder = None
+        if self.binary:
+            # Servers that predate HELLO answer with an error and the connection stays on JSON
+            reply = self.request({"action": "HELLO", "encodings": [BINARY_ENCODING]})
+            if reply.get("encoding") == BINARY_ENCODING:
+                self.encoder = BinaryEncoder()
+
+    def send(self, message: Dict[str, Any]) -> None:
+        """Send one request frame without waiting for its acknowledgement."""
+        if self.sock is None:
+            self.connect()
+        send_frame(self.sock, encode(message))
+
+    def recv(self) -> Dict[str, Any]:
+        """Receive the next response frame."""
+        return decode(self.recv_view())
+
+    def recv_view(self) -> memoryview:
+        """
+        Receive the next frame into the connection's buffer without copying it.
+
+        Returns:
+            memoryview: The frame payload, valid until the next receive.
+        """
+        (size,) = HEADER.unpack(self._read_into(HEADER.size))
+        if size > MAX_FRAME_SIZE:
+            raise ProtocolError(f"Frame of {size} bytes exceeds the limit")
+        return self._read_into(size)
+
+    def _read_into(self, size: int) -> memoryview:
+        if size > len(self._buffer):
+            # Replaced rather than resized: views handed out earlier keep the old buffer
+            self._buffer = bytearray(max(size, 2 * len(self._buffer)))
+        view = memoryview(self._buffer)[:size]
+        received = 0
+        while received < size:
+            n = self.sock.recv_into(view[received:], size - received)
+            if n == 0:
+                raise ConnectionError("Server closed the connection")
+            received += n
+        return view
+
+    def request(self, message: Dict[str, Any]) -> Dict[str, Any]:
+        """Send one request and wait for its acknowledgement."""
+        self.send(message)
+        return self.recv()
+
+    def send_records(self, records) -> Dict[str, Any]:
+        """
+        Send LogMessage records as one batch and wait for the acknowledgement.
+
+        Uses the binary encoding when it was negotiated, a JSON LOG_BATCH otherwise.
+        """
+        if self.sock is None:
+            self.connect()
+        payload = self.encoder.encode_batch(records) if self.encoder is not None else None
+        if payload is None:
+            payload = encode({"action": "LOG_BATCH", "data": [record.to_dict() for record in records]})
+        send_frame(self.sock, payload)
+        return self.recv()
+
+    def pipeline(self, messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Send several requests back to back, then collect one acknowledgement per request."""
+        if self.sock is None:
+            self.connect()
+        self.sock.sendall(b"".join(
+            HEADER.pack(len(payload)) + payload
+            for payload in (encode(message) for message in messages)
+        ))
+        return [self.recv() for _ in messages]
+
+    def export(self, request: Dict[str, Any], out) -> Dict[str, Any]:
+        """
+        Run an EXPORT request and write the streamed chunks to a binary file.
+
+        Chunks are written as they arrive, straight from the receive buffer, so
+        memory use does not depend on the size of the export.
+
+        Args:
+            request (dict): The EXPORT request.
+            out: Binary file object receiving the NDJSON (or gzip) stream.
+
+        Returns:
+            dict: The final frame: {"status": "OK", "count": ...}, or an error.
+        """
+        header = self.request(request)
+        if header.get("status") != "OK":
+            return header
+        while True:
+            chunk = self.recv_view()
+            if not chunk:
+                # An empty frame ends the data; the summary follows
+                return self.recv()
+            out.write(chunk)
+
+    def close(self) -> None:
+        """Close the connection; the next request reconnects."""
+        if self.sock is not None:
+            try:
+                self.sock.close()
+            finally:
+                self.sock = None
+                self.encoder = None
@@ -0,0 +1,342 @@
+import json
+import os
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+# Bucket granularities, finest first: (name, key length in a timestamp string, step)
+INTERVALS = (
+    ("1m", 16, timedelta(minutes=1)),   # 'YYYY-MM-DD HH:MM'
+    ("1h", 13, timedelta(hours=1)),     # 'YYYY-MM-DD HH'
+    ("1d", 10, timedelta(days=1)),      # 'YYYY-MM-DD'
+)
+KEY_FORMATS = {"1m": "%Y-%m-%d %H:%M", "1h": "%Y-%m-%d %H", "1d": "%Y-%m-%d"}
+GROUP_FIELDS = ("level", "source")
+
+
+def parse_bound(value: str, upper: bool = False) -> datetime:
+    """
+    Parse an AGGREGATE range bound.
+
+    A 'YYYY-MM-DD' date used as the upper bound includes that whole day, like the
+    date filters of FETCH_LOGS; a timestamp ('YYYY-MM-DD HH:MM[:SS]') is exact.
+    """
+    if len(value) == 10:
+        day = datetime.strptime(value, "%Y-%m-%d")
+        return day + timedelta(days=1) if upper else day
+    return datetime.fromisoformat(value)
+
+
+class Rollups:
+    """
+    Log counts keyed by (time bucket, level, source), maintained on ingest.
+
+    Committed batches are counted into 1-minute buckets (registered as a BatchWriter
+    commit listener). Minutes older than `minute_retention` are folded into their
+    hour, and hours older than `hour_retention` into their day, so every period of
+    time is held at exactly one granularity and memory stays bounded. AGGREGATE
+    queries read only buckets: their cost depends on the range, not the row count.
+    """
+
+    def __init__(self, db, path: Optional[str] = None,
+                 minute_retention: timedelta = timedelta(days=2),
+                 hour_retention: timedelta = timedelta(days=90),
+                 save_interval: float = 60.0) -> None:
+        """
+        Load the saved counters (if any) and count stored logs they do not cover.
+
+        Args:
+            db: Storage backend, read once to count logs missing from the snapshot.
+            path (str): JSON snapshot file (None keeps the counters in memory only).
+            minute_retention (timedelta): Age after which minute buckets become hours.
+            hour_retention (timedelta): Age after which hour buckets become days.
+            save_interval (float): Minimum seconds between snapshots written on ingest.
+        """
+        self.db = db
+        self.path = path
+        self.minute_retention = minute_retention
+        self.hour_retention = hour_retention
+        self.save_interval = save_interval
+        self._lock = threading.Lock()
+        self._catch_up_lock = threading.Lock()
+
+        # buckets["1m"]["2026-10-18 10:05"] = {(level, source): count}
+        self.buckets: Dict[str, Dict[str, Counter]] = {name: {} for name, _, _ in INTERVALS}
+        # Minutes before minute_horizon live in hour buckets, hours before hour_horizon in day buckets
+        self.minute_horizon = ""
+        self.hour_horizon = ""
+        # Every id <= watermark is counted; counted ids above it wait in _pending
+        self.watermark = 0
+        self._pending = set()
+        self._last_compact = 0.0
+        self._last_save = time.monotonic()
+        self._saving = False
+
+        if path and os.path.exists(path):
+            self._load()
+        self.catch_up()
+        self.compact()
+
+    def _load(self) -> None:
+        """Restore counters from the snapshot file."""
+        try:
+            with open(self.path) as f:
+                state = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"[Rollups Error] Ignoring unreadable snapshot {self.path}: {e}")
+            return
+        for name, buckets in state["buckets"].items():
+            self.buckets[name] = {
+                key: Counter({(level, source): count for level, source, count in entries})
+                for key, entries in buckets.items()
+            }
+        self.minute_horizon = state["minute_horizon"]
+        self.hour_horizon = state["hour_horizon"]
+        self.watermark = state["watermark"]
+        self._pending = set(state["pending"])
+
+    def save(self) -> None:
+        """Write a snapshot of every counter; written to a temp file and renamed into place."""
+        if not self.path:
+            return
+        with self._lock:
+            state = {
+                "buckets": {
+                    name: {
+                        key: [[level, source, count] for (level, source), count in counts.items()]
+                        for key, counts in buckets.items()
+                    }
+                    for name, buckets in self.buckets.items()
+                },
+                "minute_horizon": self.minute_horizon,
+                "hour_horizon": self.hour_horizon,
+                "watermark": self.watermark,
+                "pending": sorted(self._pending),
+            }
+            self._last_save = time.monotonic()
+        with open(self.path + ".tmp", "w") as f:
+            json.dump(state, f)
+        os.replace(self.path + ".tmp", self.path)
+
+    def _save_in_background(self) -> None:
+        try:
+            self.save()
+        except OSError as e:
+            print(f"[Rollups Error] Failed to save snapshot: {e}")
+        finally:
+            self._saving = False
+
+    def catch_up(self, batch_size: int = 10000) -> int:
+        """
+        Count stored logs above the watermark that are not counted yet.
+
+        Returns:
+            int: Number of logs counted.
+        """
+        counted = 0
+        with self._catch_up_lock:
+            while True:
+                rows = self.db.scan_logs(self.watermark, batch_size)
+                if not rows:
+                    return counted
+                with self._lock:
+                    new = [row for row in rows if row[0] not in self._pending]
+                    self._count((str(row[1]), row[2], row[4], row[5]) for row in new)
+                    # A scan in id order sees every stored id, gaps included
+                    self._pending.difference_update(row[0] for row in rows)
+                    self.watermark = max(self.watermark, rows[-1][0])
+                counted += len(new)
+
+    def add(self, logs: List[Dict[str, Any]], ids: Optional[List[int]]) -> None:
+        """
+        Count a committed batch; registered as a BatchWriter commit listener.
+
+        Args:
+            logs (list): The committed log dicts.
+            ids (list): Their ids, or None if the backend cannot report them.
+        """
+        if ids is None or len(ids) != len(logs):
+            # Count the new rows from storage instead, so the watermark stays exact
+            self.catch_up()
+        else:
+            with self._lock:
+                self._count((str(log["timestamp"]), log["level"], log["source"], log.get("repeat_count", 1))
+                            for log in logs)
+                self._pending.update(ids)
+                while self.watermark + 1 in self._pending:
+                    self.watermark += 1
+                    self._pending.remove(self.watermark)
+
+        now = time.monotonic()
+        if now - self._last_compact >= 60:
+            self.compact()
+        if self.path and not self._saving and now - self._last_save >= self.save_interval:
+            # Snapshot off the writer thread so commits are not held up by file I/O
+            self._saving = True
+            threading.Thread(target=self._save_in_background, daemon=True).start()
+
+    def _count(self, records) -> None:
+        """
+        Add (timestamp, level, source, repeat_count) records to their buckets (lock held).
+
+        A summary of suppressed repeats counts as the records it stands for.
+        """
+        # Aggregate the batch first: one bucket update per distinct key, not per record
+        batch = Counter()
+        for timestamp, level, source, repeat_count in records:
+            batch[(timestamp[:16], level, source)] += repeat_count
+        for (minute, level, source), count in batch.items():
+            # Old timestamps go to the granularity that still holds their period
+            if minute[:10] < self.hour_horizon:
+                name, key = "1d", minute[:10]
+            elif minute[:13] < self.minute_horizon:
+                name, key = "1h", minute[:13]
+            else:
+                name, key = "1m", minute
+            counts = self.buckets[name].get(key)
+            if counts is None:
+                counts = self.buckets[name][key] = Counter()
+            counts[(level, source)] += count
+
+    def compact(self, now: Optional[datetime] = None) -> None:
+        """Fold minute buckets into hours and hour buckets into days once past retention."""
+        now = now or datetime.now()
+        with self._lock:
+            self._last_compact = time.monotonic()
+            minute_horizon = (now - self.minute_retention).strftime(KEY_FORMATS["1h"])
+            hour_horizon = (now - self.hour_retention).strftime(KEY_FORMATS["1d"])
+            self.minute_horizon = max(self.minute_horizon, minute_horizon)
+            self.hour_horizon = max(self.hour_horizon, hour_horizon)
+            self._fold("1m", "1h", 13, self.minute_horizon)
+            self._fold("1h", "1d", 10, self.hour_horizon)
+
+    def _fold(self, finer: str, coarser: str, key_length: int, horizon: str) -> None:
+        """Move finer buckets whose coarser key is before horizon into the coarser buckets."""
+        buckets = self.buckets[finer]
+        for key in [k for k in buckets if k[:key_length] < horizon]:
+            target = self.buckets[coarser].get(key[:key_length])
+            if target is None:
+                target = self.buckets[coarser][key[:key_length]] = Counter()
+            target.update(buckets.pop(key))
+
+    def aggregate(self, start: str, end: str, interval: str = "1h", level: str = "ALL",
+                  source: Optional[str] = None, group_by: Tuple[str, ...] = ("level",),
+                  max_buckets: int = 10000) -> Dict[str, Any]:
+        """
+        Count logs per bucket over a time range.
+
+        Args:
+            start (str): Start date or timestamp (inclusive).
+            end (str): End date (inclusive) or timestamp (exclusive).
+            interval (str): Bucket width: "1m", "1h" or "1d". A range reaching back past
+                the retention of that width is answered at the next coarser one.
+            level (str): Only count this level ("ALL" for every level).
+            source (str): Only count this source (None for every source).
+            group_by (tuple): Fields splitting the counts: any of "level", "source".
+            max_buckets (int): Largest number of buckets a query may return.
+
+        Returns:
+            dict: interval used, bucket start keys, per-group counts aligned with the
+            buckets, and the grand total.
+
+        Raises:
+            ValueError: On an unknown interval or group field, or too many buckets.
+        """
+        names = [name for name, _, _ in INTERVALS]
+        if interval not in names:
+            raise ValueError(f"Unknown interval: {interval}")
+        if any(field not in GROUP_FIELDS for field in group_by):
+            raise ValueError(f"group_by accepts {', '.join(GROUP_FIELDS)}")
+        want_level = None if not level or level.upper() == "ALL" else level
+        start_dt, end_dt = parse_bound(start), parse_bound(end, upper=True)
+
+        with self._lock:
+            # Coarsen if the range reaches into periods already folded away
+            start_key = start_dt.strftime(KEY_FORMATS["1m"])
+            if interval == "1m" and start_key[:13] < self.minute_horizon:
+                interval = "1h"
+            if interval == "1h" and start_key[:10] < self.hour_horizon:
+                interval = "1d"
+
+            step = dict((name, delta) for name, _, delta in INTERVALS)[interval]
+            bucket = datetime.strptime(start_dt.strftime(KEY_FORMATS[interval]), KEY_FORMATS[interval])
+            keys = []
+            while bucket < end_dt:
+                keys.append(bucket.strftime(KEY_FORMATS[interval]))
+                if len(keys) > max_buckets:
+                    raise ValueError(f"Range spans more than {max_buckets} {interval} buckets")
+                bucket += step
+
+            series: Dict[Tuple[str, ...], List[int]] = {}
+            for i, key in enumerate(keys):
+                for counts in self._bucket_counts(interval, key):
+                    for (record_level, record_source), count in counts.items():
+                        if want_level is not None and record_level != want_level:
+                            continue
+                        if source and record_source != source:
+                            continue
+                        values = {"level": record_level, "source": record_source}
+                        group = tuple(values[field] for field in group_by)
+                        if group not in series:
+                            series[group] = [0] * len(keys)
+                        series[group][i] += count
+
+        groups = [
+            dict(zip(group_by, group), counts=counts, total=sum(counts))
+            for group, counts in sorted(series.items())
+        ]
+        return {
+            "interval": interval,
+            "buckets": keys,
+            "groups": groups,
+            "total": sum(group["total"] for group in groups),
+        }
+
+    def _bucket_counts(self, interval: str, key: str) -> List[Counter]:
+        """Return the counters covering one bucket: the bucket itself plus finer ones inside it."""
+        found = []
+        counts = self.buckets[interval].get(key)
+        if counts:
+            found.append(counts)
+        if interval == "1d" and key >= self.hour_horizon:
+            for hour in range(24):
+                found.extend(self._bucket_counts("1h", f"{key} {hour:02d}"))
+        elif interval == "1h" and key >= self.minute_horizon:
+            for minute in range(60):
+                counts = self.buckets["1m"].get(f"{key}:{minute:02d}")
+                if counts:
+                    found.append(counts)
+        return found
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Return the number of buckets held at each granularity.
+
+        Returns:
+            dict: Bucket counts per interval and the counted-id watermark.
+        """
+        with self._lock:
+            stats: Dict[str, Any] = {name: len(buckets) for name, buckets in self.buckets.items()}
+            stats["watermark"] = self.watermark
+            return stats
+
+    def close(self) -> None:
+        """Write a final snapshot."""
+        self.save()
+
+
+def default_rollup_path(kind: str, target: Optional[str] = None) -> str:
+    """
+    Pick a snapshot file for the rollups next to the storage they count.
+
+    Args:
+        kind (str): Storage backend name (see storage.BACKENDS).
+        target (str): The backend's file, directory or connection string.
+    """
+    if kind == "sqlite":
+        return f"{target or 'logs.db'}.rollups.json"
+    if kind == "segments":
+        return os.path.join(target or "segments", "rollups.json")
+    return "rollups.json"
@@ -0,0 +1,431 @@
+import bisect
+import json
+import mmap
+import os
+import re
+import threading
+from array import array
+from typing import Any, Dict, List, Optional, Tuple
+from storage import day_bounds
+
+# Words are runs of letters, digits and underscores, matched case-insensitively
+TOKEN = re.compile(r"\w+")
+# Query syntax: "quoted phrase", prefix*, or a plain term
+QUERY_PART = re.compile(r'"([^"]*)"|(\S+)')
+
+
+def tokenize(text: str) -> List[str]:
+    """Split text into lower-case index terms."""
+    return TOKEN.findall(text.lower())
+
+
+def level_term(level: str) -> str:
+    """Index term for a log level; ':' never occurs in a word, so it cannot collide."""
+    return f"level:{level}"
+
+
+def parse_query(query: str) -> List[Tuple[str, Any]]:
+    """
+    Parse a search query into clauses that must all match.
+
+    Args:
+        query (str): e.g. `"authentication timeout" pay*` (phrase and prefix).
+
+    Returns:
+        list: ("term", word), ("prefix", word) or ("phrase", [words]) clauses.
+
+    Raises:
+        ValueError: If the query contains no searchable words.
+    """
+    clauses = []
+    for phrase, word in QUERY_PART.findall(query):
+        if phrase:
+            words = tokenize(phrase)
+            if len(words) == 1:
+                clauses.append(("term", words[0]))
+            elif words:
+                clauses.append(("phrase", words))
+        elif word.endswith("*"):
+            words = tokenize(word)
+            if words:
+                # Only the last word is a prefix: "auth-serv*" is auth AND serv*
+                clauses.extend(("term", w) for w in words[:-1])
+                clauses.append(("prefix", words[-1]))
+        else:
+            clauses.extend(("term", w) for w in tokenize(word))
+    if not clauses:
+        raise ValueError("Empty search query")
+    return clauses
+
+
+def contains_phrase(tokens: List[str], phrase: List[str]) -> bool:
+    """Return True if the phrase words appear consecutively in tokens."""
+    n = len(phrase)
+    return any(tokens[i:i + n] == phrase for i in range(len(tokens) - n + 1))
+
+
+class IndexSegment:
+    """
+    One sealed, immutable slice of the inverted index.
+
+    Stored as two files: `.post` holds every posting list back to back as native
+    unsigned 64-bit ids in ascending order, and `.terms` (JSON) maps each term to
+    [offset, count] in that array plus the segment's id and timestamp range.
+    """
+
+    def __init__(self, postings_path: str, meta: Dict[str, Any]) -> None:
+        self.postings_path = postings_path
+        self.first_id = meta["first_id"]
+        self.last_id = meta["last_id"]
+        self.min_ts = meta["min_ts"]
+        self.max_ts = meta["max_ts"]
+        self.terms: Dict[str, List[int]] = meta["terms"]
+        self._sorted_terms: Optional[List[str]] = None
+        self._map: Optional[mmap.mmap] = None
+
+    def postings(self, term: str) -> array:
+        """Return the ascending ids containing term."""
+        entry = self.terms.get(term)
+        ids = array("Q")
+        if entry is None:
+            return ids
+        if self._map is None:
+            with open(self.postings_path, "rb") as f:
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        offset, count = entry
+        ids.frombytes(self._map[offset * ids.itemsize:(offset + count) * ids.itemsize])
+        return ids
+
+    def prefixed(self, prefix: str) -> List[str]:
+        """Return the terms starting with prefix."""
+        if self._sorted_terms is None:
+            self._sorted_terms = sorted(self.terms)
+        start = bisect.bisect_left(self._sorted_terms, prefix)
+        end = bisect.bisect_left(self._sorted_terms, prefix + "\uffff")
+        return self._sorted_terms[start:end]
+
+    def close(self) -> None:
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+
+
+class ActiveSegment:
+    """The in-memory slice of the index that new records are added to."""
+
+    def __init__(self) -> None:
+        self.terms: Dict[str, array] = {}
+        self.count = 0
+        self.first_id: Optional[int] = None
+        self.last_id = 0
+        self.min_ts: Optional[str] = None
+        self.max_ts: Optional[str] = None
+
+    def add(self, record_id: int, timestamp: str, terms) -> None:
+        for term in terms:
+            postings = self.terms.get(term)
+            if postings is None:
+                postings = self.terms[term] = array("Q")
+            postings.append(record_id)
+        self.count += 1
+        self.first_id = record_id if self.first_id is None else min(self.first_id, record_id)
+        self.last_id = max(self.last_id, record_id)
+        self.min_ts = timestamp if self.min_ts is None else min(self.min_ts, timestamp)
+        self.max_ts = timestamp if self.max_ts is None else max(self.max_ts, timestamp)
+
+    def postings(self, term: str) -> array:
+        # Concurrent writers may commit out of order, so sort on read
+        return array("Q", sorted(self.terms.get(term, ())))
+
+    def prefixed(self, prefix: str) -> List[str]:
+        return [term for term in self.terms if term.startswith(prefix)]
+
+
+class SearchIndex:
+    """
+    Incrementally maintained inverted index over log messages and sources.
+
+    Every committed batch is tokenized into an in-memory active segment (registered
+    as a BatchWriter commit listener). Once it holds `segment_docs` records it is
+    sealed into immutable files in `directory`. A search walks the segments newest
+    first, intersects posting lists for each segment, and fetches only the matching
+    rows from storage, so no query scans the log table.
+    """
+
+    POSTINGS_SUFFIX = ".post"
+    TERMS_SUFFIX = ".terms"
+
+    def __init__(self, db, directory: str, segment_docs: int = 200000) -> None:
+        """
+        Open (or create) the index and index any stored logs it has not seen yet.
+
+        Args:
+            db: Storage backend used to catch up and to fetch matching rows.
+            directory (str): Directory holding the sealed index segments.
+            segment_docs (int): Records per segment before it is sealed to disk.
+        """
+        self.db = db
+        self.directory = directory
+        self.segment_docs = segment_docs
+        self._lock = threading.Lock()
+        # Serializes catch_up() runs so two writers never index the same rows
+        self._catch_up_lock = threading.Lock()
+        self.segments: List[IndexSegment] = []
+        self.active = ActiveSegment()
+        # Highest id indexed so far; catch_up() continues from here
+        self.last_id = 0
+        # Every id <= watermark is indexed; ids above it that were already seen wait in
+        # _pending (writers can commit out of order). Sealed segments persist it, so a
+        # restart resumes from there rather than from the highest id seen.
+        self.watermark = 0
+        self._pending = set()
+        self._next_segment = 0
+
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+        self.catch_up()
+
+    def _load(self) -> None:
+        """Load sealed segments; postings without a terms file are leftovers of a crash."""
+        names = sorted(os.listdir(self.directory))
+        for name in names:
+            if not name.endswith(self.POSTINGS_SUFFIX):
+                continue
+            stem = os.path.join(self.directory, name[:-len(self.POSTINGS_SUFFIX)])
+            try:
+                with open(stem + self.TERMS_SUFFIX) as f:
+                    meta = json.load(f)
+            except (OSError, ValueError):
+                os.remove(stem + self.POSTINGS_SUFFIX)
+                continue
+            self.segments.append(IndexSegment(stem + self.POSTINGS_SUFFIX, meta))
+            self.watermark = max(self.watermark, meta["watermark"])
+            self._next_segment = max(self._next_segment, int(name[:-len(self.POSTINGS_SUFFIX)]) + 1)
+        # Rows between the watermark and the newest sealed id are indexed again;
+        # search() drops the duplicates
+        self.last_id = self.watermark
+
+    def catch_up(self, batch_size: int = 10000) -> int:
+        """
+        Index logs in storage newer than the last indexed id.
+
+        Returns:
+            int: Number of logs indexed.
+        """
+        indexed = 0
+        with self._catch_up_lock:
+            while True:
+                rows = self.db.scan_logs(self.last_id, batch_size)
+                if not rows:
+                    return indexed
+                with self._lock:
+                    for row in rows:
+                        self._add_row(row[0], str(row[1]), row[2], row[3], row[4])
+                        # A scan in id order sees every stored id, gaps included
+                        self._pending.discard(row[0])
+                        self.watermark = max(self.watermark, row[0])
+                indexed += len(rows)
+
+    def add(self, logs: List[Dict[str, Any]], ids: Optional[List[int]]) -> None:
+        """
+        Index a committed batch; registered as a BatchWriter commit listener.
+
+        Args:
+            logs (list): The committed log dicts.
+            ids (list): Their ids, or None if the backend cannot report them.
+        """
+        if ids is None or len(ids) != len(logs):
+            # Pick the new rows (with their ids) up from storage instead
+            self.catch_up()
+            return
+        with self._lock:
+            for record_id, log in zip(ids, logs):
+                self._add_row(record_id, str(log["timestamp"]), log["level"], log["message"], log["source"])
+            self._pending.update(ids)
+            while self.watermark + 1 in self._pending:
+                self.watermark += 1
+                self._pending.remove(self.watermark)
+
+    def _add_row(self, record_id: int, timestamp: str, level: str, message: str, source: str) -> None:
+        """Add one record to the active segment, sealing it when full (lock held)."""
+        terms = set(tokenize(message))
+        terms.update(tokenize(source))
+        terms.add(level_term(level))
+        self.active.add(record_id, timestamp, terms)
+        self.last_id = max(self.last_id, record_id)
+        if self.active.count >= self.segment_docs:
+            self._seal()
+
+    def _seal(self) -> None:
+        """Write the active segment to disk and start a new one (lock held)."""
+        active = self.active
+        if not active.count:
+            return
+        stem = os.path.join(self.directory, f"{self._next_segment:08d}")
+        self._next_segment += 1
+        terms = {}
+        offset = 0
+        with open(stem + self.POSTINGS_SUFFIX, "wb") as f:
+            for term in sorted(active.terms):
+                postings = active.postings(term)
+                postings.tofile(f)
+                terms[term] = [offset, len(postings)]
+                offset += len(postings)
+            f.flush()
+            os.fsync(f.fileno())
+        meta = {
+            "first_id": active.first_id,
+            "last_id": active.last_id,
+            "min_ts": active.min_ts,
+            "max_ts": active.max_ts,
+            "watermark": self.watermark,
+            "terms": terms,
+        }
+        # The terms file is written last and atomically: its presence marks a complete segment
+        with open(stem + self.TERMS_SUFFIX + ".tmp", "w") as f:
+            json.dump(meta, f)
+        os.replace(stem + self.TERMS_SUFFIX + ".tmp", stem + self.TERMS_SUFFIX)
+        self.segments.append(IndexSegment(stem + self.POSTINGS_SUFFIX, meta))
+        self.active = ActiveSegment()
+
+    def search(self, query: str, level: str = "ALL", start: Optional[str] = None,
+               end: Optional[str] = None, limit: int = 100) -> List[Any]:
+        """
+        Find the newest logs matching a query.
+
+        Args:
+            query (str): Words (all must match), "quoted phrases" and prefix* terms,
+                matched against message and source.
+            level (str): Log level to filter (use "ALL" for no filtering).
+            start (str): Start date (YYYY-MM-DD), or None for no lower bound.
+            end (str): End date (YYYY-MM-DD), inclusive, or None for no upper bound.
+            limit (int): Maximum number of rows.
+
+        Returns:
+            List[Any]: Rows of (id, timestamp, level, message, source), newest first.
+
+        Raises:
+            ValueError: If the query contains no searchable words, or limit is below 1.
+        """
+        if limit < 1:
+            raise ValueError(f"Invalid search limit: {limit}")
+        clauses = parse_query(query)
+        if level and level.upper() != "ALL":
+            clauses.append(("term", level_term(level)))
+        phrases = [words for kind, words in clauses if kind == "phrase"]
+        start_key, end_key = day_bounds(start or "0001-01-01", end or "9998-12-31")
+
+        # Sealed segments are immutable; only the active one has to be read under the lock
+        with self._lock:
+            active = self.active
+            segments = sorted(self.segments, key=lambda s: s.last_id, reverse=True)
+            active_candidates = self._candidates(active, clauses) if self._overlaps(active, start_key, end_key) else []
+
+        rows = self._materialize(active_candidates, start_key, end_key, phrases, limit)
+        for segment in segments:
+            # Segments may overlap in ids when writers commit out of order,
+            # so stop only once the next segment cannot hold newer matches
+            if len(rows) >= limit and segment.last_id < rows[-1][0]:
+                break
+            if not self._overlaps(segment, start_key, end_key):
+                continue
+            candidates = self._candidates(segment, clauses)
+            found = {row[0]: row for row in rows}
+            found.update((row[0], row) for row in self._materialize(candidates, start_key, end_key, phrases, limit))
+            rows = sorted(found.values(), key=lambda row: row[0], reverse=True)[:limit]
+        return rows
+
+    @staticmethod
+    def _overlaps(segment, start_key: str, end_key: str) -> bool:
+        """Return True if the segment may hold records in [start_key, end_key)."""
+        return segment.min_ts is not None and segment.max_ts >= start_key and segment.min_ts < end_key
+
+    @staticmethod
+    def _candidates(segment, clauses) -> List[int]:
+        """Intersect the posting lists of every clause within one segment."""
+        lists = []
+        for kind, value in clauses:
+            if kind == "term":
+                lists.append(segment.postings(value))
+            elif kind == "prefix":
+                ids = set()
+                for term in segment.prefixed(value):
+                    ids.update(segment.postings(term))
+                lists.append(array("Q", sorted(ids)))
+            else:
+                # Phrases are narrowed to records holding every word, then verified on the text
+                lists.extend(segment.postings(word) for word in value)
+            if not lists[-1]:
+                return []
+
+        lists.sort(key=len)
+        result = lists[0]
+        for other in lists[1:]:
+            if len(result) * 16 < len(other):
+                # Probe the (sorted) long list instead of hashing all of it
+                def present(record_id, other=other):
+                    i = bisect.bisect_left(other, record_id)
+                    return i < len(other) and other[i] == record_id
+                result = [record_id for record_id in result if present(record_id)]
+            else:
+                keep = set(other)
+                result = [record_id for record_id in result if record_id in keep]
+            if not result:
+                return []
+        return sorted(set(result), reverse=True)
+
+    def _materialize(self, candidates: List[int], start_key: str, end_key: str,
+                     phrases: List[List[str]], limit: int) -> List[Any]:
+        """Fetch candidate rows newest first until `limit` of them pass the remaining filters."""
+        rows = []
+        chunk = max(limit * 2, 256)
+        for i in range(0, len(candidates), chunk):
+            fetched = self.db.fetch_by_ids(candidates[i:i + chunk])
+            for row in sorted(fetched, key=lambda r: r[0], reverse=True):
+                if not start_key <= str(row[1]) < end_key:
+                    continue
+                if phrases:
+                    message_tokens, source_tokens = tokenize(row[3]), tokenize(row[4])
+                    if not all(contains_phrase(message_tokens, p) or contains_phrase(source_tokens, p)
+                               for p in phrases):
+                        continue
+                rows.append(row)
+                if len(rows) >= limit:
+                    return rows
+        return rows
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Return the size of the index.
+
+        Returns:
+            dict: Sealed segment count, records in the active segment and last indexed id.
+        """
+        with self._lock:
+            return {
+                "segments": len(self.segments),
+                "active_records": self.active.count,
+                "last_id": self.last_id,
+            }
+
+    def close(self) -> None:
+        """Seal the active segment so nothing needs re-indexing on the next start."""
+        with self._lock:
+            self._seal()
+            for segment in self.segments:
+                segment.close()
+
+
+def default_search_dir(kind: str, target: Optional[str] = None) -> str:
+    """
+    Pick a directory for the search index next to the storage it covers.
+
+    Args:
+        kind (str): Storage backend name (see storage.BACKENDS).
+        target (str): The backend's file, directory or connection string.
+    """
+    if kind == "sqlite":
+        return f"{target or 'logs.db'}.search"
+    if kind == "segments":
+        return os.path.join(target or "segments", "search")
+    return "search_index"
@@ -0,0 +1,924 @@
+import bisect
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional
+from storage import (StorageBackend, day_bounds, parse_timestamp, format_timestamp,
+                     MAX_LEVEL_BYTES, MAX_SOURCE_BYTES, MAX_REPEAT_COUNT)
+from cold_segment import CODECS, ColdSegment
+from templates import TemplateMiner
+
+# Version of the hot segment record layout, kept in the store's state file
+FORMAT = 2
+# Per-record header: id, epoch timestamp, flags, level length, source length, message length
+RECORD = struct.Struct("!QdBBHI")
+
+# Flag of a summary of suppressed repeats; REPEAT follows the message
+REPEATED = 0x01
+# Repeat trailer: number of records summarized, epoch timestamp of the first one
+REPEAT = struct.Struct("!Id")
+# Flag of a templated record: the message is TEMPLATE and the parameters
+TEMPLATED = 0x02
+TEMPLATE = struct.Struct("!I")
+
+# Format 1 header, which kept the flags in the top bits of the level length; only read to upgrade
+RECORD_V1 = struct.Struct("!QdBHI")
+FLAGS_V1 = ((0x80, REPEATED), (0x40, TEMPLATED))
+
+
+def clip(data: bytes, limit: int) -> bytes:
+    """Cut UTF-8 text to at most `limit` bytes without splitting a character."""
+    if len(data) <= limit:
+        return data
+    return data[:limit].decode("utf-8", "ignore").encode("utf-8")
+
+
+def message_text(data, start: int, end: int, templated: int, miner: Optional[TemplateMiner]) -> str:
+    """Decode a record's message, rebuilding it from the dictionary if it is templated."""
+    if templated:
+        (template_id,) = TEMPLATE.unpack_from(data, start)
+        return miner.render(template_id, bytes(data[start + TEMPLATE.size:end]).decode("utf-8"))
+    return bytes(data[start:end]).decode("utf-8")
+
+
+def scan_records(data, offset: int, end: int, start_ts: float, end_ts: float,
+                 want_level: Optional[bytes], want_source: Optional[bytes], min_id: int = 0,
+                 miner: Optional[TemplateMiner] = None) -> List[Any]:
+    """Decode the records in data[offset:end] that match the filters, oldest first."""
+    matches = []
+    while offset < end:
+        record_id, ts, flags, level_len, source_len, message_len = RECORD.unpack_from(data, offset)
+        repeated = flags & REPEATED
+        templated = flags & TEMPLATED
+        body = offset + RECORD.size
+        message_end = offset = body + level_len + source_len + message_len
+        if repeated:
+            offset += REPEAT.size
+        if record_id <= min_id or ts < start_ts or ts >= end_ts:
+            continue
+        level = data[body:body + level_len]
+        if want_level is not None and level != want_level:
+            continue
+        source_start = body + level_len
+        message_start = source_start + source_len
+        if want_source is not None and data[source_start:message_start] != want_source:
+            continue
+        repeat_count, first_timestamp = 1, None
+        if repeated:
+            repeat_count, first_ts = REPEAT.unpack_from(data, message_end)
+            first_timestamp = format_timestamp(first_ts)
+        matches.append((
+            record_id,
+            format_timestamp(ts),
+            bytes(level).decode("utf-8"),
+            message_text(data, message_start, message_end, templated, miner),
+            bytes(data[source_start:message_start]).decode("utf-8"),
+            repeat_count,
+            first_timestamp,
+        ))
+    return matches
+
+
+def decode_records(data, size: int, miner: Optional[TemplateMiner] = None) -> List[tuple]:
+    """
+    Decode every record of a hot segment for rewriting it in the cold format.
+
+    Templated messages are rebuilt: the cold format compresses the full text.
+
+    Returns:
+        list: (id, ts, level, source, message, repeat_count, first_ts) tuples, with
+        the strings as bytes and the timestamps as epoch seconds.
+    """
+    records = []
+    offset = 0
+    while offset < size:
+        record_id, ts, flags, level_len, source_len, message_len = RECORD.unpack_from(data, offset)
+        repeated = flags & REPEATED
+        templated = flags & TEMPLATED
+        body = offset + RECORD.size
+        source_start = body + level_len
+        message_start = source_start + source_len
+        offset = message_start + message_len
+        message_end = offset
+        repeat_count, first_ts = 1, ts
+        if repeated:
+            repeat_count, first_ts = REPEAT.unpack_from(data, message_end)
+            offset += REPEAT.size
+        records.append((record_id, ts, bytes(data[body:source_start]), bytes(data[source_start:message_start]),
+                        message_text(data, message_start, message_end, templated, miner).encode("utf-8")
+                        if templated else bytes(data[message_start:message_end]), repeat_count, first_ts))
+    return records
+
+
+class Segment:
+    """
+    One append-only segment file and its sparse time index.
+
+    The index has one block entry per `index_interval` bytes of records:
+    [offset, min_ts, max_ts, first_id]. Clients' clocks are not ordered, so each block keeps
+    the min and max timestamp it contains rather than assuming sorted times. It also
+    counts the segment's records per message template.
+    """
+
+    def __init__(self, path: str, first_id: int, miner: Optional[TemplateMiner] = None) -> None:
+        self.path = path
+        self.miner = miner
+        self.first_id = first_id
+        self.last_id = first_id - 1
+        self.size = 0
+        self.min_ts = float("inf")
+        self.max_ts = float("-inf")
+        self.blocks: List[List[float]] = []
+        self.template_counts: Dict[int, int] = {}
+        self.created = time.time()
+        self.sealed = False
+        self._map: Optional[mmap.mmap] = None
+        # Reads holding a snapshot, and whether the store has let go of the segment
+        self.readers = 0
+        self.retired = False
+
+    @property
+    def index_path(self) -> str:
+        return self.path[:-len(SegmentStore.SUFFIX)] + ".idx"
+
+    def overlaps(self, start_ts: float, end_ts: float) -> bool:
+        """Return True if the segment may hold records in [start_ts, end_ts)."""
+        return self.size > 0 and self.min_ts < end_ts and self.max_ts >= start_ts
+
+    def note(self, offset: int, ts: float, record_id: int, index_interval: int,
+             template_id: Optional[int] = None) -> None:
+        """Update the index after a record was appended at `offset`."""
+        if not self.blocks or offset - self.blocks[-1][0] >= index_interval:
+            self.blocks.append([offset, ts, ts, record_id])
+        block = self.blocks[-1]
+        block[1] = min(block[1], ts)
+        block[2] = max(block[2], ts)
+        self.min_ts = min(self.min_ts, ts)
+        self.max_ts = max(self.max_ts, ts)
+        self.last_id = record_id
+        if template_id is not None:
+            self.template_counts[template_id] = self.template_counts.get(template_id, 0) + 1
+
+    def save_index(self) -> None:
+        """Persist the index next to the segment file."""
+        with open(self.index_path, "w") as f:
+            json.dump({
+                "first_id": self.first_id,
+                "last_id": self.last_id,
+                "size": self.size,
+                "min_ts": self.min_ts if self.blocks else None,
+                "max_ts": self.max_ts if self.blocks else None,
+                "blocks": self.blocks,
+                "templates": self.template_counts,
+            }, f)
+
+    def load_index(self) -> bool:
+        """Load a persisted index; returns False if it is missing or stale."""
+        try:
+            with open(self.index_path) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return False
+        if meta["size"] != os.path.getsize(self.path):
+            return False
+        if any(len(block) != 4 for block in meta["blocks"]):
+            # Written by an older version without per-block ids
+            return False
+        self.last_id = meta["last_id"]
+        self.size = meta["size"]
+        self.blocks = meta["blocks"]
+        self.template_counts = {int(k): v for k, v in meta.get("templates", {}).items()}
+        if self.blocks:
+            self.min_ts = meta["min_ts"]
+            self.max_ts = meta["max_ts"]
+        return True
+
+    def snapshot(self):
+        """
+        Return a consistent [data, size, blocks] view for read_block() (store lock held).
+
+        A sealed segment is memory-mapped once and the map is shared. The active
+        segment keeps growing, so only its size and index are taken here; read_block()
+        maps that much of the file on first use, outside the store lock.
+        """
+        if self.sealed:
+            if self._map is None:
+                with open(self.path, "rb") as f:
+                    self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            return [self._map, self.size, self.blocks]
+        return [None, self.size, list(self.blocks)]
+
+    def release(self, snapshot) -> None:
+        """Close the map a read of the active segment opened for its snapshot."""
+        if snapshot[0] is not None and snapshot[0] is not self._map:
+            snapshot[0].close()
+
+    def read_block(self, snapshot, j: int, start_ts: float, end_ts: float,
+                   want_level: Optional[bytes], want_source: Optional[bytes], min_id: int = 0) -> List[Any]:
+        """Decode the records of index block `j` that match the filters, oldest first."""
+        data, size, blocks = snapshot
+        if data is None:
+            with open(self.path, "rb") as f:
+                data = snapshot[0] = mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ)
+        block_end = blocks[j + 1][0] if j + 1 < len(blocks) else size
+        return scan_records(data, int(blocks[j][0]), int(block_end), start_ts, end_ts,
+                            want_level, want_source, min_id, self.miner)
+
+    def close(self) -> None:
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+
+
+class SegmentStore(StorageBackend):
+    """
+    Built-in storage engine: append-only segment files with a sparse time index.
+
+    Records get increasing ids and are appended to the active segment, which is
+    sealed and replaced once it reaches `segment_bytes` or `segment_seconds`, or
+    when the day changes, so every segment holds a single day of ingest.
+    Sealed segments are read through mmap. A fetch only visits segments (and
+    index blocks inside them) whose time span overlaps the requested range.
+
+    With `cold_after_days`, a maintenance thread rewrites sealed segments whose
+    newest record is older than that into compressed columnar cold segments
+    (see ColdSegment), which fetches read together with the hot ones. With
+    `retention_days`, segments whose newest record is older than the retention
+    are dropped by deleting their files, without scanning records.
+
+    With `templates`, messages are matched against templates mined on ingest
+    (see TemplateMiner) and stored as a template id and the parameters. The
+    template dictionary is appended to `templates.jsonl` before the records that
+    use it, and reads rebuild the full text.
+    """
+
+    SUFFIX = ".seg"
+    TEMPLATES_FILE = "templates.jsonl"
+    STATE_FILE = "store.json"
+
+    def __init__(self, directory: str, segment_bytes: int = 64 * 1024 * 1024,
+                 segment_seconds: float = 3600, index_interval: int = 64 * 1024,
+                 fsync: bool = False, retention_days: Optional[float] = None,
+                 cold_after_days: Optional[float] = None, cold_codec: str = "zlib",
+                 maintenance_interval: float = 300, templates: bool = False) -> None:
+        """
+        Open (or create) a segment store.
+
+        Args:
+            directory (str): Directory holding the segment and index files.
+            segment_bytes (int): Size at which the active segment is rolled over.
+            segment_seconds (float): Age at which the active segment is rolled over.
+            index_interval (int): Bytes of records covered by one sparse index entry.
+            fsync (bool): fsync the active segment after every batch.
+            retention_days (float): Drop segments whose records are all older than this (None keeps all).
+            cold_after_days (float): Compress segments whose records are all older than this (None: never).
+            cold_codec (str): Block compression of cold segments, "zlib" or "lzma".
+            maintenance_interval (float): Seconds between compaction / retention passes.
+            templates (bool): Store new records as template id + parameters.
+        """
+        if cold_codec not in CODECS:
+            raise ValueError(f"cold_codec must be one of {tuple(CODECS)}")
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.segment_seconds = segment_seconds
+        self.index_interval = index_interval
+        self.fsync = fsync
+        self.retention_days = retention_days
+        self.cold_after_days = cold_after_days
+        self.cold_codec = cold_codec
+
+        self._lock = threading.Lock()
+        self.segments: List[Any] = []
+        self._active_file = None
+        self.next_id = 1
+        self.dropped_segments = 0
+        self.dropped_records = 0
+
+        os.makedirs(directory, exist_ok=True)
+        # Loaded even when mining is off: records templated earlier still have to be rebuilt
+        self.mine_templates = templates
+        self.miner = TemplateMiner()
+        self.miner.load(self._load_templates())
+        self._templates_file = None
+        self._recover()
+
+        self._stopped = threading.Event()
+        self._maintenance = None
+        if retention_days is not None or cold_after_days is not None:
+            self._maintenance = threading.Thread(
+                target=self._maintenance_loop, args=(maintenance_interval,), name="SegmentMaintenance", daemon=True
+            )
+            self._maintenance.start()
+
+    def _load_templates(self) -> List[Any]:
+        """Read the template dictionary, ignoring a line torn by a crash."""
+        entries = []
+        try:
+            with open(os.path.join(self.directory, self.TEMPLATES_FILE), encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entries.append(tuple(json.loads(line)))
+                    except ValueError:
+                        break
+        except FileNotFoundError:
+            pass
+        return entries
+
+    def _save_templates(self) -> None:
+        """Append the templates created since the last batch to the dictionary."""
+        entries = self.miner.unsaved()
+        if not entries:
+            return
+        if self._templates_file is None:
+            self._templates_file = open(os.path.join(self.directory, self.TEMPLATES_FILE), "a", encoding="utf-8")
+        self._templates_file.write("".join(json.dumps(entry) + "\n" for entry in entries))
+        self._templates_file.flush()
+        if self.fsync:
+            os.fsync(self._templates_file.fileno())
+        self.miner.saved(entries)
+
+    def _load_state(self) -> Dict[str, Any]:
+        """Read the store's state file ({} if there is none yet)."""
+        try:
+            with open(os.path.join(self.directory, self.STATE_FILE)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def _save_state(self, **values: Any) -> None:
+        """Update keys of the state file, replacing it atomically."""
+        state = dict(self._state, **values)
+        path = os.path.join(self.directory, self.STATE_FILE)
+        with open(path + ".tmp", "w") as f:
+            json.dump(state, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + ".tmp", path)
+        self._state = state
+
+    def _recover(self) -> None:
+        """Load existing hot and cold segments; rebuild indexes that are missing or stale."""
+        names = os.listdir(self.directory)
+        cold = {int(n[:-len(ColdSegment.SUFFIX)]) for n in names if n.endswith(ColdSegment.SUFFIX)}
+        for name in names:
+            if name.endswith((ColdSegment.SUFFIX + ".tmp", self.SUFFIX + ".tmp")):
+                # A compaction or upgrade interrupted before its rename
+                os.remove(os.path.join(self.directory, name))
+
+        # Directories without a state file predate it: their segments use format 1
+        self._state = self._load_state()
+        hot = sorted(n for n in names if n.endswith(self.SUFFIX))
+        version = self._state.get("format", 1 if hot else FORMAT)
+        if version > FORMAT:
+            raise ValueError(f"{self.directory} uses segment format {version}, newer than this version")
+        if version < FORMAT:
+            for name in hot:
+                if int(name[:-len(self.SUFFIX)]) not in cold:
+                    self._upgrade(os.path.join(self.directory, name))
+        if self._state.get("format") != FORMAT:
+            self._save_state(format=FORMAT)
+
+        for name in sorted(n for n in names if n.endswith((self.SUFFIX, ColdSegment.SUFFIX))):
+            path = os.path.join(self.directory, name)
+            if name.endswith(ColdSegment.SUFFIX):
+                self.segments.append(ColdSegment(path))
+            else:
+                segment = Segment(path, int(name[:-len(self.SUFFIX)]), self.miner)
+                if segment.first_id in cold:
+                    # Compacted, but the hot files were not deleted yet
+                    self._remove_files(segment)
+                    continue
+                if not segment.load_index():
+                    self._rebuild(segment)
+                    segment.save_index()
+                if segment.size == 0:
+                    # Left empty by an older version that created segments before their
+                    # first write; the next active segment would reuse its name
+                    self._remove_files(segment)
+                    continue
+                segment.sealed = True
+                self.segments.append(segment)
+            self.next_id = max(self.next_id, self.segments[-1].last_id + 1)
+        self.segments.sort(key=lambda segment: segment.first_id)
+        # Ids of dropped segments are never reused: cursors and index watermarks point past them
+        self.next_id = max(self.next_id, self._state.get("next_id", 1))
+
+    @staticmethod
+    def _upgrade(path: str) -> None:
+        """
+        Rewrite a format 1 segment, moving the record flags out of the level length.
+
+        The file is replaced atomically and its index is deleted, to be rebuilt. A torn
+        record at the end is dropped, as _rebuild() does.
+        """
+        with open(path, "rb") as f:
+            data = f.read()
+        chunks = []
+        offset = 0
+        while offset + RECORD_V1.size <= len(data):
+            record_id, ts, level_len, source_len, message_len = RECORD_V1.unpack_from(data, offset)
+            flags = 0
+            for bit, flag in FLAGS_V1:
+                if level_len & bit:
+                    flags |= flag
+                    level_len &= ~bit
+            body = offset + RECORD_V1.size
+            end = body + level_len + source_len + message_len + (REPEAT.size if flags & REPEATED else 0)
+            if end > len(data):
+                break
+            chunks.append(RECORD.pack(record_id, ts, flags, level_len, source_len, message_len))
+            chunks.append(data[body:end])
+            offset = end
+        with open(path + ".tmp", "wb") as f:
+            f.write(b"".join(chunks))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + ".tmp", path)
+        try:
+            os.remove(path[:-len(SegmentStore.SUFFIX)] + ".idx")
+        except FileNotFoundError:
+            pass
+
+    def _rebuild(self, segment: Segment) -> None:
+        """Scan a segment to rebuild its index, truncating a torn record at the end."""
+        with open(segment.path, "rb") as f:
+            data = f.read()
+        offset = 0
+        while offset + RECORD.size <= len(data):
+            record_id, ts, flags, level_len, source_len, message_len = RECORD.unpack_from(data, offset)
+            message_start = offset + RECORD.size + level_len + source_len
+            end = message_start + message_len
+            if flags & REPEATED:
+                end += REPEAT.size
+            if end > len(data):
+                break
+            template_id = TEMPLATE.unpack_from(data, message_start)[0] if flags & TEMPLATED else None
+            segment.note(offset, ts, record_id, self.index_interval, template_id)
+            offset = end
+        if offset != len(data):
+            with open(segment.path, "r+b") as f:
+                f.truncate(offset)
+        segment.size = offset
+
+    def insert_log(self, log: Dict[str, Any]) -> None:
+        """
+        Append a single log entry.
+
+        Args:
+            log (dict): Log data with keys 'level', 'message', 'source', 'timestamp'.
+        """
+        self.insert_logs([log])
+
+    def insert_logs(self, logs: List[Dict[str, Any]]) -> Optional[List[int]]:
+        """
+        Append a batch of log entries to the active segment with one write.
+
+        Args:
+            logs (list): Log dicts with keys 'level', 'message', 'source', 'timestamp'.
+
+        Returns:
+            list: The ids assigned to the logs.
+        """
+        if not logs:
+            return []
+        with self._lock:
+            # Encode the whole batch before touching the store, so a record that
+            # fails to encode leaves no index entries, id gap or empty file behind
+            first_id = self.next_id
+            chunks = []
+            notes = []
+            for record_id, log in enumerate(logs, first_id):
+                # The server rejects records that do not fit the header; clipping here keeps
+                # one record from other callers from failing the whole batch in pack()
+                level = clip(log["level"].encode("utf-8"), MAX_LEVEL_BYTES)
+                source = clip(log["source"].encode("utf-8"), MAX_SOURCE_BYTES)
+                ts = parse_timestamp(log["timestamp"])
+                repeat_count = min(max(log.get("repeat_count", 1), 1), MAX_REPEAT_COUNT)
+                flag = REPEATED if repeat_count != 1 else 0
+                encoded = None
+                if self.mine_templates:
+                    encoded = self.miner.encode(log["message"])
+                if encoded is None:
+                    template_id = None
+                    message = log["message"].encode("utf-8")
+                else:
+                    template_id, params = encoded
+                    flag |= TEMPLATED
+                    message = TEMPLATE.pack(template_id) + params.encode("utf-8")
+                chunks.append(RECORD.pack(record_id, ts, flag, len(level), len(source), len(message)))
+                chunks.append(level)
+                chunks.append(source)
+                chunks.append(message)
+                size = RECORD.size + len(level) + len(source) + len(message)
+                if flag & REPEATED:
+                    first = log.get("first_timestamp")
+                    chunks.append(REPEAT.pack(repeat_count, parse_timestamp(first) if first else ts))
+                    size += REPEAT.size
+                notes.append((ts, template_id, size))
+
+            # Dictionary entries reach the disk before the records that use them
+            self._save_templates()
+            segment = self._writable_segment()
+            try:
+                self._active_file.write(b"".join(chunks))
+                self._active_file.flush()
+                if self.fsync:
+                    os.fsync(self._active_file.fileno())
+            except OSError:
+                # Drop a partial write so the next batch starts at a record boundary
+                self._active_file.truncate(segment.size)
+                raise
+
+            offset = segment.size
+            for record_id, (ts, template_id, size) in enumerate(notes, first_id):
+                segment.note(offset, ts, record_id, self.index_interval, template_id)
+                offset += size
+            segment.size = offset
+            self.next_id = first_id + len(logs)
+            return list(range(first_id, self.next_id))
+
+    def _writable_segment(self) -> Segment:
+        """
+        Return the active segment, rolling over by size or age first if needed.
+
+        Only called with a batch ready to append, so no segment file is ever left empty.
+        """
+        if self._active_file is not None:
+            active = self.segments[-1]
+            now = time.time()
+            if (active.size < self.segment_bytes and now - active.created < self.segment_seconds
+                    and time.localtime(now)[:3] == time.localtime(active.created)[:3]):
+                return active
+            self._seal_active()
+        path = os.path.join(self.directory, f"{self.next_id:020d}{self.SUFFIX}")
+        segment = Segment(path, self.next_id, self.miner)
+        self._active_file = open(path, "ab")
+        self.segments.append(segment)
+        return segment
+
+    def _seal_active(self) -> None:
+        """Close the active segment and persist its index; it becomes read-only."""
+        self._active_file.flush()
+        os.fsync(self._active_file.fileno())
+        self._active_file.close()
+        self._active_file = None
+        segment = self.segments[-1]
+        segment.save_index()
+        segment.sealed = True
+
+    def fetch_logs(self, level: str, start: str, end: str, source: Optional[str] = None,
+                   limit: int = 100, since_id: Optional[int] = None,
+                   before_id: Optional[int] = None) -> List[Any]:
+        """
+        Fetch the newest logs matching a level, date range and optional source.
+
+        Args:
+            level (str): Log level to filter (use "ALL" for no filtering).
+            start (str): Start date (YYYY-MM-DD).
+            end (str): End date (YYYY-MM-DD), inclusive.
+            source (str): Only return logs from this source (None for all sources).
+            limit (int): Maximum number of rows.
+            since_id (int): Only return logs with a greater id.
+            before_id (int): Only return logs with a smaller id (the next page).
+
+        Returns:
+            List[Any]: Rows of (id, timestamp, level, message, source, repeat_count,
+            first_timestamp), newest first.
+        """
+        start_ts, end_ts = (parse_timestamp(day) for day in day_bounds(start, end))
+        want_level = None if level.upper() == "ALL" else level.encode("utf-8")
+        want_source = source.encode("utf-8") if source else None
+        min_id = since_id if since_id is not None else 0
+
+        with self._lock:
+            candidates = [
+                s for s in self.segments
+                if s.overlaps(start_ts, end_ts) and s.last_id > min_id
+                and (before_id is None or s.first_id < before_id)
+            ]
+            views = self._pin(reversed(candidates))
+        try:
+            rows = []
+            for segment, snapshot in views:
+                blocks = snapshot[2]
+                # Visit index blocks newest first, skipping those outside the range
+                for i in range(len(blocks) - 1, -1, -1):
+                    block_min, block_max, first_id = blocks[i][1:4]
+                    # Blocks that start at or after the page cursor hold only newer records
+                    if block_min < end_ts and block_max >= start_ts and (before_id is None or first_id < before_id):
+                        matches = segment.read_block(snapshot, i, start_ts, end_ts, want_level, want_source, min_id)
+                        for row in reversed(matches):
+                            if before_id is not None and row[0] >= before_id:
+                                continue
+                            rows.append(row)
+                            if len(rows) >= limit:
+                                return rows
+                    # Ids grow with the offset: every earlier block is below the cursor
+                    if first_id <= min_id:
+                        return rows
+            return rows
+        finally:
+            self._release(views)
+
+    def fetch_by_ids(self, ids: List[int]) -> List[Any]:
+        """
+        Fetch specific logs by id.
+
+        Each id is located through the segments' first ids and the per-block first
+        ids of the index, so only the index blocks holding wanted ids are decoded.
+
+        Args:
+            ids (list): Ids to look up; unknown ids are skipped.
+
+        Returns:
+            List[Any]: Matching rows, oldest first.
+        """
+        with self._lock:
+            views = self._pin(self.segments)
+        try:
+            starts = [segment.first_id for segment, _ in views]
+            block_starts = [[block[3] for block in snapshot[2]] for _, snapshot in views]
+
+            # Group the wanted ids by (segment, block)
+            wanted: Dict[Any, set] = {}
+            for record_id in ids:
+                i = bisect.bisect_right(starts, record_id) - 1
+                if i < 0 or record_id > views[i][0].last_id:
+                    continue
+                j = bisect.bisect_right(block_starts[i], record_id) - 1
+                if j >= 0:
+                    wanted.setdefault((i, j), set()).add(record_id)
+
+            rows = []
+            for (i, j), block_ids in sorted(wanted.items()):
+                segment, snapshot = views[i]
+                matches = segment.read_block(snapshot, j, float("-inf"), float("inf"), None, None, min(block_ids) - 1)
+                rows.extend(row for row in matches if row[0] in block_ids)
+            return rows
+        finally:
+            self._release(views)
+
+    def scan_logs(self, after_id: int, limit: int) -> List[Any]:
+        """
+        Read logs in id order, decoding one index block at a time.
+
+        Args:
+            after_id (int): Only return logs with a greater id.
+            limit (int): Maximum number of rows.
+
+        Returns:
+            List[Any]: Rows oldest first.
+        """
+        with self._lock:
+            views = self._pin(s for s in self.segments if s.last_id > after_id)
+        try:
+            rows = []
+            for segment, snapshot in views:
+                blocks = snapshot[2]
+                # Start at the last block whose first id is not above the cursor
+                first = max(0, bisect.bisect_right([block[3] for block in blocks], after_id + 1) - 1)
+                for j in range(first, len(blocks)):
+                    rows.extend(segment.read_block(snapshot, j, float("-inf"), float("inf"), None, None, after_id))
+                    if len(rows) >= limit:
+                        return rows[:limit]
+            return rows
+        finally:
+            self._release(views)
+
+    def export_logs(self, level: str, start: str, end: str, source: Optional[str] = None,
+                    chunk_size: int = 5000) -> Iterator[List[Any]]:
+        """
+        Stream matching logs in chunks, decoding one index block at a time.
+
+        The segments are taken from a snapshot of the store, so records written
+        during the export are not included.
+
+        Yields:
+            List[Any]: Chunks of rows, oldest first.
+        """
+        start_ts, end_ts = (parse_timestamp(day) for day in day_bounds(start, end))
+        want_level = None if level.upper() == "ALL" else level.encode("utf-8")
+        want_source = source.encode("utf-8") if source else None
+
+        with self._lock:
+            views = self._pin(s for s in self.segments if s.overlaps(start_ts, end_ts))
+        try:
+            rows = []
+            for segment, snapshot in views:
+                for j, block in enumerate(snapshot[2]):
+                    if block[1] < end_ts and block[2] >= start_ts:
+                        rows.extend(segment.read_block(snapshot, j, start_ts, end_ts, want_level, want_source))
+                    if len(rows) >= chunk_size:
+                        yield rows
+                        rows = []
+            if rows:
+                yield rows
+        finally:
+            self._release(views)
+
+    def _maintenance_loop(self, interval: float) -> None:
+        # First pass right away, so a restarted server catches up at once
+        while True:
+            try:
+                self.drop_expired()
+                self.compact_cold()
+            except Exception as e:
+                print(f"[Segment Error] Maintenance failed: {e}")
+            if self._stopped.wait(interval):
+                return
+
+    def drop_expired(self, now: Optional[float] = None) -> int:
+        """
+        Delete the sealed segments whose newest record is older than the retention.
+
+        Dropping a partition is a file deletion: no record is read or rewritten.
+
+        Returns:
+            int: Number of segments dropped.
+        """
+        if self.retention_days is None:
+            return 0
+        cutoff = (now or time.time()) - self.retention_days * 86400
+        with self._lock:
+            active = self.segments[-1] if self._active_file is not None else None
+            expired = [s for s in self.segments if s is not active and s.max_ts < cutoff]
+            self.segments = [s for s in self.segments if s not in expired]
+            for segment in expired:
+                self.dropped_segments += 1
+                self.dropped_records += segment.last_id - segment.first_id + 1
+            if expired:
+                # Ids must keep growing after a restart even if no segment is left
+                self._save_state(next_id=self.next_id)
+            idle = self._retire(expired)
+        for segment in expired:
+            # Readers may still hold a snapshot: the mapping lives on until they are done
+            self._remove_files(segment)
+        for segment in idle:
+            segment.close()
+        return len(expired)
+
+    def compact_cold(self, now: Optional[float] = None) -> int:
+        """
+        Rewrite sealed hot segments whose newest record is older than `cold_after_days` as cold segments.
+
+        Returns:
+            int: Number of segments compacted.
+        """
+        if self.cold_after_days is None:
+            return 0
+        cutoff = (now or time.time()) - self.cold_after_days * 86400
+        with self._lock:
+            due = [s for s in self.segments if isinstance(s, Segment) and s.sealed and s.max_ts < cutoff]
+        compacted = 0
+        for segment in due:
+            if self._stopped.is_set():
+                break
+            with self._lock:
+                if segment not in self.segments:
+                    # Dropped by retention meanwhile
+                    continue
+                views = self._pin([segment])
+            try:
+                # Sealed segments never change, so they are read and rewritten without the lock
+                records = decode_records(views[0][1][0], segment.size, self.miner)
+                path = os.path.join(self.directory, f"{segment.first_id:020d}{ColdSegment.SUFFIX}")
+                cold = ColdSegment.write(path, records, self.cold_codec, hot_bytes=segment.size,
+                                         template_counts=segment.template_counts) if records else None
+            finally:
+                self._release(views)
+            with self._lock:
+                dropped = segment not in self.segments
+                if not dropped:
+                    index = self.segments.index(segment)
+                    if cold is None:
+                        del self.segments[index]
+                    else:
+                        self.segments[index] = cold
+                    idle = self._retire([segment])
+            if dropped:
+                # Dropped by retention meanwhile: the new cold file must not be loaded at startup
+                if cold is not None:
+                    self._remove_files(cold)
+                continue
+            self._remove_files(segment)
+            for retired in idle:
+                retired.close()
+            compacted += 1
+        return compacted
+
+    def _pin(self, segments) -> List[Any]:
+        """
+        Snapshot segments for a read and keep them open until _release() (store lock held).
+
+        Returns:
+            list: (segment, snapshot) pairs.
+        """
+        views = []
+        for segment in segments:
+            segment.readers += 1
+            views.append((segment, segment.snapshot()))
+        return views
+
+    def _release(self, views: List[Any]) -> None:
+        """End a read started with _pin(); close the segments retired meanwhile that it was the last to use."""
+        for segment, snapshot in views:
+            if isinstance(segment, Segment):
+                segment.release(snapshot)
+        idle = []
+        with self._lock:
+            for segment, _ in views:
+                segment.readers -= 1
+                if segment.retired and segment.readers == 0:
+                    idle.append(segment)
+        for segment in idle:
+            segment.close()
+
+    @staticmethod
+    def _retire(segments) -> List[Any]:
+        """
+        Mark segments removed from the store (store lock held).
+
+        Returns:
+            list: The segments no read is using, to be closed by the caller; the
+            others are closed by the last _release().
+        """
+        idle = []
+        for segment in segments:
+            segment.retired = True
+            if segment.readers == 0:
+                idle.append(segment)
+        return idle
+
+    @staticmethod
+    def _remove_files(segment) -> None:
+        """Delete a segment's files; a failure is retried on the next startup."""
+        paths = [segment.path]
+        if isinstance(segment, Segment):
+            paths.append(segment.index_path)
+        for path in paths:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                print(f"[Segment Error] Failed to delete {path}: {e}")
+
+    def templates(self, limit: Optional[int] = 100) -> Optional[List[Dict[str, Any]]]:
+        """
+        List the mined message templates with the number of stored records of each.
+
+        Counts are kept per segment, so they are read without touching any record
+        and follow retention: dropped segments take their counts with them.
+
+        Args:
+            limit (int): Number of templates to return (None for all).
+
+        Returns:
+            list: {"id", "template", "count"} dicts, most frequent first, or None if
+            template mining is disabled.
+        """
+        if not self.mine_templates:
+            return None
+        counts: Dict[int, int] = {}
+        with self._lock:
+            for segment in self.segments:
+                for template_id, count in segment.template_counts.items():
+                    counts[template_id] = counts.get(template_id, 0) + count
+        return self.miner.summarize(counts, limit)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the number, bytes and records of the hot and cold segments."""
+        with self._lock:
+            hot = [s for s in self.segments if isinstance(s, Segment)]
+            cold = [s for s in self.segments if isinstance(s, ColdSegment)]
+        cold_bytes = sum(s.size for s in cold)
+        return {
+            "hot_segments": len(hot),
+            "hot_bytes": sum(s.size for s in hot),
+            "cold_segments": len(cold),
+            "cold_bytes": cold_bytes,
+            "cold_records": sum(s.count for s in cold),
+            "cold_ratio": sum(s.hot_bytes for s in cold) / cold_bytes if cold_bytes else None,
+            "dropped_segments": self.dropped_segments,
+            "dropped_records": self.dropped_records,
+            "retention_days": self.retention_days,
+            "cold_after_days": self.cold_after_days,
+            "templates": len(self.miner.clusters) if self.mine_templates else None,
+        }
+
+    def close(self) -> None:
+        """Stop maintenance, seal the active segment and release memory maps."""
+        self._stopped.set()
+        if self._maintenance is not None:
+            self._maintenance.join()
+        with self._lock:
+            if self._active_file is not None:
+                self._seal_active()
+            if self._templates_file is not None:
+                self._templates_file.close()
+                self._templates_file = None
+            for segment in self.segments:
+                segment.close()
@@ -1,38 +1,242 @@
 import socket
 import threading
 import json
-from db_manager import DBManager
+import argparse
+import faulthandler
+import gzip
+import os
+import signal
+import sys
+import time
+from storage import (create_backend, parse_timestamp, BACKENDS, MAX_LEVEL_BYTES, MAX_SOURCE_BYTES,
+                     MAX_REPEAT_COUNT)
+from batch_writer import BatchWriter
+from protocol import (MAGIC, HEADER, BINARY_ENCODING, BinaryDecoder, ProtocolError, recv_exact, recv_frame,
+                      send_frame, encode, decode, is_binary, is_complete_json)
+from subscriptions import Subscriber, SubscriptionHub
+from hot_cache import HotCache
+from search_index import SearchIndex, default_search_dir
+from rollups import Rollups, default_rollup_path
+from metrics import Metrics, MetricsEndpoint
+from profiler import sample_stacks, format_profile
+from partitions import PartitionSet, SCATTER_ACTIONS, page_size, parse_address, search_limit, templates_limit
+from admission import LIMIT_POLICIES, RateLimiter, RepeatSuppressor
+
+# Actions used as metric labels; anything else is counted as "other"
+KNOWN_ACTIONS = frozenset({
+    "LOG", "LOG_BATCH", "FETCH_LOGS", "SEARCH", "AGGREGATE", "SERVER_STATS",
+    "METRICS", "PROFILE", "HELLO", "TAIL", "EXPORT", "TEMPLATES",
+})
+
+# Fields every log record must carry, as strings
+RECORD_FIELDS = ("level", "message", "source", "timestamp")
+
+
+def invalid_record(log):
+    """
+    Check a log record before it is queued for a shared batch.
+
+    Returns:
+        str: Why the record cannot be stored, or None if it is valid.
+    """
+    if not isinstance(log, dict):
+        return "log data must be an object"
+    for field in RECORD_FIELDS:
+        if not isinstance(log.get(field), str):
+            return f"'{field}' must be a string"
+    for field, limit in (("level", MAX_LEVEL_BYTES), ("source", MAX_SOURCE_BYTES)):
+        if len(log[field].encode("utf-8")) > limit:
+            return f"'{field}' is longer than {limit} bytes"
+    try:
+        parse_timestamp(log["timestamp"])
+    except ValueError:
+        return f"Invalid timestamp: {log['timestamp']!r}"
+    repeat_count = log.get("repeat_count", 1)
+    if (not isinstance(repeat_count, int) or isinstance(repeat_count, bool)
+            or not 1 <= repeat_count <= MAX_REPEAT_COUNT):
+        return f"'repeat_count' must be an integer from 1 to {MAX_REPEAT_COUNT}"
+    first = log.get("first_timestamp")
+    if first is not None:
+        try:
+            parse_timestamp(first)
+        except (TypeError, ValueError):
+            return f"Invalid first_timestamp: {first!r}"
+    return None
 
 
 class LogServer:
-    """A multi-threaded logging server for log insertion and retrieval."""
+    """A multi-threaded logging server for log insertion and retrieval (one thread per connection)."""
+
+    # Seconds between heartbeat frames on an idle TAIL stream
+    TAIL_HEARTBEAT = 5.0
+    # Seconds a TAIL client may block a send before it is dropped
+    TAIL_SEND_TIMEOUT = 10.0
+    # Maximum records pushed in one TAIL frame
+    TAIL_BATCH = 500
+    # Rows per EXPORT data frame
+    EXPORT_CHUNK = 5000
+    # gzip level of compressed EXPORT frames; fast levels keep up with the disk
+    EXPORT_GZIP_LEVEL = 1
 
-    def __init__(self, host="127.0.0.1", port=5000):
+    def __init__(self, host="127.0.0.1", port=5000, db=None,
+                 batch_size=500, linger=0.05, writers=1, report_interval=None,
+                 tail_queue_size=10000, cache_size=10000, search_dir=None,
+                 rollup_path=None, metrics_port=None, profiling=False,
+                 reuse_port=False, partitions=None, partition_index=0, peer_port=None,
+                 rate_limit=None, burst=None, limit_policy="reject", sample_every=100,
+                 suppress_window=None, suppress_keys=10000):
         self.host = host
         self.port = port
-        # SQL Server connection string using ODBC Driver 17
-        self.conn_str = (
-            "DRIVER={ODBC Driver 17 for SQL Server};"
-            "SERVER=localhost;"
-            "DATABASE=LoggingDB;"
-            "Trusted_Connection=yes;"
+        # Counters, gauges and latency histograms for METRICS and the /metrics endpoint
+        self.metrics = Metrics()
+        self.metrics_port = metrics_port
+        self.metrics_endpoint = None
+        # Sampling profiler (PROFILE action, /debug/stacks, SIGUSR1 stack dumps)
+        self.profiling = profiling
+        # Multi-process mode: this process owns one partition of the store, and
+        # reads are scattered to every partition (None when running alone)
+        self.partitions = PartitionSet(partitions, partition_index) if partitions and len(partitions) > 1 else None
+        # Storage backend (a StorageBackend); defaults to SQL Server via ODBC Driver 17
+        self.db = db if db is not None else create_backend("sqlserver")
+        # Group-commit writer: LOG requests are queued and written in batches
+        self.writer = BatchWriter(
+            self.db,
+            batch_size=batch_size,
+            linger=linger,
+            writers=writers,
+            report_interval=report_interval,
+            metrics=self.metrics
         )
-        # Initialize Database Manager
-        self.db = DBManager(self.conn_str)
+        # Window of recently committed records that answers most FETCH_LOGS
+        # queries without touching storage (cache_size=0 disables it)
+        self.cache = HotCache(cache_size) if cache_size else None
+        if self.cache is not None:
+            self.writer.listeners.append(self.cache.add)
+        # Inverted index for SEARCH, persisted in search_dir (None disables SEARCH)
+        self.search = SearchIndex(self.db, search_dir) if search_dir else None
+        if self.search is not None:
+            self.writer.listeners.append(self.search.add)
+        # Per-minute/hour/day counts for AGGREGATE, snapshotted to rollup_path
+        self.rollups = Rollups(self.db, rollup_path)
+        self.writer.listeners.append(self.rollups.add)
+        # Live TAIL subscribers; each gets its own bounded queue
+        self.hub = SubscriptionHub()
+        # Per-source token buckets applied to LOG / LOG_BATCH (None: no limit)
+        self.limiter = RateLimiter(rate_limit, burst, limit_policy, sample_every) if rate_limit else None
+        # Folds identical repeated messages into summary records (None: disabled)
+        self.suppressor = RepeatSuppressor(suppress_window, self.enqueue, suppress_keys) if suppress_window else None
+        self.tail_queue_size = tail_queue_size
+        # Number of client connections currently being served
+        self.active_connections = 0
+        self._conn_lock = threading.Lock()
+        self.register_gauges()
         # Initialize TCP/IP Socket
         self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         # Allow immediate reuse of the port after server restart
         self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if reuse_port:
+            # Worker processes share the port; the kernel spreads new connections over them
+            self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        # Private listener through which the other partitions reach this one
+        self.peer_port = peer_port
+        self.peer_socket = None
+        if peer_port:
+            self.peer_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self.peer_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
 
-    def start(self):
-        """Bind the socket and start listening for incoming client connections."""
+    def register_gauges(self):
+        """Expose queue depths and connection counts as gauges."""
+        metrics = self.metrics
+        metrics.gauge("connections_active", lambda: self.active_connections,
+                      "Client connections currently being served")
+        metrics.gauge("threads", threading.active_count, "Live threads in the server process")
+        metrics.gauge("ingest_queue_depth", self.writer.queue.qsize,
+                      "Log entries waiting for the batch writer")
+        metrics.gauge("tail_subscribers", lambda: len(self.hub), "Connected TAIL subscribers")
+        metrics.gauge("tail_queue_depth", self.hub.queued, "Records waiting in TAIL subscriber queues")
+        if self.cache is not None:
+            metrics.gauge("cache_records", lambda: len(self.cache), "Records held by the hot cache")
+        if self.suppressor is not None:
+            metrics.gauge("suppression_tracked", lambda: len(self.suppressor),
+                          "Distinct messages inside an open suppression window")
+        metrics.meter("ingest_rate")
+        metrics.describe("ingest_rate", "Log entries accepted per second (10s average)")
+        metrics.describe("connections_accepted_total", "Client connections accepted")
+        metrics.describe("records_ingested_total", "Log entries accepted")
+        metrics.describe("bytes_received_total", "Request bytes read from clients")
+        metrics.describe("bytes_sent_total", "Response and TAIL bytes written to clients")
+        metrics.describe("errors_total", "Errors by type")
+        metrics.describe("records_throttled_total", "Log entries refused or sampled out by the rate limiter")
+        metrics.describe("requests_throttled_total", "LOG / LOG_BATCH requests refused by the rate limiter")
+        metrics.describe("records_suppressed_total", "Repeated log entries folded into summary records")
+        metrics.describe("records_exported_total", "Log entries streamed by EXPORT")
+        metrics.describe("parse_seconds", "Time to decode one request frame")
+        metrics.describe("request_seconds", "Time to process one request, by action")
+        metrics.describe("db_insert_seconds", "Time of one batched insert_logs commit")
+        metrics.describe("db_fetch_seconds", "Time of one FETCH_LOGS storage query")
+
+    def start_observability(self):
+        """Start the metrics endpoint and the SIGUSR1 stack dump hook, if enabled."""
+        if self.metrics_port:
+            self.metrics_endpoint = MetricsEndpoint(
+                self.metrics, self.host, self.metrics_port,
+                profile=(lambda seconds: format_profile(sample_stacks(seconds))) if self.profiling else None
+            )
+            self.metrics_endpoint.start()
+            print(f"Metrics available on http://{self.host}:{self.metrics_port}/metrics")
+        if self.profiling and hasattr(signal, "SIGUSR1"):
+            # `kill -USR1 <pid>` prints every thread's stack without stopping the server
+            faulthandler.register(signal.SIGUSR1, all_threads=True)
+
+    def stop_observability(self):
+        if self.metrics_endpoint is not None:
+            self.metrics_endpoint.close()
+            self.metrics_endpoint = None
+
+    def observe_request(self, request, response, elapsed):
+        """Record the latency of a processed request, ingested entries and failures."""
+        action = request.get("action")
+        label = action if action in KNOWN_ACTIONS else "other"
+        self.metrics.observe("request_seconds", elapsed, action=label)
+        if action == "LOG":
+            count = 1
+        elif action == "LOG_BATCH":
+            count = len(request.get("data") or [])
+        else:
+            count = 0
+        if count and response.get("status") == "OK":
+            self.metrics.inc("records_ingested_total", count)
+            self.metrics.meter("ingest_rate").mark(count)
+        if response.get("status") != "OK":
+            self.metrics.inc("errors_total", type="request_failed", action=label)
+
+    def bind(self):
+        """Bind and listen on the client port (and the peer port, if any)."""
         self.server_socket.bind((self.host, self.port))
         self.server_socket.listen()
+        if self.peer_socket is not None:
+            # Peers are other processes on this host
+            self.peer_socket.bind(("127.0.0.1", self.peer_port))
+            self.peer_socket.listen()
+
+    def start(self):
+        """Bind the socket and start listening for incoming client connections."""
+        self.bind()
+        self.start_observability()
         print(f"Server running and protected on {self.host}:{self.port}...")
+        if self.peer_socket is not None:
+            threading.Thread(target=self.accept_loop, args=(self.peer_socket,), daemon=True).start()
+        self.accept_loop(self.server_socket)
 
+    def accept_loop(self, listen_socket):
+        """Accept connections on a listening socket until it is closed."""
         while True:
             # Accept new client connection
-            client_socket, _ = self.server_socket.accept()
+            try:
+                client_socket, _ = listen_socket.accept()
+            except OSError:
+                # The listening socket was closed by stop()
+                break
             # Start a new thread for each client to enable concurrency
             threading.Thread(
                 target=self.handle_client,
@@ -42,66 +246,713 @@ class LogServer:
 
     def handle_client(self, client_socket):
         """Handle incoming requests from a specific client."""
+        with self._conn_lock:
+            self.active_connections += 1
+        self.metrics.inc("connections_accepted_total")
         with client_socket:
             try:
-                # Retrieve the full data payload from the socket
-                data = self.receive_full_data(client_socket)
-                if not data:
+                # Framed clients open with the protocol magic; legacy clients
+                # send a single JSON payload per connection.
+                head = recv_exact(client_socket, len(MAGIC))
+                if head is None:
                     return
-
-                # Parse JSON request
-                request = json.loads(data.decode())
-                action = request.get("action")
-
-                # Branch logic based on the requested action
-                if action == "LOG":
-                    # Insert a new log entry into the database
-                    self.db.insert_log(request.get("data"))
-
-                elif action == "FETCH_LOGS":
-                    # Retrieve logs based on provided filters (level, date range)
-                    filters = request.get("filters", {})
-                    rows = self.db.fetch_logs(
-                        filters.get("level"),
-                        filters.get("from"),
-                        filters.get("to")
-                    )
-
-                    # Construct the JSON response structure
-                    response = {
-                        "status": "OK",
-                        "data": [
-                            {
-                                "id": row[0],
-                                "timestamp": str(row[1]),
-                                "level": row[2],
-                                "message": row[3],
-                                "source": row[4],
-                            }
-                            for row in rows
-                        ],
-                    }
-                    # Send response back to the client
-                    client_socket.sendall(json.dumps(response).encode())
-
+                if head == MAGIC:
+                    self.handle_framed(client_socket)
+                else:
+                    self.handle_legacy(client_socket, head)
             except Exception as e:
+                self.metrics.inc("errors_total", type=type(e).__name__)
                 print(f"Server Error during client handling: {e}")
+            finally:
+                with self._conn_lock:
+                    self.active_connections -= 1
+
+    def handle_framed(self, client_socket):
+        """Serve pipelined length-prefixed requests until the client disconnects."""
+        client_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        # Per-connection string dictionary, once the client negotiated the binary encoding
+        decoder = None
+        metrics = self.metrics
+        while True:
+            payload = recv_frame(client_socket)
+            if payload is None:
+                return
+            metrics.inc("bytes_received_total", len(payload) + HEADER.size)
+            started = time.perf_counter()
+            try:
+                request = self.decode_binary(decoder, payload) if is_binary(payload) else decode(payload)
+                if not isinstance(request, dict):
+                    raise ValueError("a request must be a JSON object")
+            except (ValueError, ProtocolError) as e:
+                metrics.inc("errors_total", type="invalid_request")
+                body = encode({"status": "ERROR", "error": f"Invalid request: {e}"})
+                send_frame(client_socket, body)
+                metrics.inc("bytes_sent_total", len(body) + HEADER.size)
+                continue
+            parsed = time.perf_counter()
+            metrics.observe("parse_seconds", parsed - started, encoding="binary" if is_binary(payload) else "json")
+            if request.get("action") == "TAIL":
+                # The connection now belongs to the push stream
+                self.serve_tail(client_socket, request)
+                return
+            if request.get("action") == "EXPORT":
+                # Answered with a stream of frames; the connection is reusable afterwards
+                summary = self.serve_export(client_socket, request)
+                self.observe_request(request, summary, time.perf_counter() - parsed)
+                continue
+            try:
+                if request.get("action") == "HELLO":
+                    response, decoder = self.negotiate(request)
+                else:
+                    response = self.process_request(request)
+            except Exception as e:
+                # Answer this frame and keep the connection for the requests pipelined behind it
+                response = self.request_failed(e)
+            self.observe_request(request, response, time.perf_counter() - parsed)
+            # Every frame gets exactly one acknowledgement, in request order
+            body = encode(response)
+            send_frame(client_socket, body)
+            metrics.inc("bytes_sent_total", len(body) + HEADER.size)
+
+    def request_failed(self, error):
+        """
+        Build the acknowledgement of a framed request whose processing raised.
+
+        Args:
+            error (Exception): The exception raised by process_request.
+
+        Returns:
+            dict: An ERROR response for the request.
+        """
+        self.metrics.inc("errors_total", type=type(error).__name__)
+        print(f"Server Error during request processing: {error}")
+        return {"status": "ERROR", "error": f"Request failed: {error}"}
+
+    @staticmethod
+    def negotiate(request):
+        """
+        Answer a HELLO request, choosing the record encoding for the connection.
+
+        Returns:
+            tuple: (response, BinaryDecoder or None if the connection stays on JSON).
+        """
+        if BINARY_ENCODING in request.get("encodings", []):
+            return {"status": "OK", "encoding": BINARY_ENCODING}, BinaryDecoder()
+        return {"status": "OK", "encoding": "json"}, None
+
+    @staticmethod
+    def decode_binary(decoder, payload):
+        """Turn a binary batch frame into the equivalent LOG_BATCH request."""
+        if decoder is None:
+            raise ProtocolError("Binary frame before the encoding was negotiated")
+        return {"action": "LOG_BATCH", "data": decoder.decode_batch(payload)}
+
+    def serve_tail(self, client_socket, request):
+        """
+        Push newly accepted records matching the subscriber's filters as frames.
+
+        Frames are {"status": "OK", "type": "logs" | "heartbeat", "data": [...]}. A client
+        whose queue overflows gets a final {"status": "EVICTED"} frame and is disconnected.
+        """
+        filters = request.get("filters", {})
+        subscriber = self.hub.subscribe(Subscriber(
+            filters.get("level", "ALL"),
+            filters.get("source"),
+            max_queue=self.tail_queue_size
+        ))
+        # Records ingested by the other partitions are relayed into the same queue
+        stopped = threading.Event()
+        if self.partitions is not None and not request.get("local"):
+            self.partitions.follow(request, subscriber, stopped)
+        client_socket.settimeout(self.TAIL_SEND_TIMEOUT)
+
+        def send(message):
+            body = encode(message)
+            send_frame(client_socket, body)
+            self.metrics.inc("bytes_sent_total", len(body) + HEADER.size)
+
+        try:
+            send({"status": "OK", "type": "subscribed"})
+            while True:
+                records = subscriber.wait(self.TAIL_BATCH, self.TAIL_HEARTBEAT)
+                if subscriber.evicted:
+                    self.metrics.inc("errors_total", type="tail_evicted")
+                    send({"status": "EVICTED", "error": "Subscriber too slow"})
+                    return
+                send({
+                    "status": "OK",
+                    "type": "logs" if records else "heartbeat",
+                    "data": records
+                })
+        except OSError:
+            # The viewer went away or stopped reading
+            pass
+        finally:
+            stopped.set()
+            self.hub.unsubscribe(subscriber)
+
+    def serve_export(self, client_socket, request):
+        """
+        Send the frames answering an EXPORT request (see export_stream).
+
+        Returns:
+            dict: The final frame sent.
+        """
+        frames = self.export_stream(request)
+        payload = b""
+        try:
+            for payload in frames:
+                send_frame(client_socket, payload)
+                self.metrics.inc("bytes_sent_total", len(payload) + HEADER.size)
+        finally:
+            # Releases the storage cursor if the client went away mid-stream
+            frames.close()
+        return decode(payload)
+
+    def export_stream(self, request):
+        """
+        Generate the frames answering an EXPORT request.
+
+        The first frame is {"status": "OK", "type": "export", "format": "ndjson",
+        "compression": null | "gzip"}. Data frames follow, each holding up to
+        EXPORT_CHUNK rows as NDJSON lines; with gzip every frame is a complete gzip
+        member, so the frames written back to back form one valid .gz file. An empty
+        frame ends the data, and a last frame reports {"status": "OK", "type": "end",
+        "count": ...} or the error that cut the export short.
+
+        Rows are read from storage chunk by chunk while the frames are sent, so
+        memory use does not depend on the size of the export.
+        """
+        compression = request.get("compression")
+        if compression not in (None, "gzip"):
+            yield encode({"status": "ERROR", "error": f"Unknown compression: {compression}"})
+            return
+        filters = request.get("filters", {})
+        if not filters.get("from") or not filters.get("to"):
+            yield encode({"status": "ERROR", "error": "EXPORT needs 'from' and 'to' filters"})
+            return
+        yield encode({"status": "OK", "type": "export", "format": "ndjson", "compression": compression})
+        if self.partitions is not None and not request.get("local"):
+            # Every partition streams its own rows in turn
+            summary = yield from self.partitions.export(request, self.export_chunks)
+        else:
+            summary = yield from self.export_chunks(request)
+        yield b""
+        yield encode(summary)
+
+    def export_chunks(self, request):
+        """
+        Generate this partition's EXPORT data frames.
+
+        Returns:
+            dict: The summary frame for the rows of this partition.
+        """
+        filters = request.get("filters", {})
+        # A partition of a multi-process server or cluster exports global row ids
+        scale, offset = request.get("id_space") or (1, 0)
+        compress = request.get("compression") == "gzip"
+        count = 0
+        try:
+            for rows in self.db.export_logs(
+                filters.get("level", "ALL"),
+                filters["from"],
+                filters["to"],
+                source=filters.get("source"),
+                chunk_size=self.EXPORT_CHUNK
+            ):
+                lines = []
+                for row in rows:
+                    entry = self.row_entry(row)
+                    entry["id"] = row[0] * scale + offset
+                    lines.append(json.dumps(entry))
+                lines.append("")
+                chunk = "\n".join(lines).encode("utf-8")
+                yield gzip.compress(chunk, self.EXPORT_GZIP_LEVEL, mtime=0) if compress else chunk
+                count += len(rows)
+                self.metrics.inc("records_exported_total", len(rows))
+        except Exception as e:
+            self.metrics.inc("errors_total", type="export_failed")
+            print(f"[Export Error] Export stopped after {count} logs: {e}")
+            return {"status": "ERROR", "error": f"Export failed: {e}", "count": count}
+        return {"status": "OK", "type": "end", "count": count}
+
+    def handle_legacy(self, client_socket, head):
+        """Serve a single unframed JSON request (one payload per connection)."""
+        # Retrieve the full data payload from the socket
+        data = self.receive_full_data(client_socket, head)
+        if not data:
+            return
+        self.metrics.inc("bytes_received_total", len(data))
+
+        # Parse JSON request
+        started = time.perf_counter()
+        request = json.loads(data.decode())
+        parsed = time.perf_counter()
+        self.metrics.observe("parse_seconds", parsed - started, encoding="legacy")
+        response = self.process_request(request)
+        self.observe_request(request, response, time.perf_counter() - parsed)
+
+        # Legacy LOG clients close right after sending and expect no reply
+        if request.get("action") not in ("LOG", "LOG_BATCH"):
+            body = json.dumps(response).encode()
+            client_socket.sendall(body)
+            self.metrics.inc("bytes_sent_total", len(body))
+
+    def process_request(self, request):
+        """
+        Execute one decoded request and build its response.
 
-    def receive_full_data(self, sock, buffer_size=4096):
-        """Receive all data from the client socket until the transmission is complete."""
-        data = b""
+        Args:
+            request (dict): Request with an 'action' key and action-specific fields.
+
+        Returns:
+            dict: Response with a 'status' key.
+        """
+        action = request.get("action")
+
+        if self.partitions is not None and action in SCATTER_ACTIONS and not request.get("local"):
+            if action == "TEMPLATES":
+                # Partitions are asked for all of their templates: the client's limit is only checked here
+                try:
+                    templates_limit(request)
+                except ValueError as e:
+                    return {"status": "ERROR", "error": str(e)}
+            # Reads must cover every partition: ask the others and merge with the local answer
+            return self.partitions.scatter(request, self.process_request)
+
+        # Branch logic based on the requested action
+        if action == "LOG":
+            # Queue the log entry for the next batched commit
+            logs, refused = self.admit([request.get("data")])
+            if refused is not None:
+                return refused
+            self.enqueue(logs)
+            return {"status": "OK"}
+
+        elif action == "LOG_BATCH":
+            # Queue several log entries sent together by a buffering client
+            logs = request.get("data") or []
+            admitted, refused = self.admit(logs)
+            if refused is not None:
+                return refused
+            self.enqueue(admitted)
+            return {"status": "OK", "count": len(logs)}
+
+        elif action == "FETCH_LOGS":
+            # Retrieve one page of logs based on provided filters (level, date range)
+            filters = request.get("filters", {})
+            limit = page_size(request)
+            rows = self.fetch_cached(filters, limit)
+            if rows is None:
+                rows = self.fetch_storage(filters, limit)
+            return self.fetch_response(filters, rows, limit)
+
+        elif action == "SEARCH":
+            # Full-text search over message and source, combined with level/date filters
+            if self.search is None:
+                return {"status": "ERROR", "error": "Search index is disabled"}
+            filters = request.get("filters", {})
+            try:
+                rows = self.search.search(
+                    request.get("query", ""),
+                    level=filters.get("level", "ALL"),
+                    start=filters.get("from"),
+                    end=filters.get("to"),
+                    limit=search_limit(request)
+                )
+            except ValueError as e:
+                return {"status": "ERROR", "error": str(e)}
+            return self.fetch_response(filters, rows)
+
+        elif action == "EXPORT":
+            # Only reachable from legacy connections, which carry a single reply
+            return {"status": "ERROR", "error": "EXPORT needs a framed connection"}
+
+        elif action == "AGGREGATE":
+            # Counts per time bucket from the rollups; raw logs are not read
+            filters = request.get("filters", {})
+            try:
+                result = self.rollups.aggregate(
+                    filters.get("from"),
+                    filters.get("to"),
+                    interval=request.get("interval", "1h"),
+                    level=filters.get("level", "ALL"),
+                    source=filters.get("source"),
+                    group_by=tuple(request.get("group_by", ["level"]))
+                )
+            except (TypeError, ValueError) as e:
+                return {"status": "ERROR", "error": f"Invalid aggregate request: {e}"}
+            return dict(result, status="OK")
+
+        elif action == "TEMPLATES":
+            # Message patterns mined on ingest with their record counts, from the template dictionary
+            try:
+                limit = templates_limit(request)
+            except ValueError as e:
+                return {"status": "ERROR", "error": str(e)}
+            templates = self.db.templates(limit)
+            if templates is None:
+                return {"status": "ERROR", "error": "Template mining is disabled (start the server with --templates)"}
+            return {"status": "OK", "templates": templates}
+
+        elif action == "SERVER_STATS":
+            # Counters for tuning batching and the cache size
+            return {
+                "status": "OK",
+                "writer": self.writer.stats(),
+                "cache": self.cache.stats() if self.cache is not None else None,
+                "search": self.search.stats() if self.search is not None else None,
+                "rollups": self.rollups.stats(),
+                "storage": self.db.stats(),
+                "subscribers": len(self.hub),
+                "connections": self.active_connections,
+                "limiter": self.limiter.stats() if self.limiter is not None else None,
+                "suppression": self.suppressor.stats() if self.suppressor is not None else None,
+            }
+
+        elif action == "METRICS":
+            # Everything the metrics registry holds, as plain data
+            return dict(self.metrics.snapshot(), status="OK")
+
+        elif action == "PROFILE":
+            # Sample every thread's stack for a few seconds and report the hottest ones
+            if not self.profiling:
+                return {"status": "ERROR", "error": "Profiling is disabled (start the server with --profiling)"}
+            try:
+                seconds = min(float(request.get("seconds", 2)), 60.0)
+                top = int(request.get("top", 20))
+            except (TypeError, ValueError) as e:
+                return {"status": "ERROR", "error": f"Invalid profile request: {e}"}
+            return dict(sample_stacks(seconds, top=top, include_idle=bool(request.get("include_idle"))),
+                        status="OK", pid=os.getpid())
+
+        elif action == "TAIL":
+            return {"status": "ERROR", "error": "TAIL requires the framed protocol"}
+
+        return {"status": "ERROR", "error": f"Unknown action: {action}"}
+
+    def admit(self, logs):
+        """
+        Validate incoming records and apply the per-source rate limits and repeat suppression.
+
+        A request holding an invalid record is refused as a whole before anything is
+        queued: one bad record would otherwise fail the shared batch it is committed
+        with. The limiter runs next, so a refused request leaves no trace and can be
+        resent unchanged.
+
+        Returns:
+            tuple: (records to queue, None), or (None, ERROR / THROTTLED response) when
+            the request is refused.
+        """
+        if not isinstance(logs, list):
+            self.metrics.inc("errors_total", type="invalid_record")
+            return None, {"status": "ERROR", "error": "LOG_BATCH data must be a list"}
+        for i, log in enumerate(logs):
+            error = invalid_record(log)
+            if error is not None:
+                self.metrics.inc("errors_total", type="invalid_record")
+                return None, {"status": "ERROR", "error": f"Invalid log record {i}: {error}"}
+        if self.limiter is not None:
+            admitted, retry_after = self.limiter.admit(logs)
+            if retry_after is not None:
+                self.metrics.inc("records_throttled_total", len(logs), policy="reject")
+                self.metrics.inc("requests_throttled_total")
+                return None, {
+                    "status": "THROTTLED",
+                    "error": "Rate limit exceeded",
+                    "retry_after": round(retry_after, 3),
+                }
+            if len(admitted) != len(logs):
+                self.metrics.inc("records_throttled_total", len(logs) - len(admitted), policy="sample")
+            logs = admitted
+        if self.suppressor is not None:
+            kept = self.suppressor.filter(logs)
+            if len(kept) < len(logs):
+                self.metrics.inc("records_suppressed_total", len(logs) - len(kept))
+            logs = kept
+        return logs, None
+
+    def enqueue(self, logs):
+        """Queue admitted records for the next batched commit and push them to TAIL subscribers."""
+        for log in logs:
+            self.writer.submit(log)
+        self.hub.publish(logs)
+
+    def fetch_cached(self, filters, limit):
+        """
+        Answer a FETCH_LOGS query from the hot cache.
+
+        Args:
+            filters (dict): The request's filters.
+            limit (int): Page size.
+
+        Returns:
+            list: Rows newest first, or None if the query must go to storage.
+        """
+        if self.cache is None:
+            return None
+        return self.cache.query(
+            filters.get("level"),
+            filters.get("from"),
+            filters.get("to"),
+            source=filters.get("source"),
+            limit=limit,
+            since_id=filters.get("since_id"),
+            before_id=filters.get("before_id")
+        )
+
+    def fetch_storage(self, filters, limit):
+        """Run a FETCH_LOGS query against the storage backend."""
+        with self.metrics.timer("db_fetch_seconds"):
+            return self.db.fetch_logs(
+                filters.get("level"),
+                filters.get("from"),
+                filters.get("to"),
+                source=filters.get("source"),
+                limit=limit,
+                since_id=filters.get("since_id"),
+                before_id=filters.get("before_id")
+            )
+
+    @staticmethod
+    def row_entry(row):
+        """Turn a storage row into the dict sent to clients."""
+        entry = {
+            "id": row[0],
+            "timestamp": str(row[1]),
+            "level": row[2],
+            "message": row[3],
+            "source": row[4],
+        }
+        if len(row) > 5 and row[5] != 1:
+            entry["repeat_count"] = row[5]
+            entry["first_timestamp"] = str(row[6])
+        return entry
+
+    @staticmethod
+    def fetch_response(filters, rows, limit=None):
+        """
+        Build the FETCH_LOGS response for the given rows.
+
+        The cursor is the highest id returned (or the client's own cursor if nothing
+        is newer), to be sent back as since_id on the next poll. For a FETCH_LOGS
+        page of `limit` rows, "next" is the lowest id returned when the page is
+        full, to be sent back as before_id for the following page (None on the
+        last page). Summaries of suppressed repeats also carry repeat_count and
+        first_timestamp.
+        """
+        response = {
+            "status": "OK",
+            "data": [LogServer.row_entry(row) for row in rows],
+            "cursor": max((row[0] for row in rows), default=filters.get("since_id")),
+        }
+        if limit is not None:
+            response["next"] = min(row[0] for row in rows) if len(rows) >= limit else None
+        return response
+
+    def stop(self):
+        """Stop accepting connections and flush every queued log entry to the database."""
+        try:
+            # shutdown() wakes up a thread blocked in accept()
+            self.server_socket.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.server_socket.close()
+        if self.peer_socket is not None:
+            self.peer_socket.close()
+        self.stop_observability()
+        self.close_storage()
+
+    def close_storage(self):
+        """Flush queued log entries, then close the indexes and the database."""
+        if self.suppressor is not None:
+            # Pending repeat summaries still go through the writer
+            self.suppressor.close()
+        self.writer.close()
+        if self.search is not None:
+            self.search.close()
+        self.rollups.close()
+        self.db.close()
+
+    def receive_full_data(self, sock, data=b"", buffer_size=4096):
+        """
+        Receive an unframed JSON payload from a legacy client.
+
+        Reads until the client closes its side or the bytes received so far form
+        a complete JSON document, whichever comes first. Chunk sizes are not used
+        to guess the end of the message.
+        """
+        data = bytearray(data)
         while True:
             chunk = sock.recv(buffer_size)
             if not chunk:
                 break
             data += chunk
-            # If the chunk is smaller than buffer, it's likely the end of the message
-            if len(chunk) < buffer_size:
+            # Clients that wait for a reply never close, so stop once the document is complete
+            if is_complete_json(data):
                 break
-        return data
+        return bytes(data)
 
 
-if __name__ == "__main__":
+ENGINES = ("threaded", "asyncio")
+
+
+def create_server(engine="threaded", **kwargs):
+    """
+    Build a server using the requested engine.
+
+    Args:
+        engine (str): "threaded" (one thread per connection) or "asyncio" (single event loop).
+        kwargs: Arguments forwarded to the server constructor.
+    """
+    if engine == "asyncio":
+        from async_server import AsyncLogServer
+        return AsyncLogServer(**kwargs)
+    if engine == "threaded":
+        return LogServer(**kwargs)
+    raise ValueError(f"Unknown server engine: {engine}")
+
+
+def parse_args(argv=None):
+    """Parse command line options for running the server standalone."""
+    parser = argparse.ArgumentParser(description="Distributed logging server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--engine", choices=ENGINES, default="threaded",
+                        help="connection handling model")
+    parser.add_argument("--storage", choices=BACKENDS, default="sqlserver",
+                        help="storage backend: SQL Server, embedded SQLite or the built-in segment engine")
+    parser.add_argument("--db-path", metavar="TARGET",
+                        help="ODBC connection string, SQLite file or segment directory for --storage")
+    parser.add_argument("--batch-size", type=int, default=500,
+                        help="maximum number of log entries per commit")
+    parser.add_argument("--linger-ms", type=float, default=50,
+                        help="maximum time to wait for a batch to fill up")
+    parser.add_argument("--writers", type=int, default=1,
+                        help="number of writer threads draining the ingest queue")
+    parser.add_argument("--report-interval", type=float, default=None,
+                        help="print batch size / commit latency stats every N seconds")
+    parser.add_argument("--cache-size", type=int, default=10000,
+                        help="recent records kept in memory for FETCH_LOGS (0 disables the cache)")
+    parser.add_argument("--search-dir", metavar="DIR",
+                        help="directory of the SEARCH index (default: next to the storage)")
+    parser.add_argument("--no-search", action="store_true",
+                        help="disable the SEARCH index")
+    parser.add_argument("--rollup-path", metavar="FILE",
+                        help="snapshot file of the AGGREGATE counters (default: next to the storage)")
+    parser.add_argument("--metrics-port", type=int, default=None,
+                        help="serve Prometheus text metrics on this port at /metrics")
+    parser.add_argument("--profiling", action="store_true",
+                        help="enable the PROFILE action, /debug/stacks and SIGUSR1 stack dumps")
+    parser.add_argument("--retention-days", type=float, default=None,
+                        help="with --storage segments, drop day partitions older than this")
+    parser.add_argument("--cold-after-days", type=float, default=None,
+                        help="with --storage segments, compress partitions older than this into the cold tier")
+    parser.add_argument("--cold-codec", choices=("zlib", "lzma"), default="zlib",
+                        help="block compression of the cold tier")
+    parser.add_argument("--templates", action="store_true",
+                        help="mine message templates on ingest and store records as template id + parameters"
+                             " (sqlite and segments storage)")
+    parser.add_argument("--rate-limit", type=float, default=None, metavar="RECORDS_PER_SEC",
+                        help="per-source ingest limit (token bucket); off by default")
+    parser.add_argument("--burst", type=float, default=None,
+                        help="records a source may send at once above the rate (default: one second's worth)")
+    parser.add_argument("--limit-policy", choices=LIMIT_POLICIES, default="reject",
+                        help="refuse over-limit requests with THROTTLED, or keep a sample of the records")
+    parser.add_argument("--sample-every", type=int, default=100,
+                        help="with --limit-policy sample, keep one over-limit record out of N")
+    parser.add_argument("--suppress-window", type=float, default=None, metavar="SECONDS",
+                        help="fold identical repeated messages within this window into one record")
+    parser.add_argument("--suppress-keys", type=int, default=10000,
+                        help="distinct messages tracked for --suppress-window at once")
+    parser.add_argument("--processes", type=int, default=1,
+                        help="worker processes sharing the port, each writing its own storage partition")
+    parser.add_argument("--peer-port-base", type=int, default=None,
+                        help="first private port of the workers (default: --port + 1)")
+    parser.add_argument("--cluster", metavar="HOST:PORT,...",
+                        help="every node of the cluster, in the same order on every node (new nodes go last)")
+    parser.add_argument("--node-index", type=int, default=None,
+                        help="position of this node in --cluster (default: found from --host/--port)")
+    # Set by the supervisor on each worker process
+    parser.add_argument("--reuse-port", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--partitions", help=argparse.SUPPRESS)
+    parser.add_argument("--partition-index", type=int, default=0, help=argparse.SUPPRESS)
+    parser.add_argument("--peer-port", type=int, default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--parent-pid", type=int, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if (args.retention_days is not None or args.cold_after_days is not None) and args.storage != "segments":
+        parser.error("--retention-days and --cold-after-days require --storage segments")
+    if args.templates and args.storage == "sqlserver":
+        parser.error("--templates requires --storage sqlite or segments")
+    if args.cluster:
+        if args.processes > 1:
+            parser.error("--cluster and --processes cannot be combined")
+        # A cluster node is a partition that its peers reach on the public port
+        args.partitions = args.cluster
+        members = [parse_address(member) for member in args.cluster.split(",")]
+        if args.node_index is None:
+            if (args.host, args.port) not in members:
+                parser.error(f"{args.host}:{args.port} is not in --cluster; pass --node-index")
+            args.node_index = members.index((args.host, args.port))
+        args.partition_index = args.node_index
+    return args
+
+
+def run_server(args):
+    """Run one server process with the parsed command line options until interrupted."""
+    # SIGTERM (sent by supervisors and service managers) stops as gracefully as Ctrl+C
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    if args.parent_pid:
+        # Workers may inherit an ignored SIGINT from a background launch
+        signal.signal(signal.SIGINT, signal.default_int_handler)
+        from supervisor import exit_with_parent
+        exit_with_parent(args.parent_pid)
+    options = {}
+    if args.storage == "segments":
+        options = dict(retention_days=args.retention_days, cold_after_days=args.cold_after_days,
+                       cold_codec=args.cold_codec)
+    if args.templates:
+        options["templates"] = True
+    db = create_backend(args.storage, args.db_path, **options)
+
     # Instantiate and start the server
-    server = LogServer()
-    server.start()
+    server = create_server(
+        args.engine,
+        host=args.host,
+        port=args.port,
+        db=db,
+        batch_size=args.batch_size,
+        linger=args.linger_ms / 1000,
+        writers=args.writers,
+        report_interval=args.report_interval,
+        cache_size=args.cache_size,
+        search_dir=None if args.no_search else args.search_dir or default_search_dir(args.storage, args.db_path),
+        rollup_path=args.rollup_path or default_rollup_path(args.storage, args.db_path),
+        metrics_port=args.metrics_port,
+        profiling=args.profiling,
+        reuse_port=args.reuse_port,
+        partitions=[parse_address(a) for a in args.partitions.split(",")] if args.partitions else None,
+        partition_index=args.partition_index,
+        peer_port=args.peer_port,
+        rate_limit=args.rate_limit,
+        burst=args.burst,
+        limit_policy=args.limit_policy,
+        sample_every=args.sample_every,
+        suppress_window=args.suppress_window,
+        suppress_keys=args.suppress_keys
+    )
+    try:
+        server.start()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        # Flush queued log entries before exiting
+        server.stop()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.processes > 1:
+        from supervisor import Supervisor
+        sys.exit(Supervisor(args).run())
+    run_server(args)
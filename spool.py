@@ -0,0 +1,201 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional, Tuple
+
+# How often appended data is forced to disk
+FSYNC_POLICIES = ("always", "interval", "never")
+
+
+class DiskSpool:
+    """
+    Append-only, segmented on-disk queue of log records for one client process.
+
+    Records are stored as JSON lines in numbered segment files. New records are
+    always appended to the newest segment; replay reads from the oldest one, so
+    records come back in the order they were spooled. When the spool grows past
+    `max_bytes`, whole segments are discarded from the oldest end.
+
+    Replay is at-least-once: a batch is only removed after `ack()`, and a crash
+    before that replays it again.
+    """
+
+    SUFFIX = ".spool"
+
+    def __init__(self, directory: str, segment_bytes: int = 4 * 1024 * 1024,
+                 max_bytes: int = 256 * 1024 * 1024, fsync: str = "interval",
+                 fsync_interval: float = 1.0) -> None:
+        """
+        Open (or create) a spool directory.
+
+        Args:
+            directory (str): Directory holding this process's segment files.
+            segment_bytes (int): Size at which the active segment is sealed and a new one started.
+            max_bytes (int): Upper bound on total spool size on disk.
+            fsync (str): "always" (fsync every append), "interval" or "never" (leave it to the OS).
+            fsync_interval (float): Seconds between fsyncs for the "interval" policy.
+        """
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"fsync must be one of {FSYNC_POLICIES}")
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.max_bytes = max_bytes
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+
+        self._lock = threading.Lock()
+        # Each entry is [segment_id, path, size_in_bytes], oldest first
+        self._segments = deque()
+        self._active = None
+        self._last_fsync = time.monotonic()
+        # Byte offset of the next unread record in the oldest segment
+        self._read_offset = 0
+        self.dropped_records = 0
+
+        os.makedirs(directory, exist_ok=True)
+        # Segments left over from a previous run are replayed first
+        for name in sorted(os.listdir(directory)):
+            if name.endswith(self.SUFFIX):
+                path = os.path.join(directory, name)
+                self._segments.append([int(name[:-len(self.SUFFIX)]), path, os.path.getsize(path)])
+
+    @property
+    def pending_bytes(self) -> int:
+        """Bytes on disk that have not been acknowledged yet."""
+        with self._lock:
+            return sum(seg[2] for seg in self._segments) - self._read_offset
+
+    def is_empty(self) -> bool:
+        """Return True if there is nothing left to replay."""
+        with self._lock:
+            return not self._segments or (
+                len(self._segments) == 1 and self._read_offset >= self._segments[0][2]
+            )
+
+    def append(self, records: List[Dict[str, Any]]) -> None:
+        """
+        Append records to the active segment.
+
+        Args:
+            records (list): Log dicts to spool.
+        """
+        if not records:
+            return
+        data = b"".join(json.dumps(r).encode("utf-8") + b"\n" for r in records)
+        with self._lock:
+            if self._active is None:
+                self._open_segment()
+            self._active.write(data)
+            self._segments[-1][2] += len(data)
+            self._sync()
+            if self._segments[-1][2] >= self.segment_bytes:
+                self._seal()
+            self._enforce_limit()
+
+    def read_batch(self, max_records: int) -> Tuple[List[Dict[str, Any]], Optional[Tuple[int, int]]]:
+        """
+        Read the next records to replay without removing them.
+
+        Args:
+            max_records (int): Maximum number of records to return.
+
+        Returns:
+            tuple: (records, token). Pass the token to ack() once the records were delivered.
+        """
+        with self._lock:
+            while self._segments:
+                seg_id, path, size = self._segments[0]
+                # The active segment is flushed after every append, so it can be read as is
+                is_active = self._active is not None and len(self._segments) == 1
+                records = []
+                offset = self._read_offset
+                with open(path, "rb") as f:
+                    f.seek(offset)
+                    while len(records) < max_records:
+                        line = f.readline()
+                        if not line or not line.endswith(b"\n"):
+                            break
+                        offset += len(line)
+                        try:
+                            records.append(json.loads(line))
+                        except ValueError:
+                            # Torn or corrupted line: skip it rather than block the spool
+                            continue
+                if records:
+                    return records, (seg_id, offset)
+                if is_active:
+                    # Caught up with the writer
+                    break
+                # Fully consumed (or only garbage left): remove and move on
+                self._remove_oldest()
+            return [], None
+
+    def ack(self, token: Optional[Tuple[int, int]]) -> None:
+        """Mark the records returned with `token` as delivered."""
+        if token is None:
+            return
+        seg_id, offset = token
+        with self._lock:
+            if not self._segments or self._segments[0][0] != seg_id:
+                # The segment was discarded by the size limit in the meantime
+                return
+            self._read_offset = offset
+            if offset >= self._segments[0][2] and not (self._active is not None and len(self._segments) == 1):
+                self._remove_oldest()
+
+    def close(self) -> None:
+        """Flush and close the active segment, deleting it if it was fully replayed."""
+        with self._lock:
+            if self._active is not None:
+                self._seal()
+            if self._segments and self._read_offset >= self._segments[0][2]:
+                self._remove_oldest()
+
+    def _open_segment(self) -> None:
+        """Start a new active segment after the newest existing one."""
+        seg_id = self._segments[-1][0] + 1 if self._segments else 1
+        path = os.path.join(self.directory, f"{seg_id:010d}{self.SUFFIX}")
+        self._active = open(path, "ab")
+        self._segments.append([seg_id, path, 0])
+
+    def _seal(self) -> None:
+        """Close the active segment; the next append starts a new one."""
+        self._active.flush()
+        if self.fsync != "never":
+            os.fsync(self._active.fileno())
+        self._active.close()
+        self._active = None
+
+    def _sync(self) -> None:
+        """Apply the fsync policy after an append."""
+        self._active.flush()
+        if self.fsync == "always":
+            os.fsync(self._active.fileno())
+        elif self.fsync == "interval":
+            now = time.monotonic()
+            if now - self._last_fsync >= self.fsync_interval:
+                os.fsync(self._active.fileno())
+                self._last_fsync = now
+
+    def _remove_oldest(self) -> None:
+        """Delete the oldest segment file."""
+        seg_id, path, _ = self._segments.popleft()
+        self._read_offset = 0
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def _enforce_limit(self) -> None:
+        """Discard whole segments from the oldest end while the spool exceeds max_bytes."""
+        while len(self._segments) > 1 and sum(seg[2] for seg in self._segments) > self.max_bytes:
+            path = self._segments[0][1]
+            try:
+                with open(path, "rb") as f:
+                    f.seek(self._read_offset)
+                    self.dropped_records += sum(1 for _ in f)
+            except OSError:
+                pass
+            self._remove_oldest()
@@ -0,0 +1,318 @@
+import sqlite3
+import threading
+from typing import List, Any, Dict, Iterator, Optional
+from storage import StorageBackend, day_bounds
+from templates import TemplateMiner
+
+
+class SQLiteManager(StorageBackend):
+    """
+    Embedded SQLite database manager for inserting and fetching log entries.
+
+    Runs in WAL mode so readers never block the writer, and indexes the Logs table
+    on (timestamp, LogLevel) and (source, timestamp) for date, level and source filters.
+
+    With template mining, a templated row stores NULL in `message` and the template
+    id and parameters in `template_id` / `params`; the Templates table holds the
+    dictionary and the number of rows per template, updated in the insert transaction.
+    """
+
+    def __init__(self, db_path: str = "logs.db", templates: bool = False) -> None:
+        """
+        Initialize the SQLiteManager and create the Logs table if needed.
+
+        Args:
+            db_path (str): Path of the SQLite database file.
+            templates (bool): Store new messages as template id + parameters.
+        """
+        self.db_path = db_path
+        self.mine_templates = templates
+        # One connection per thread, reused across calls
+        self._local = threading.local()
+        self._connections = []
+        self._conn_lock = threading.Lock()
+
+        conn = self._connect()
+        # WAL is a property of the database file and persists across connections
+        conn.execute("PRAGMA journal_mode=WAL")
+        with conn:
+            conn.execute("""
+            CREATE TABLE IF NOT EXISTS Logs (
+                id INTEGER PRIMARY KEY,
+                timestamp TEXT,
+                LogLevel TEXT,
+                message TEXT,
+                source TEXT,
+                repeat_count INTEGER NOT NULL DEFAULT 1,
+                first_timestamp TEXT
+            )
+            """)
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(Logs)")}
+            if "repeat_count" not in columns:
+                # Databases created before repeat suppression
+                conn.execute("ALTER TABLE Logs ADD COLUMN repeat_count INTEGER NOT NULL DEFAULT 1")
+                conn.execute("ALTER TABLE Logs ADD COLUMN first_timestamp TEXT")
+            if "template_id" not in columns:
+                # Databases created before template mining
+                conn.execute("ALTER TABLE Logs ADD COLUMN template_id INTEGER")
+                conn.execute("ALTER TABLE Logs ADD COLUMN params TEXT")
+            conn.execute("""
+            CREATE TABLE IF NOT EXISTS Templates (
+                id INTEGER PRIMARY KEY,
+                cluster INTEGER NOT NULL,
+                template TEXT NOT NULL,
+                count INTEGER NOT NULL DEFAULT 0
+            )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS IX_Logs_Timestamp_Level ON Logs (timestamp, LogLevel)")
+            conn.execute("CREATE INDEX IF NOT EXISTS IX_Logs_Source_Timestamp ON Logs (source, timestamp)")
+        # Loaded even when mining is off: rows templated earlier still have to be rebuilt
+        self.miner = TemplateMiner()
+        self.miner.load(conn.execute("SELECT id, cluster, template FROM Templates").fetchall())
+
+    def _connect(self) -> sqlite3.Connection:
+        """Return this thread's connection, opening it on first use."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            # Safe with WAL: a crash can lose the last commits but never corrupts the file
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            with self._conn_lock:
+                self._connections.append(conn)
+        return conn
+
+    def _render(self, rows: List[Any]) -> List[Any]:
+        """Rebuild the messages of templated rows and drop the template columns."""
+        return [
+            row[:7] if row[7] is None
+            else (row[0], row[1], row[2], self.miner.render(row[7], row[8]), row[4], row[5], row[6])
+            for row in rows
+        ]
+
+    def insert_log(self, log: Dict[str, Any]) -> None:
+        """
+        Insert a single log entry into the Logs table.
+
+        Args:
+            log (dict): Log data with keys 'level', 'message', 'source', 'timestamp'.
+        """
+        self.insert_logs([log])
+
+    def insert_logs(self, logs: List[Dict[str, Any]]) -> Optional[List[int]]:
+        """
+        Insert a batch of log entries into the Logs table in one transaction.
+
+        Args:
+            logs (list): Log dicts with keys 'level', 'message', 'source', 'timestamp'.
+
+        Returns:
+            list: The ids assigned to the logs.
+
+        Raises:
+            sqlite3.Error: The transaction failed and nothing was stored.
+        """
+        if not logs:
+            return []
+        query = """
+        INSERT INTO Logs (LogLevel, message, source, timestamp, repeat_count, first_timestamp, template_id, params)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """
+        params = []
+        counts: Dict[int, int] = {}
+        for log in logs:
+            message, template_id, values = log["message"], None, None
+            encoded = self.miner.encode(message) if self.mine_templates else None
+            if encoded is not None:
+                template_id, values = encoded
+                message = None
+                counts[template_id] = counts.get(template_id, 0) + 1
+            params.append((log["level"], message, log["source"], log["timestamp"],
+                           log.get("repeat_count", 1), log.get("first_timestamp"), template_id, values))
+        templates = self.miner.unsaved()
+        conn = self._connect()
+        # Errors propagate so the batch writer counts the batch as failed
+        with conn:
+            # Another writer thread may have saved the same new templates first
+            conn.executemany("INSERT OR IGNORE INTO Templates (id, cluster, template) VALUES (?, ?, ?)",
+                             templates)
+            conn.executemany("UPDATE Templates SET count = count + ? WHERE id = ?",
+                             [(count, template_id) for template_id, count in counts.items()])
+            conn.executemany(query, params)
+            # The transaction holds the write lock, so the batch got consecutive rowids
+            last_id = conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+        self.miner.saved(templates)
+        return list(range(last_id - len(logs) + 1, last_id + 1))
+
+    def fetch_logs(self, level: str, start: str, end: str, source: Optional[str] = None,
+                   limit: int = 100, since_id: Optional[int] = None,
+                   before_id: Optional[int] = None) -> List[Any]:
+        """
+        Fetch logs from the Logs table based on level, date range and source.
+
+        Args:
+            level (str): Log level to filter (use "ALL" for no filtering).
+            start (str): Start date (YYYY-MM-DD).
+            end (str): End date (YYYY-MM-DD).
+            source (str): Only return logs from this source (None for all sources).
+            limit (int): Maximum number of rows.
+            since_id (int): Only return logs with a greater id.
+            before_id (int): Only return logs with a smaller id (the next page).
+
+        Returns:
+            List[Any]: Rows of (id, timestamp, level, message, source, repeat_count, first_timestamp).
+        """
+        # Half-open range on the raw column so the timestamp indexes can be used
+        query = """
+        SELECT id, timestamp, LogLevel, message, source, repeat_count, first_timestamp, template_id, params
+        FROM Logs
+        WHERE timestamp >= ? AND timestamp < ?
+        """
+        params = list(day_bounds(start, end))
+
+        if level.upper() != "ALL":
+            query += " AND LogLevel = ?"
+            params.append(level)
+
+        if source:
+            query += " AND source = ?"
+            params.append(source)
+
+        if since_id is not None:
+            query += " AND id > ?"
+            params.append(since_id)
+
+        if before_id is not None:
+            query += " AND id < ?"
+            params.append(before_id)
+
+        query += " ORDER BY id DESC LIMIT ?"
+        params.append(limit)
+
+        try:
+            return self._render(self._connect().execute(query, params).fetchall())
+        except sqlite3.Error as e:
+            print(f"[DB Error] Failed to fetch logs: {e}")
+            return []
+
+    def fetch_by_ids(self, ids: List[int]) -> List[Any]:
+        """
+        Fetch specific logs by id.
+
+        Args:
+            ids (list): Ids to look up; unknown ids are skipped.
+
+        Returns:
+            List[Any]: Matching rows.
+        """
+        rows = []
+        conn = self._connect()
+        # Stay well below SQLite's bound parameter limit
+        for i in range(0, len(ids), 500):
+            chunk = ids[i:i + 500]
+            query = f"""
+            SELECT id, timestamp, LogLevel, message, source, repeat_count, first_timestamp, template_id, params
+            FROM Logs
+            WHERE id IN ({",".join("?" * len(chunk))})
+            """
+            try:
+                rows.extend(self._render(conn.execute(query, chunk).fetchall()))
+            except sqlite3.Error as e:
+                print(f"[DB Error] Failed to fetch logs by id: {e}")
+        return rows
+
+    def scan_logs(self, after_id: int, limit: int) -> List[Any]:
+        """
+        Read logs in id order.
+
+        Args:
+            after_id (int): Only return logs with a greater id.
+            limit (int): Maximum number of rows.
+
+        Returns:
+            List[Any]: Rows oldest first.
+        """
+        query = """
+        SELECT id, timestamp, LogLevel, message, source, repeat_count, first_timestamp, template_id, params
+        FROM Logs
+        WHERE id > ?
+        ORDER BY id
+        LIMIT ?
+        """
+        try:
+            return self._render(self._connect().execute(query, (after_id, limit)).fetchall())
+        except sqlite3.Error as e:
+            print(f"[DB Error] Failed to scan logs: {e}")
+            return []
+
+    def export_logs(self, level: str, start: str, end: str, source: Optional[str] = None,
+                    chunk_size: int = 5000) -> Iterator[List[Any]]:
+        """
+        Stream matching logs in chunks read with fetchmany.
+
+        The export opens a connection of its own: its read transaction can stay open
+        for a long time, and the generator may be resumed from different threads.
+
+        Yields:
+            List[Any]: Chunks of rows, oldest first.
+        """
+        query = """
+        SELECT id, timestamp, LogLevel, message, source, repeat_count, first_timestamp, template_id, params
+        FROM Logs
+        WHERE timestamp >= ? AND timestamp < ?
+        """
+        params = list(day_bounds(start, end))
+
+        if level.upper() != "ALL":
+            query += " AND LogLevel = ?"
+            params.append(level)
+
+        if source:
+            query += " AND source = ?"
+            params.append(source)
+
+        query += " ORDER BY id"
+
+        conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        try:
+            cursor = conn.execute(query, params)
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield self._render(rows)
+        except sqlite3.Error as e:
+            print(f"[DB Error] Failed to export logs: {e}")
+            raise
+        finally:
+            conn.close()
+
+    def templates(self, limit: Optional[int] = 100) -> Optional[List[Dict[str, Any]]]:
+        """
+        List the mined message templates with the number of stored rows of each.
+
+        The counts come from the small Templates table, not from the Logs table.
+
+        Args:
+            limit (int): Number of templates to return (None for all).
+
+        Returns:
+            list: {"id", "template", "count"} dicts, most frequent first, or None if
+            template mining is disabled.
+        """
+        if not self.mine_templates:
+            return None
+        try:
+            counts = dict(self._connect().execute("SELECT id, count FROM Templates").fetchall())
+        except sqlite3.Error as e:
+            print(f"[DB Error] Failed to read templates: {e}")
+            return []
+        return self.miner.summarize(counts, limit)
+
+    def close(self) -> None:
+        """Close every connection opened by this manager."""
+        with self._conn_lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+        self._local = threading.local()
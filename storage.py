@@ -0,0 +1,190 @@
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# Storage kinds accepted by create_backend()
+BACKENDS = ("sqlserver", "sqlite", "segments")
+
+# File or directory used by the local backends when no target is given
+DEFAULT_TARGETS = {"sqlite": "logs.db", "segments": "segments"}
+
+# Longest level and source (UTF-8 bytes) and largest repeat count every backend can store
+MAX_LEVEL_BYTES = 255
+MAX_SOURCE_BYTES = 65535
+MAX_REPEAT_COUNT = 2 ** 32 - 1
+
+
+def day_bounds(start: str, end: str) -> Tuple[str, str]:
+    """
+    Turn an inclusive 'YYYY-MM-DD' date range into a half-open timestamp range.
+
+    Filtering with `timestamp >= start AND timestamp < end` lets the database
+    seek an index on timestamp, unlike `CAST(timestamp AS DATE) BETWEEN ...`.
+
+    Returns:
+        tuple: (start, end_exclusive) as 'YYYY-MM-DD' strings.
+    """
+    end_exclusive = datetime.strptime(end, "%Y-%m-%d") + timedelta(days=1)
+    return start, end_exclusive.strftime("%Y-%m-%d")
+
+
+def parse_timestamp(value: str) -> float:
+    """Convert a 'YYYY-MM-DD HH:MM:SS[.ffffff]' string to epoch seconds."""
+    return datetime.fromisoformat(value).timestamp()
+
+
+def format_timestamp(ts: float) -> str:
+    """Convert epoch seconds back to the 'YYYY-MM-DD HH:MM:SS[.ffffff]' format used by the other backends."""
+    moment = datetime.fromtimestamp(ts)
+    return moment.strftime("%Y-%m-%d %H:%M:%S.%f" if moment.microsecond else "%Y-%m-%d %H:%M:%S")
+
+
+class StorageBackend(ABC):
+    """Interface every log storage implementation provides to LogServer."""
+
+    @abstractmethod
+    def insert_log(self, log: Dict[str, Any]) -> None:
+        """
+        Store a single log entry.
+
+        Args:
+            log (dict): Log data with keys 'level', 'message', 'source', 'timestamp', and
+                'repeat_count' / 'first_timestamp' for a summary of suppressed repeats.
+        """
+
+    @abstractmethod
+    def insert_logs(self, logs: List[Dict[str, Any]]) -> Optional[List[int]]:
+        """
+        Store a batch of log entries in one transaction/write.
+
+        Args:
+            logs (list): Log dicts with keys 'level', 'message', 'source', 'timestamp'.
+
+        Returns:
+            list: The ids assigned to the logs, in order, or None if the backend cannot
+            report them (components that need ids, like the hot cache, are then bypassed).
+
+        Raises:
+            Exception: The batch could not be stored; implementations raise instead of
+            returning so the batch writer counts it as failed.
+        """
+
+    @abstractmethod
+    def fetch_logs(self, level: str, start: str, end: str, source: Optional[str] = None,
+                   limit: int = 100, since_id: Optional[int] = None,
+                   before_id: Optional[int] = None) -> List[Any]:
+        """
+        Fetch the newest logs matching a level, date range and optional source.
+
+        Args:
+            level (str): Log level to filter (use "ALL" for no filtering).
+            start (str): Start date (YYYY-MM-DD).
+            end (str): End date (YYYY-MM-DD), inclusive.
+            source (str): Only return logs from this source (None for all sources).
+            limit (int): Maximum number of rows.
+            since_id (int): Only return logs with a greater id (incremental polling cursor).
+            before_id (int): Only return logs with a smaller id (keyset pagination cursor).
+
+        Returns:
+            List[Any]: Rows of (id, timestamp, level, message, source, repeat_count,
+            first_timestamp), newest first.
+        """
+
+    @abstractmethod
+    def fetch_by_ids(self, ids: List[int]) -> List[Any]:
+        """
+        Fetch specific logs by id (used to materialize search results).
+
+        Args:
+            ids (list): Ids to look up; unknown ids are skipped.
+
+        Returns:
+            List[Any]: Rows of (id, timestamp, level, message, source, repeat_count,
+            first_timestamp), in no particular order.
+        """
+
+    @abstractmethod
+    def scan_logs(self, after_id: int, limit: int) -> List[Any]:
+        """
+        Read logs in id order, for building indexes over existing data.
+
+        Args:
+            after_id (int): Only return logs with a greater id.
+            limit (int): Maximum number of rows.
+
+        Returns:
+            List[Any]: Rows of (id, timestamp, level, message, source, repeat_count,
+            first_timestamp), oldest first.
+        """
+
+    @abstractmethod
+    def export_logs(self, level: str, start: str, end: str, source: Optional[str] = None,
+                    chunk_size: int = 5000) -> Iterator[List[Any]]:
+        """
+        Stream every log matching a level, date range and optional source.
+
+        Rows are read through a cursor and handed out in chunks, so a result of
+        any size is never held in memory as a whole.
+
+        Args:
+            level (str): Log level to filter (use "ALL" for no filtering).
+            start (str): Start date (YYYY-MM-DD).
+            end (str): End date (YYYY-MM-DD), inclusive.
+            source (str): Only return logs from this source (None for all sources).
+            chunk_size (int): Rows per chunk.
+
+        Yields:
+            List[Any]: Chunks of rows of (id, timestamp, level, message, source,
+            repeat_count, first_timestamp), oldest first.
+        """
+
+    def templates(self, limit: Optional[int] = 100) -> Optional[List[Dict[str, Any]]]:
+        """
+        List the message templates mined on ingest, for the TEMPLATES action.
+
+        Args:
+            limit (int): Number of templates to return (None for all).
+
+        Returns:
+            list: {"id", "template", "count"} dicts, most frequent first, or None if
+            the backend does not mine templates.
+        """
+        return None
+
+    def stats(self) -> Optional[Dict[str, Any]]:
+        """Return backend-specific storage statistics for SERVER_STATS, if any."""
+        return None
+
+    def close(self) -> None:
+        """Release files or connections held by the backend."""
+
+
+def create_backend(kind: str, target: Optional[str] = None, **options) -> StorageBackend:
+    """
+    Build a storage backend by name.
+
+    Args:
+        kind (str): "sqlserver", "sqlite" or "segments".
+        target (str): ODBC connection string, SQLite file path or segment directory.
+        options: Extra SegmentStore settings (retention_days, cold_after_days, cold_codec),
+            and templates=True to store messages as template id + parameters (SQLite and segments).
+
+    Returns:
+        StorageBackend: The backend instance.
+    """
+    # Imports are deferred so that e.g. pyodbc is only needed for SQL Server
+    templates = options.pop("templates", False)
+    if options and kind != "segments":
+        raise ValueError(f"Retention and cold storage are only supported by the segments backend, not {kind}")
+    if templates and kind not in ("sqlite", "segments"):
+        raise ValueError(f"Template mining is only supported by the sqlite and segments backends, not {kind}")
+    if kind == "sqlserver":
+        from db_manager import DBManager, DEFAULT_CONN_STR
+        return DBManager(target or DEFAULT_CONN_STR)
+    if kind == "sqlite":
+        from sqlite_manager import SQLiteManager
+        return SQLiteManager(target or DEFAULT_TARGETS["sqlite"], templates=templates)
+    if kind == "segments":
+        from segment_store import SegmentStore
+        return SegmentStore(target or DEFAULT_TARGETS["segments"], templates=templates, **options)
+    raise ValueError(f"Unknown storage backend: {kind}")
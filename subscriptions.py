@@ -0,0 +1,123 @@
+import threading
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional
+
+
+class Subscriber:
+    """
+    One TAIL subscription: a filter and a bounded queue of matching records.
+
+    A subscriber that lets its queue fill up is evicted instead of slowing down
+    ingest; the connection handler notices `evicted` and closes the stream.
+    """
+
+    def __init__(self, level: str = "ALL", source: Optional[str] = None,
+                 max_queue: int = 10000, on_data: Optional[Callable[[], None]] = None) -> None:
+        """
+        Args:
+            level (str): Only deliver records of this level ("ALL" for every level).
+            source (str): Only deliver records from this source (None for every source).
+            max_queue (int): Records that may wait for delivery before the subscriber is evicted.
+            on_data (callable): Called (from the publishing thread) when data or eviction is pending.
+        """
+        self.level = None if not level or level.upper() == "ALL" else level.upper()
+        self.source = source or None
+        self.max_queue = max_queue
+        self.on_data = on_data
+        self.evicted = False
+        self._queue = deque()
+        self._cond = threading.Condition()
+
+    def matches(self, record: Dict[str, Any]) -> bool:
+        """Return True if the record passes this subscriber's filters."""
+        if self.level is not None and record.get("level") != self.level:
+            return False
+        if self.source is not None and record.get("source") != self.source:
+            return False
+        return True
+
+    def push(self, records: List[Dict[str, Any]]) -> bool:
+        """
+        Queue records for delivery.
+
+        Returns:
+            bool: False if the queue overflowed and the subscriber was evicted.
+        """
+        with self._cond:
+            if self.evicted:
+                return False
+            if len(self._queue) + len(records) > self.max_queue:
+                self.evicted = True
+                self._queue.clear()
+            else:
+                self._queue.extend(records)
+            self._cond.notify()
+        if self.on_data is not None:
+            self.on_data()
+        return not self.evicted
+
+    def evict(self) -> None:
+        """Drop everything queued and mark the subscriber evicted (e.g. when a relayed stream was lost)."""
+        with self._cond:
+            self.evicted = True
+            self._queue.clear()
+            self._cond.notify()
+        if self.on_data is not None:
+            self.on_data()
+
+    def drain(self, max_records: int) -> List[Dict[str, Any]]:
+        """Take up to max_records queued records without waiting."""
+        with self._cond:
+            count = min(len(self._queue), max_records)
+            return [self._queue.popleft() for _ in range(count)]
+
+    def wait(self, max_records: int, timeout: float) -> List[Dict[str, Any]]:
+        """Wait up to `timeout` seconds for records, then take up to max_records of them."""
+        with self._cond:
+            if not self._queue and not self.evicted:
+                self._cond.wait(timeout)
+            count = min(len(self._queue), max_records)
+            return [self._queue.popleft() for _ in range(count)]
+
+    def __len__(self) -> int:
+        return len(self._queue)
+
+
+class SubscriptionHub:
+    """Fan-out of newly accepted records to every live TAIL subscriber."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._subscribers: List[Subscriber] = []
+        self.evictions = 0
+
+    def subscribe(self, subscriber: Subscriber) -> Subscriber:
+        """Register a subscriber; it receives records published from now on."""
+        with self._lock:
+            self._subscribers.append(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber) -> None:
+        """Remove a subscriber (no-op if it is already gone)."""
+        with self._lock:
+            if subscriber in self._subscribers:
+                self._subscribers.remove(subscriber)
+
+    def publish(self, records: List[Dict[str, Any]]) -> None:
+        """Deliver records to every subscriber whose filters they match."""
+        # Copy-on-read: ingest threads never hold the lock while pushing
+        subscribers = self._subscribers
+        if not subscribers:
+            return
+        for subscriber in list(subscribers):
+            matching = [r for r in records if subscriber.matches(r)]
+            if matching and not subscriber.push(matching):
+                self.evictions += 1
+                self.unsubscribe(subscriber)
+
+    def queued(self) -> int:
+        """Total number of records waiting in subscriber queues."""
+        return sum(len(subscriber) for subscriber in list(self._subscribers))
+
+    def __len__(self) -> int:
+        return len(self._subscribers)
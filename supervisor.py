@@ -0,0 +1,174 @@
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+from typing import List, Optional
+from storage import DEFAULT_TARGETS
+
+SERVER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "server.py")
+
+
+def partition_path(path: str, index: int) -> str:
+    """Name of a worker's own file or directory: logs.db -> logs.p0.db, segments -> segments.p0."""
+    root, ext = os.path.splitext(path)
+    return f"{root}.p{index}{ext}"
+
+
+def exit_with_parent(parent_pid: int, interval: float = 1.0) -> None:
+    """
+    Stop this process gracefully (SIGTERM) once its supervisor is gone.
+
+    Workers run in their own session so a terminal Ctrl+C reaches only the
+    supervisor; this keeps them from outliving it if it is killed outright.
+    """
+    def watch():
+        while os.getppid() == parent_pid:
+            time.sleep(interval)
+        os.kill(os.getpid(), signal.SIGTERM)
+
+    threading.Thread(target=watch, name="parent-watch", daemon=True).start()
+
+
+class Supervisor:
+    """
+    Runs several server.py worker processes that share one listening port.
+
+    Each worker binds the client port with SO_REUSEPORT, so the kernel spreads
+    connections over the workers and every core parses and batches its own share
+    of the ingest. A worker writes only to its own partition of the store (its own
+    SQLite file or segment directory, search index and rollups) and answers reads
+    for all partitions by asking the others over a private peer port.
+
+    Workers that exit unexpectedly are restarted with exponential backoff. On
+    Ctrl+C or SIGTERM every worker gets one SIGTERM and time to flush its queue.
+    """
+
+    # A worker that ran this long before failing is restarted without backoff
+    STABLE_AFTER = 30.0
+    MAX_BACKOFF = 30.0
+    # Seconds workers get to flush their queues before they are killed
+    SHUTDOWN_TIMEOUT = 60.0
+
+    def __init__(self, args) -> None:
+        """
+        Args:
+            args: Parsed server.py options (see server.parse_args); `processes` workers are run.
+        """
+        if args.storage not in DEFAULT_TARGETS:
+            raise SystemExit("--processes needs a partitionable local backend (--storage sqlite or segments)")
+        self.args = args
+        self.count = args.processes
+        self.target = args.db_path or DEFAULT_TARGETS[args.storage]
+        peer_base = args.peer_port_base or args.port + 1
+        self.peer_ports = [peer_base + i for i in range(self.count)]
+        self.workers: List[Optional[subprocess.Popen]] = [None] * self.count
+        self.started_at = [0.0] * self.count
+        self.failures = [0] * self.count
+        self.restart_at = [0.0] * self.count
+        self.restarts = 0
+        self.stopping = threading.Event()
+
+    def worker_command(self, index: int) -> List[str]:
+        """Command line of worker `index`: the supervisor's options plus its partition."""
+        args = self.args
+        command = [
+            sys.executable, SERVER_SCRIPT,
+            "--host", args.host,
+            "--port", str(args.port),
+            "--engine", args.engine,
+            "--storage", args.storage,
+            "--db-path", partition_path(self.target, index),
+            "--batch-size", str(args.batch_size),
+            "--linger-ms", str(args.linger_ms),
+            "--writers", str(args.writers),
+            "--cache-size", str(args.cache_size),
+            "--reuse-port",
+            "--partitions", ",".join(f"127.0.0.1:{port}" for port in self.peer_ports),
+            "--partition-index", str(index),
+            "--peer-port", str(self.peer_ports[index]),
+            "--parent-pid", str(os.getpid()),
+        ]
+        if args.report_interval:
+            command += ["--report-interval", str(args.report_interval)]
+        if args.no_search:
+            command.append("--no-search")
+        elif args.search_dir:
+            command += ["--search-dir", partition_path(args.search_dir, index)]
+        if args.rollup_path:
+            command += ["--rollup-path", partition_path(args.rollup_path, index)]
+        if args.metrics_port:
+            # One endpoint per worker: metrics_port, metrics_port + 1, ...
+            command += ["--metrics-port", str(args.metrics_port + index)]
+        if args.profiling:
+            command.append("--profiling")
+        if args.rate_limit:
+            command += ["--rate-limit", str(args.rate_limit), "--limit-policy", args.limit_policy,
+                        "--sample-every", str(args.sample_every)]
+            if args.burst:
+                command += ["--burst", str(args.burst)]
+        if args.retention_days is not None:
+            command += ["--retention-days", str(args.retention_days)]
+        if args.cold_after_days is not None:
+            command += ["--cold-after-days", str(args.cold_after_days), "--cold-codec", args.cold_codec]
+        if args.templates:
+            command.append("--templates")
+        if args.suppress_window:
+            command += ["--suppress-window", str(args.suppress_window), "--suppress-keys", str(args.suppress_keys)]
+        return command
+
+    def spawn(self, index: int) -> None:
+        # A session of its own: the terminal's Ctrl+C reaches only the supervisor,
+        # which then stops each worker exactly once
+        self.workers[index] = subprocess.Popen(self.worker_command(index), start_new_session=True)
+        self.started_at[index] = time.monotonic()
+
+    def run(self) -> int:
+        """Start the workers and supervise them until interrupted. Returns the exit code."""
+        signal.signal(signal.SIGTERM, lambda signum, frame: self.stopping.set())
+        for index in range(self.count):
+            self.spawn(index)
+        print(f"Supervisor running {self.count} workers on {self.args.host}:{self.args.port}...")
+        try:
+            while not self.stopping.wait(0.5):
+                self.check_workers()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.shutdown()
+        return 0
+
+    def check_workers(self) -> None:
+        """Restart workers that exited, backing off when one keeps failing."""
+        now = time.monotonic()
+        for index, proc in enumerate(self.workers):
+            if proc is None:
+                if now >= self.restart_at[index]:
+                    self.restarts += 1
+                    self.spawn(index)
+                continue
+            code = proc.poll()
+            if code is None:
+                continue
+            uptime = now - self.started_at[index]
+            self.failures[index] = self.failures[index] + 1 if uptime < self.STABLE_AFTER else 1
+            delay = min(self.MAX_BACKOFF, 0.5 * 2 ** (self.failures[index] - 1))
+            print(f"[Supervisor Error] Worker {index} exited with code {code} after {uptime:.1f}s; "
+                  f"restarting in {delay:.1f}s")
+            self.workers[index] = None
+            self.restart_at[index] = now + delay
+
+    def shutdown(self) -> None:
+        """Stop every worker so it flushes its queue, then wait (killing stragglers)."""
+        alive = [proc for proc in self.workers if proc is not None and proc.poll() is None]
+        for proc in alive:
+            proc.send_signal(signal.SIGTERM)
+        deadline = time.monotonic() + self.SHUTDOWN_TIMEOUT
+        for proc in alive:
+            try:
+                proc.wait(timeout=max(0.0, deadline - time.monotonic()))
+            except subprocess.TimeoutExpired:
+                print(f"[Supervisor Error] Worker {proc.pid} did not stop in time; killing it")
+                proc.kill()
+                proc.wait()
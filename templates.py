@@ -0,0 +1,213 @@
+import threading
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# Stands for the variable tokens of a template
+WILDCARD = "<*>"
+
+
+def has_digits(token: str) -> bool:
+    """Return True if a token holds a digit (ids, durations, addresses: likely a parameter)."""
+    return any(c.isdigit() for c in token)
+
+
+class _Node:
+    """Inner node of the parse tree; the nodes at full depth hold cluster ids."""
+
+    __slots__ = ("children", "clusters")
+
+    def __init__(self) -> None:
+        self.children: Dict[str, "_Node"] = {}
+        self.clusters: List[int] = []
+
+
+class TemplateMiner:
+    """
+    Online log template mining with a Drain-style fixed-depth parse tree.
+
+    A message is split into tokens on single spaces, so joining them back gives
+    the exact original text. The tree branches on the token count, then on the
+    first `depth` tokens (tokens holding digits share a wildcard branch, and so do
+    the tokens beyond `max_children` of a node). The node reached holds a few
+    clusters: the message joins the most similar one when at least `similarity` of
+    its positions match, and the positions where they differ become wildcards.
+
+    Templates are versioned: every generalization of a cluster gets a new
+    template id and the older ids keep their text, so the parameters stored with
+    an id always rebuild the exact message they were taken from. A cluster's id is
+    the id of its first template.
+    """
+
+    def __init__(self, similarity: float = 0.4, depth: int = 2, max_children: int = 100,
+                 max_clusters: int = 10000) -> None:
+        """
+        Create an empty miner.
+
+        Args:
+            similarity (float): Fraction of matching tokens needed to join a cluster.
+            depth (int): Leading tokens used to navigate the tree.
+            max_children (int): Children per node before new tokens share the wildcard branch.
+            max_clusters (int): Clusters kept at most; later unmatched messages are not templated.
+        """
+        self.similarity = similarity
+        self.depth = depth
+        self.max_children = max_children
+        self.max_clusters = max_clusters
+        self._lock = threading.Lock()
+        self.root: Dict[int, _Node] = {}
+        # Template id -> (cluster id, text); never changes once assigned
+        self.versions: Dict[int, Tuple[int, str]] = {}
+        # Template id -> text split at the wildcards, for render()
+        self._parts: Dict[int, List[str]] = {}
+        # Cluster id -> tokens and id of its current template
+        self.clusters: Dict[int, List[str]] = {}
+        self.current: Dict[int, int] = {}
+        self.next_id = 1
+        self._unsaved: List[Tuple[int, int, str]] = []
+
+    def load(self, entries: Iterable[Tuple[int, int, str]]) -> None:
+        """
+        Restore the dictionary persisted by a storage backend.
+
+        Args:
+            entries: (template id, cluster id, text) tuples, in any order.
+        """
+        with self._lock:
+            for template_id, cluster, text in sorted(entries):
+                self._add_version(template_id, cluster, text)
+                if template_id == cluster:
+                    # A cluster's first template is the message that created it, so it
+                    # finds the same node again when clusters are placed in creation order
+                    self._leaf(text.split(" ")).clusters.append(cluster)
+
+    def encode(self, message: str) -> Optional[Tuple[int, str]]:
+        """
+        Match a message against the clusters, creating or generalizing one if needed.
+
+        Args:
+            message (str): Log message.
+
+        Returns:
+            tuple: (template id, parameters joined by spaces), or None if the message
+            cannot be templated (it is not a string, contains the wildcard itself, or
+            the cluster limit is reached) and has to be stored as it is.
+        """
+        if not isinstance(message, str) or WILDCARD in message:
+            return None
+        tokens = message.split(" ")
+        with self._lock:
+            leaf = self._leaf(tokens)
+            cluster = self._match(leaf.clusters, tokens)
+            if cluster is None:
+                if len(self.clusters) >= self.max_clusters:
+                    return None
+                cluster = self.next_id
+                self._new_version(cluster, tokens)
+                leaf.clusters.append(cluster)
+            else:
+                template = self.clusters[cluster]
+                merged = [t if t == token else WILDCARD for t, token in zip(template, tokens)]
+                if merged != template:
+                    self._new_version(cluster, merged)
+            template = self.clusters[cluster]
+            template_id = self.current[cluster]
+        # Tokens never contain spaces, so the parameters split back unambiguously
+        return template_id, " ".join(token for t, token in zip(template, tokens) if t == WILDCARD)
+
+    def render(self, template_id: int, params: str) -> str:
+        """
+        Rebuild a message from its template id and encoded parameters.
+
+        Raises:
+            KeyError: The template id is not in the dictionary.
+        """
+        parts = self._parts[template_id]
+        if len(parts) == 1:
+            return parts[0]
+        pieces = [parts[0]]
+        for value, part in zip(params.split(" "), parts[1:]):
+            pieces.append(value)
+            pieces.append(part)
+        return "".join(pieces)
+
+    def unsaved(self) -> List[Tuple[int, int, str]]:
+        """Return the (template id, cluster id, text) entries created since the last saved() call."""
+        with self._lock:
+            return list(self._unsaved)
+
+    def saved(self, entries: List[Tuple[int, int, str]]) -> None:
+        """Mark entries returned by unsaved() as persisted."""
+        with self._lock:
+            done = set(entries)
+            self._unsaved = [entry for entry in self._unsaved if entry not in done]
+
+    def summarize(self, counts: Dict[int, int], limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Group per-template record counts by cluster.
+
+        Args:
+            counts (dict): Records stored per template id.
+            limit (int): Number of clusters to return (None for all).
+
+        Returns:
+            list: {"id", "template", "count"} dicts, most frequent first, with the
+            cluster's current template text.
+        """
+        totals: Counter = Counter()
+        for template_id, count in counts.items():
+            version = self.versions.get(template_id)
+            if version is not None and count:
+                totals[version[0]] += count
+        return [
+            {"id": cluster, "template": " ".join(self.clusters[cluster]), "count": count}
+            for cluster, count in totals.most_common(limit)
+        ]
+
+    def _leaf(self, tokens: List[str]) -> _Node:
+        """Walk (and grow) the tree down to the node holding the clusters for these tokens."""
+        node = self.root.get(len(tokens))
+        if node is None:
+            node = self.root[len(tokens)] = _Node()
+        for token in tokens[:self.depth]:
+            key = WILDCARD if has_digits(token) else token
+            child = node.children.get(key)
+            if child is None:
+                if key != WILDCARD and len(node.children) >= self.max_children:
+                    key = WILDCARD
+                    child = node.children.get(key)
+                if child is None:
+                    child = node.children[key] = _Node()
+            node = child
+        return node
+
+    def _match(self, clusters: List[int], tokens: List[str]) -> Optional[int]:
+        """Return the most similar cluster above the similarity threshold, if any."""
+        best = None
+        best_score = (-1.0, -1)
+        for cluster in clusters:
+            same = wild = 0
+            for t, token in zip(self.clusters[cluster], tokens):
+                if t == WILDCARD:
+                    wild += 1
+                elif t == token:
+                    same += 1
+            # Ties go to the more general template
+            score = (same / len(tokens), wild)
+            if score > best_score:
+                best, best_score = cluster, score
+        if best is not None and best_score[0] >= self.similarity:
+            return best
+        return None
+
+    def _new_version(self, cluster: int, tokens: List[str]) -> None:
+        template_id = self.next_id
+        text = " ".join(tokens)
+        self._add_version(template_id, cluster, text)
+        self._unsaved.append((template_id, cluster, text))
+
+    def _add_version(self, template_id: int, cluster: int, text: str) -> None:
+        self.versions[template_id] = (cluster, text)
+        self._parts[template_id] = text.split(WILDCARD)
+        self.clusters[cluster] = text.split(" ")
+        self.current[cluster] = template_id
+        self.next_id = max(self.next_id, template_id + 1)